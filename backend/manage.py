@@ -0,0 +1,107 @@
+"""
+Maintenance commands for the Dolaglobo Finance MMF API.
+
+Run from the backend directory, with the same environment as the server:
+    python manage.py backfill-rollups [--since YYYY-MM-DD]
+    python manage.py reconcile-metrics
+    python manage.py backfill-search-keys [--rebuild]
+    python manage.py backfill-ledger
+    python manage.py migrate-money
+    python manage.py backfill-account-counters
+    python manage.py find-duplicate-phones
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from server import (
+    client, logger, backfill_account_counters, backfill_daily_rollups, backfill_opening_balances,
+    backfill_search_keys, find_duplicate_phones, migrate_money_to_cents, reconcile_dashboard_metrics
+)
+
+
+async def backfill_rollups(args):
+    since = datetime.fromisoformat(args.since) if args.since else None
+    await backfill_daily_rollups(since)
+    logger.info(f"Daily rollups rebuilt{' since ' + args.since if args.since else ''}")
+
+
+async def reconcile_metrics(args):
+    metrics, failed = await reconcile_dashboard_metrics()
+    logger.info(f"Dashboard metrics reconciled: {metrics}")
+    if failed:
+        raise SystemExit(f"Metrics not reconciled: {', '.join(failed)}")
+
+
+async def search_keys(args):
+    updated = await backfill_search_keys(rebuild=args.rebuild)
+    logger.info(f"Search keys written for {updated} customer(s)")
+
+
+async def backfill_ledger(args):
+    opened = await backfill_opening_balances()
+    logger.info(f"Opening ledger entries written for {opened} account(s)")
+
+
+async def migrate_money(args):
+    converted = await migrate_money_to_cents()
+    for field, count in converted.items():
+        logger.info(f"{field}: {count} document(s) converted to cents")
+    # Rollups and metrics are derived sums, so rebuild them from the converted sources
+    await backfill_daily_rollups()
+    metrics, failed = await reconcile_dashboard_metrics()
+    if failed:
+        raise SystemExit(f"Money migrated, but metrics not reconciled: {', '.join(failed)}")
+    logger.info("Daily rollups and dashboard metrics rebuilt in cents")
+
+
+async def account_counters(args):
+    updated = await backfill_account_counters()
+    logger.info(f"Transaction counters and totals recomputed for {updated} account(s)")
+
+
+async def duplicate_phones(args):
+    duplicates = await find_duplicate_phones()
+    for duplicate in duplicates:
+        logger.info(f"{duplicate['phone']}: {', '.join(duplicate['user_ids'])}")
+    if duplicates:
+        raise SystemExit(f"{len(duplicates)} phone number(s) shared by several customers - fix before deploying")
+    logger.info("No duplicate phone numbers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dolaglobo Finance maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill-rollups", help="Rebuild daily_rollups from transactions and users")
+    backfill.add_argument("--since", help="Only rebuild days from this date (YYYY-MM-DD)")
+    backfill.set_defaults(handler=backfill_rollups)
+
+    reconcile = commands.add_parser("reconcile-metrics", help="Recompute the materialized dashboard metrics")
+    reconcile.set_defaults(handler=reconcile_metrics)
+
+    keys = commands.add_parser("backfill-search-keys", help="Store admin search keys on customer documents")
+    keys.add_argument("--rebuild", action="store_true", help="Recompute keys for every customer, not just missing ones")
+    keys.set_defaults(handler=search_keys)
+
+    ledger = commands.add_parser("backfill-ledger", help="Open ledger entries for accounts created before the ledger")
+    ledger.set_defaults(handler=backfill_ledger)
+
+    money = commands.add_parser("migrate-money", help="Convert stored KES float amounts to integer cents")
+    money.set_defaults(handler=migrate_money)
+
+    counters = commands.add_parser("backfill-account-counters", help="Recompute per-account transaction counters and lifetime totals")
+    counters.set_defaults(handler=account_counters)
+
+    phones = commands.add_parser("find-duplicate-phones", help="List phone numbers shared by several customers")
+    phones.set_defaults(handler=duplicate_phones)
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(args.handler(args))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,37 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+from bson import ObjectId
+from gridfs.errors import NoFile
 import os
+import asyncio
+import base64
+import csv
+import hashlib
+import io
+import json
+import re
 import logging
+import socket
+import time
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, BeforeValidator, Field, PlainSerializer
+from typing import Annotated, Awaitable, Callable, List, Optional
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
 import bcrypt
 from jose import jwt, JWTError
 from enum import Enum
+from collections import OrderedDict
+from contextvars import ContextVar
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
@@ -52,10 +69,66 @@ ADMIN_SECRET_KEY = os.environ.get('ADMIN_JWT_SECRET', 'dolaglobo-admin-secret-20
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 30
 
+# KDF (bcrypt) worker pool configuration
+KDF_EXECUTOR = os.environ.get('KDF_EXECUTOR', 'thread')  # "thread" or "process"
+KDF_MAX_WORKERS = int(os.environ.get('KDF_MAX_WORKERS', '4'))
+KDF_MAX_QUEUE = int(os.environ.get('KDF_MAX_QUEUE', '256'))  # waiting calls before returning 503
+
+# Authenticated user/admin documents are cached per worker for this long
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '60'))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.environ.get('PRINCIPAL_CACHE_MAX_ENTRIES', '10000'))
+
 # Interest Rate Configuration
 ANNUAL_INTEREST_RATE = 0.15  # 15% p.a.
 DAILY_INTEREST_RATE = ANNUAL_INTEREST_RATE / 365
 
+# Smallest deposit or withdrawal, in cents (KES 50)
+MIN_TRANSACTION_CENTS = 5000
+
+# Interest distribution batching - accounts credited per bulk_write/insert_many round-trip
+INTEREST_BATCH_SIZE = int(os.environ.get('INTEREST_BATCH_SIZE', '1000'))
+
+# Interest runs are claimed by one worker process, which refreshes the run's updated_at on this
+# interval; a running run whose heartbeat is older than INTEREST_RUN_STALE_SECONDS is presumed dead
+INTEREST_RUN_HEARTBEAT_SECONDS = float(os.environ.get('INTEREST_RUN_HEARTBEAT_SECONDS', '15'))
+INTEREST_RUN_STALE_SECONDS = float(os.environ.get('INTEREST_RUN_STALE_SECONDS', '120'))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Rows per cursor batch (and per customer join) when streaming admin exports
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+
+# Paginated admin totals are cached per normalized query for this many seconds
+COUNT_CACHE_TTL_SECONDS = float(os.environ.get('COUNT_CACHE_TTL_SECONDS', '30'))
+COUNT_CACHE_MAX_ENTRIES = int(os.environ.get('COUNT_CACHE_MAX_ENTRIES', '1024'))
+
+# Dashboard metrics are maintained incrementally and fully recomputed on this interval
+METRICS_RECONCILE_SECONDS = int(os.environ.get('METRICS_RECONCILE_SECONDS', '900'))
+
+# Attempts for a multi-document transaction before a transient error is surfaced
+TRANSACTION_MAX_ATTEMPTS = int(os.environ.get('TRANSACTION_MAX_ATTEMPTS', '3'))
+
+# Per-query timeout for handlers that fan out independent queries concurrently
+QUERY_TIMEOUT_SECONDS = float(os.environ.get('QUERY_TIMEOUT_SECONDS', '5'))
+
+# Customer event streams (SSE); EVENTS_CHANGE_STREAM makes every worker watch the transactions change stream
+EVENTS_CHANGE_STREAM = os.environ.get('EVENTS_CHANGE_STREAM', 'false').lower() in ('1', 'true', 'yes')
+EVENT_QUEUE_SIZE = int(os.environ.get('EVENT_QUEUE_SIZE', '100'))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', '15'))
+# Stream tickets replace the bearer token in ?ticket=, which ends up in access logs
+STREAM_TICKET_SECONDS = int(os.environ.get('STREAM_TICKET_SECONDS', '60'))
+
+# Rendered statement files: "local" keeps them under STATEMENT_DIR, "gridfs" in the database
+# (use gridfs when instances do not share a persistent disk)
+STATEMENT_STORAGE = os.environ.get('STATEMENT_STORAGE', 'local')
+STATEMENT_DIR = Path(os.environ.get('STATEMENT_DIR', str(ROOT_DIR / 'statements')))
+# A build still "building" after this long is presumed dead and queued again at startup
+STATEMENT_BUILD_STALE_SECONDS = int(os.environ.get('STATEMENT_BUILD_STALE_SECONDS', '600'))
+
+# Idempotency-Key records are kept this long; a claim whose request died is taken over
+# by a retry once its lock lapses
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '60'))
+
 # Create the main app
 app = FastAPI(title="Dolaglobo Finance MMF API")
 
@@ -64,6 +137,7 @@ api_router = APIRouter(prefix="/api")
 admin_router = APIRouter(prefix="/api/admin")
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Enums
 class AdminRole(str, Enum):
@@ -79,6 +153,44 @@ class TransactionStatus(str, Enum):
     FAILED = "failed"
     CANCELLED = "cancelled"
 
+# ============== MONEY ==============
+# Money is stored as integer cents (int64); KES decimals only exist at the API edge
+MONEY_FIELDS = ("amount", "balance", "total_interest_earned", "balance_after", "account_balance")
+# Largest amount a request may carry (KES 1 billion); keeps cents, and sums of them, within int64
+MAX_AMOUNT_CENTS = 1_000_000_000 * 100
+
+def kes_to_cents(value) -> int:
+    """Parse a KES amount sent by a client into integer cents, rejecting sub-cent precision"""
+    if isinstance(value, bool):
+        raise ValueError("Amount must be a number")
+    try:
+        cents = Decimal(str(value)) * 100
+    except InvalidOperation:
+        raise ValueError("Amount must be a number")
+    if not cents.is_finite():
+        raise ValueError("Amount must be a number")
+    if cents != cents.to_integral_value():
+        raise ValueError("Amount cannot have more than 2 decimal places")
+    if abs(cents) > MAX_AMOUNT_CENTS:
+        raise ValueError(f"Amount cannot exceed KES {cents_to_kes(MAX_AMOUNT_CENTS):,.0f}")
+    return int(cents)
+
+def cents_to_kes(cents: int) -> float:
+    return cents / 100
+
+def apply_rate(cents: int, rate: float) -> int:
+    """Interest on a balance at rate, rounded half-even to whole cents"""
+    return int((Decimal(cents) * Decimal(str(rate))).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+def money_out(doc: dict) -> dict:
+    """Copy of a stored document with its money fields converted to KES for a response"""
+    return {k: cents_to_kes(v) if k in MONEY_FIELDS and isinstance(v, int) else v for k, v in doc.items()}
+
+# Request bodies carry KES; the parsed value is integer cents
+KesAmount = Annotated[int, BeforeValidator(kes_to_cents)]
+# Response model fields hold integer cents and serialize as KES
+Cents = Annotated[int, PlainSerializer(cents_to_kes, return_type=float)]
+
 # Pydantic Models - User
 class UserCreate(BaseModel):
     phone: str
@@ -98,35 +210,45 @@ class UserResponse(BaseModel):
 class AccountResponse(BaseModel):
     id: str
     user_id: str
-    balance: float
-    total_interest_earned: float
+    balance: Cents
+    total_interest_earned: Cents
     daily_interest: float
     estimated_annual_yield: float
     last_interest_date: Optional[datetime] = None
 
 class TransactionCreate(BaseModel):
-    amount: float
+    amount: KesAmount
     type: str
 
 class TransactionResponse(BaseModel):
     id: str
     user_id: str
     type: str
-    amount: float
+    amount: Cents
     status: str
     description: str
     created_at: datetime
 
+class TransactionPage(BaseModel):
+    transactions: List[TransactionResponse]
+    next_cursor: Optional[str] = None  # pass back as 'before' to fetch older transactions
+    sync_token: Optional[str] = None  # pass to /transactions/sync to fetch later changes
+
+class TransactionSync(BaseModel):
+    transactions: List[TransactionResponse]
+    sync_token: str
+    has_more: bool
+
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str
     user: UserResponse
 
 class DepositRequest(BaseModel):
-    amount: float
+    amount: KesAmount
 
 class WithdrawRequest(BaseModel):
-    amount: float
+    amount: KesAmount
 
 # Pydantic Models - Admin
 class AdminCreate(BaseModel):
@@ -160,14 +282,15 @@ class CustomerUpdate(BaseModel):
     phone: Optional[str] = None
 
 class DashboardStats(BaseModel):
-    total_aum: float
+    total_aum: Cents
     total_customers: int
     active_customers: int
     pending_transactions: int
     pending_verifications: int
-    daily_deposits: float
-    daily_withdrawals: float
-    total_interest_paid: float
+    daily_deposits: Cents
+    daily_withdrawals: Cents
+    total_interest_paid: Cents
+    unavailable: List[str] = []  # metrics that could not be computed for this response
 
 class AuditLogEntry(BaseModel):
     id: str
@@ -201,18 +324,136 @@ class StatementRequestResponse(BaseModel):
     email: Optional[str]
     created_at: datetime
 
+# ============== KDF WORKER POOL ==============
+# bcrypt blocks for ~200ms per call, so hashing runs in a bounded executor off the event loop
+def _bcrypt_hash(secret: str) -> str:
+    return bcrypt.hashpw(secret.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def _bcrypt_check(secret: str, hashed: str) -> bool:
+    return bcrypt.checkpw(secret.encode('utf-8'), hashed.encode('utf-8'))
+
+class KdfPool:
+    """Executor for KDF work with a concurrency cap and queue-depth metrics"""
+    
+    def __init__(self, max_workers: int, max_queue: int, use_processes: bool = False):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.mode = "process" if use_processes else "thread"
+        self.executor: Executor = (
+            ProcessPoolExecutor(max_workers=max_workers) if use_processes
+            else ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kdf")
+        )
+        self.semaphore = asyncio.Semaphore(max_workers)
+        self.waiting = 0
+        self.running = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+    
+    async def run(self, fn, *args):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server busy, please try again")
+        
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        queued_at = time.monotonic()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.wait_seconds_total += time.monotonic() - queued_at
+        
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.semaphore.release()
+    
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "queue_depth": self.waiting,
+            "peak_queue_depth": self.peak_waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": (self.wait_seconds_total / self.completed * 1000) if self.completed else 0
+        }
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+kdf_pool = KdfPool(KDF_MAX_WORKERS, KDF_MAX_QUEUE, use_processes=KDF_EXECUTOR == "process")
+
 # Helper Functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+    return await kdf_pool.run(_bcrypt_hash, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await kdf_pool.run(_bcrypt_check, password, hashed)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def hash_pin(pin: str) -> str:
+    return await kdf_pool.run(_bcrypt_hash, pin)
 
-def hash_pin(pin: str) -> str:
-    return bcrypt.hashpw(pin.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def verify_pin(pin: str, hashed: str) -> bool:
+    return await kdf_pool.run(_bcrypt_check, pin, hashed)
 
-def verify_pin(pin: str, hashed: str) -> bool:
-    return bcrypt.checkpw(pin.encode('utf-8'), hashed.encode('utf-8'))
+# ============== PRINCIPAL CACHE ==============
+class PrincipalCache:
+    """Per-worker TTL + LRU cache of authenticated users and admins, keyed by token subject"""
+    
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, kind: str, subject: str) -> Optional[dict]:
+        key = (kind, subject)
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def put(self, kind: str, subject: str, principal: dict):
+        key = (kind, subject)
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, principal)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, kind: str, subject: str):
+        if self.entries.pop((kind, subject), None) is not None:
+            self.invalidations += 1
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0
+        }
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_MAX_ENTRIES)
 
 def create_access_token(user_id: str, is_admin: bool = False) -> str:
     expire = datetime.utcnow() + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
@@ -221,19 +462,48 @@ def create_access_token(user_id: str, is_admin: bool = False) -> str:
     return jwt.encode(to_encode, secret, algorithm=ALGORITHM)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate_user(credentials.credentials)
+
+def create_stream_ticket(user_id: str) -> str:
+    """Short-lived token that only opens an event stream - safe to put in a URL"""
+    expire = datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS)
+    return jwt.encode({"sub": user_id, "exp": expire, "scope": "sse"}, SECRET_KEY, algorithm=ALGORITHM)
+
+async def get_stream_user(
+    ticket: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Like get_current_user, but also accepts a stream ticket as ?ticket= for EventSource"""
+    if credentials:
+        return await authenticate_user(credentials.credentials)
+    if ticket:
+        return await authenticate_user(ticket, scope="sse")
+    raise HTTPException(status_code=401, detail="Not authenticated")
+
+async def authenticate_user(token: str, scope: Optional[str] = None) -> dict:
+    """Resolve a customer token; scope must match, so a stream ticket is not an access token"""
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
-        if user_id is None:
+        if user_id is None or payload.get("scope") != scope:
             raise HTTPException(status_code=401, detail="Invalid token")
-        user = await db.users.find_one({"id": user_id})
+        user = principal_cache.get("user", user_id)
         if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
+            user = await db.users.find_one({"id": user_id})
+            if user is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            principal_cache.put("user", user_id, user)
         return user
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def current_phone(user: dict, session=None) -> str:
+    """The customer's M-Pesa number from the database, never from the cached principal"""
+    fresh = await db.users.find_one({"id": user["id"]}, {"_id": 0, "phone": 1}, session=session)
+    if fresh is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    return fresh["phone"]
+
 async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
@@ -242,9 +512,14 @@ async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(
         is_admin = payload.get("is_admin", False)
         if admin_id is None or not is_admin:
             raise HTTPException(status_code=401, detail="Invalid admin token")
-        admin = await db.admins.find_one({"id": admin_id})
+        admin = principal_cache.get("admin", admin_id)
         if admin is None:
-            raise HTTPException(status_code=401, detail="Admin not found")
+            admin = await db.admins.find_one({"id": admin_id})
+            if admin is None:
+                raise HTTPException(status_code=401, detail="Admin not found")
+            principal_cache.put("admin", admin_id, admin)
+        if not admin.get("is_active", True):
+            raise HTTPException(status_code=401, detail="Account is disabled")
         return admin
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid admin token")
@@ -256,7 +531,7 @@ def require_role(allowed_roles: List[AdminRole]):
         return admin
     return role_checker
 
-async def create_audit_log(admin_id: str, admin_name: str, action: str, target_type: str, target_id: str, details: dict):
+async def create_audit_log(admin_id: str, admin_name: str, action: str, target_type: str, target_id: str, details: dict, session=None):
     audit_entry = {
         "id": str(uuid.uuid4()),
         "admin_id": admin_id,
@@ -267,9 +542,744 @@ async def create_audit_log(admin_id: str, admin_name: str, action: str, target_t
         "details": details,
         "timestamp": datetime.utcnow()
     }
-    await db.audit_logs.insert_one(audit_entry)
+    await db.audit_logs.insert_one(audit_entry, session=session)
     return audit_entry
 
+# ============== UNIT OF WORK ==============
+async def _commit_with_retry(session, max_attempts: int):
+    for attempt in range(1, max_attempts + 1):
+        try:
+            await session.commit_transaction()
+            return
+        except PyMongoError as e:
+            if e.has_error_label("UnknownTransactionCommitResult") and attempt < max_attempts:
+                continue
+            raise
+
+def supports_transactions(hello: dict) -> bool:
+    """Whether a server's hello reply is from a replica set member or mongos, which run transactions"""
+    return bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+
+async def check_transaction_support():
+    """Refuse to start against a standalone mongod, where every money path would fail"""
+    hello = await client.admin.command("hello")
+    if not supports_transactions(hello):
+        raise RuntimeError(
+            "MongoDB is running as a standalone server, but deposits, withdrawals and interest runs need "
+            "multi-document transactions. Run it as a replica set (a single-node one is enough) or use Atlas - see README."
+        )
+
+# Idempotency key record of the request being served, set by idempotency_middleware
+current_idempotency_key: ContextVar[Optional[str]] = ContextVar("current_idempotency_key", default=None)
+
+async def run_in_transaction(work: Callable[..., Awaitable], max_attempts: int = TRANSACTION_MAX_ATTEMPTS):
+    """Run work(session) in one transaction, retrying transient errors; work must have no outside side effects"""
+    async with await client.start_session() as session:
+        attempt = 0
+        while True:
+            attempt += 1
+            session.start_transaction()
+            try:
+                result = await work(session)
+                key_id = current_idempotency_key.get()
+                if key_id:
+                    await db.idempotency_keys.update_one(
+                        {"id": key_id}, {"$set": {"committed": True}}, session=session
+                    )
+                await _commit_with_retry(session, max_attempts)
+                return result
+            except PyMongoError as e:
+                if session.in_transaction:
+                    await session.abort_transaction()
+                if e.has_error_label("TransientTransactionError") and attempt < max_attempts:
+                    logger.warning(f"Retrying transaction after transient error (attempt {attempt}): {e}")
+                    continue
+                raise
+            except BaseException:
+                if session.in_transaction:
+                    await session.abort_transaction()
+                raise
+
+async def load_customer_maps(user_ids, include_accounts: bool = True) -> tuple:
+    """Fetch users and accounts for a set of user ids with a single $in query per collection"""
+    ids = list(set(user_ids))
+    if not ids:
+        return {}, {}
+    
+    queries = [db.users.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "name": 1, "phone": 1}).to_list(None)]
+    if include_accounts:
+        queries.append(
+            db.accounts.find({"user_id": {"$in": ids}}, {"_id": 0, "user_id": 1, "balance": 1}).to_list(None)
+        )
+    users, *accounts = await asyncio.gather(*queries)
+    return {u["id"]: u for u in users}, {a["user_id"]: a for a in (accounts[0] if accounts else [])}
+
+async def enrich_transactions(transactions: list) -> list:
+    """Attach customer name, phone and account balance to admin transaction listings"""
+    users, accounts = await load_customer_maps(t["user_id"] for t in transactions)
+    
+    enriched = []
+    for t in transactions:
+        user = users.get(t["user_id"])
+        account = accounts.get(t["user_id"])
+        enriched.append({
+            **money_out(t),
+            "_id": str(t.get("_id", "")),
+            "customer_name": user["name"] if user else "Unknown",
+            "customer_phone": user["phone"] if user else "Unknown",
+            "account_balance": cents_to_kes(account["balance"]) if account else 0
+        })
+    return enriched
+
+async def gather_queries(queries: dict, timeout: float = QUERY_TIMEOUT_SECONDS) -> tuple:
+    """Await named queries concurrently with a timeout each; returns (results, failed)"""
+    names = list(queries)
+    outcomes = await asyncio.gather(
+        *(asyncio.wait_for(query, timeout) for query in queries.values()),
+        return_exceptions=True
+    )
+    
+    results, failed = {}, []
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, Exception):
+            logger.warning(f"Query '{name}' failed: {outcome!r}")
+            results[name] = None
+            failed.append(name)
+        else:
+            results[name] = outcome
+    return results, failed
+
+def first_total(result: Optional[list]) -> int:
+    """Value of a single-row {"_id": None, "total": ...} $group result"""
+    return result[0]["total"] if result else 0
+
+# ============== CUSTOMER SEARCH ==============
+# Admin search is anchored prefix regexes on normalized keys, which use the indexes
+def build_search_keys(name: str, phone: str) -> dict:
+    """Search fields stored on the user document: name tokens, phone prefixes and reversed phone"""
+    digits = re.sub(r"\D", "", phone)
+    local = "0" + digits[3:] if digits.startswith("254") else digits
+    return {
+        "search_name_tokens": sorted(set(re.findall(r"\w+", name.lower()))),
+        "search_phone_keys": sorted({digits, local}),  # "2547..." and "07..." prefixes
+        "search_phone_rev": digits[::-1]               # suffix search, e.g. last 4 digits
+    }
+
+def customer_search_query(search: str) -> dict:
+    """Users filter for an admin search term - a phone fragment or name word prefixes"""
+    term = search.strip().lower()
+    digits = re.sub(r"[\s+\-]", "", term)
+    if digits.isdigit():
+        return {"$or": [
+            {"search_phone_keys": {"$regex": "^" + re.escape(digits)}},
+            {"search_phone_rev": {"$regex": "^" + re.escape(digits[::-1])}}
+        ]}
+    
+    # Every word typed must prefix one of the customer's name tokens
+    tokens = re.findall(r"\w+", term)
+    if not tokens:
+        return {}
+    return {"$and": [{"search_name_tokens": {"$regex": "^" + re.escape(token)}} for token in tokens]}
+
+async def backfill_search_keys(rebuild: bool = False, batch_size: int = 1000) -> int:
+    """Store search keys on users created before they existed (or on every user with rebuild=True)"""
+    query = {} if rebuild else {"search_phone_rev": {"$exists": False}}
+    updated = 0
+    batch = []
+    async for user in db.users.find(query, {"_id": 0, "id": 1, "name": 1, "phone": 1}).batch_size(batch_size):
+        batch.append(UpdateOne({"id": user["id"]}, {"$set": build_search_keys(user["name"], user["phone"])}))
+        if len(batch) >= batch_size:
+            await db.users.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await db.users.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+# ============== PAGINATION HELPERS ==============
+def encode_cursor(sort_value: datetime, doc_id: str) -> str:
+    """Opaque keyset cursor for a (sort_value, id) position"""
+    raw = json.dumps([sort_value.isoformat(), doc_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('utf-8').rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), str(doc_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def fetch_page(
+    collection,
+    query: dict,
+    sort_field: str,
+    direction: int,
+    limit: int,
+    page: int = 1,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    projection: Optional[dict] = None,
+    stages: Optional[list] = None
+) -> tuple:
+    """Fetch one page ordered by (sort_field, id) by cursor seek or page number; returns (rows, cursors)"""
+    if after and before:
+        raise HTTPException(status_code=400, detail="Use either 'after' or 'before', not both")
+    
+    cursor = after or before
+    order = direction
+    if cursor:
+        sort_value, doc_id = decode_cursor(cursor)
+        # 'before' walks backwards from the cursor and the page is flipped back afterwards
+        if before:
+            order = -direction
+        op = "$gt" if order == 1 else "$lt"
+        query = {"$and": [query, {"$or": [
+            {sort_field: {op: sort_value}},
+            {sort_field: sort_value, "id": {op: doc_id}}
+        ]}]}
+    
+    sort = [(sort_field, order), ("id", order)]
+    if stages:
+        pipeline = [{"$match": query}, {"$sort": dict(sort)}]
+        if not cursor:
+            pipeline.append({"$skip": (page - 1) * limit})
+        pipeline.append({"$limit": limit + 1})
+        if projection:
+            pipeline.append({"$project": projection})
+        rows = await collection.aggregate(pipeline + stages).to_list(limit + 1)
+    else:
+        find = collection.find(query, projection).sort(sort)
+        if not cursor:
+            find = find.skip((page - 1) * limit)
+        rows = await find.limit(limit + 1).to_list(limit + 1)
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    elif after:
+        has_next, has_prev = has_more, True
+    else:
+        has_next, has_prev = has_more, page > 1
+    
+    return rows, {
+        "next_cursor": encode_cursor(rows[-1][sort_field], rows[-1]["id"]) if rows and has_next else None,
+        "prev_cursor": encode_cursor(rows[0][sort_field], rows[0]["id"]) if rows and has_prev else None
+    }
+
+class CountCache:
+    """Short-lived cache of count_documents results; count() returns (total, exact)"""
+    
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.estimated = 0
+    
+    async def count(self, collection, query: dict) -> tuple:
+        if not query:
+            self.estimated += 1
+            return await collection.estimated_document_count(), False
+        
+        key = (collection.name, json.dumps(query, sort_keys=True, default=str))
+        now = time.monotonic()
+        cached = self.entries.get(key)
+        if cached and cached[0] > now:
+            self.hits += 1
+            return cached[1], False
+        
+        self.misses += 1
+        total = await collection.count_documents(query)
+        if len(self.entries) >= self.max_entries:
+            self.entries = {k: v for k, v in self.entries.items() if v[0] > now}
+            if len(self.entries) >= self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+        self.entries[key] = (now + self.ttl_seconds, total)
+        return total, True
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "estimated": self.estimated,
+            "hit_rate": self.hits / lookups if lookups else 0
+        }
+
+count_cache = CountCache(COUNT_CACHE_TTL_SECONDS, COUNT_CACHE_MAX_ENTRIES)
+
+# ============== DASHBOARD METRICS ==============
+# The dashboard reads materialized metrics documents, kept up to date with $inc and periodic reconciles
+PENDING_STATUSES = ("pending", "pending_verification")
+
+def metrics_day(value: datetime) -> str:
+    return value.strftime("%Y-%m-%d")
+
+async def record_metrics(inc: dict, daily: Optional[dict] = None, day: Optional[str] = None):
+    writes = []
+    inc = {k: v for k, v in inc.items() if v}
+    if inc:
+        writes.append(db.metrics.update_one({"_id": "dashboard"}, {"$inc": inc}, upsert=True))
+    daily = {k: v for k, v in (daily or {}).items() if v}
+    if daily:
+        writes.append(db.metrics.update_one({"_id": f"daily:{day}"}, {"$inc": daily}, upsert=True))
+    if writes:
+        await asyncio.gather(*writes)
+
+async def record_balance_metrics(old_balance: int, delta: int):
+    """Track AUM and active customers for a committed balance change (best-effort)"""
+    new_balance = old_balance + delta
+    active_delta = int(new_balance > 0) - int(old_balance > 0)
+    try:
+        await record_metrics({"total_aum": delta, "active_customers": active_delta})
+    except Exception as e:
+        logger.warning(f"Balance metrics not recorded, left for the reconcile: {e!r}")
+
+async def record_rollups(transactions: list):
+    """Add newly inserted transactions to the per-day, per-type daily_rollups documents"""
+    by_day = {}
+    for t in transactions:
+        inc = by_day.setdefault(metrics_day(t["created_at"]), {})
+        inc[f"types.{t['type']}.total"] = inc.get(f"types.{t['type']}.total", 0) + t["amount"]
+        inc[f"types.{t['type']}.count"] = inc.get(f"types.{t['type']}.count", 0) + 1
+    if by_day:
+        await db.daily_rollups.bulk_write(
+            [UpdateOne({"_id": day}, {"$inc": inc}, upsert=True) for day, inc in by_day.items()],
+            ordered=False
+        )
+
+async def record_new_user(created_at: datetime):
+    """Count a signup in the metrics and rollups; best-effort like record_balance_metrics"""
+    try:
+        await asyncio.gather(
+            record_metrics({"total_customers": 1}),
+            db.daily_rollups.update_one({"_id": metrics_day(created_at)}, {"$inc": {"new_users": 1}}, upsert=True)
+        )
+    except Exception as e:
+        logger.warning(f"New user metrics not recorded, left for the reconcile and backfill-rollups: {e!r}")
+
+async def record_interest_metrics(credited: list):
+    """Add a committed chunk of interest transactions to the metrics and rollups; best-effort"""
+    # Interest only goes to positive balances, so active customer counts never change here
+    chunk_total = sum(t["amount"] for t in credited)
+    try:
+        await asyncio.gather(
+            record_metrics({"total_aum": chunk_total, "total_interest_paid": chunk_total}),
+            record_rollups(credited)
+        )
+    except Exception as e:
+        logger.warning(f"Interest metrics for {len(credited)} credit(s) not recorded, left for the reconcile and backfill-rollups: {e!r}")
+
+async def backfill_daily_rollups(since: Optional[datetime] = None):
+    """Rebuild daily_rollups from transactions and users with $merge"""
+    match = {"created_at": {"$gte": since}} if since else {}
+    day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}
+    merge = {"$merge": {"into": "daily_rollups", "whenMatched": "merge", "whenNotMatched": "insert"}}
+    
+    await db.transactions.aggregate([
+        {"$match": match},
+        {"$group": {"_id": {"date": day, "type": "$type"}, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}},
+        {"$group": {"_id": "$_id.date", "types": {"$push": {"k": "$_id.type", "v": {"total": "$total", "count": "$count"}}}}},
+        {"$project": {"types": {"$arrayToObject": "$types"}}},
+        merge
+    ]).to_list(None)
+    await db.users.aggregate([
+        {"$match": match},
+        {"$group": {"_id": day, "new_users": {"$sum": 1}}},
+        merge
+    ]).to_list(None)
+
+async def record_transaction_metrics(transaction: dict, old_status: Optional[str], new_status: str):
+    """Apply a transaction insert or status change to the dashboard metrics and rollups (best-effort)"""
+    try:
+        await _record_transaction_metrics(transaction, old_status, new_status)
+    except Exception as e:
+        logger.warning(f"Metrics for transaction {transaction['id']} not recorded, left for the reconcile: {e!r}")
+
+async def _record_transaction_metrics(transaction: dict, old_status: Optional[str], new_status: str):
+    if old_status is None:
+        await record_rollups([transaction])
+    
+    inc = {
+        "pending_transactions": int(new_status in PENDING_STATUSES) - int(old_status in PENDING_STATUSES),
+        "pending_verifications": int(new_status == "pending_verification") - int(old_status == "pending_verification")
+    }
+    if transaction["type"] == "interest" and old_status is None:
+        inc["total_interest_paid"] = transaction["amount"]
+    
+    # Daily deposits/withdrawals count completed transactions by the day they were created
+    daily = {}
+    if transaction["type"] in ("deposit", "withdrawal"):
+        completed_delta = int(new_status == "completed") - int(old_status == "completed")
+        daily[f"daily_{transaction['type']}s"] = completed_delta * transaction["amount"]
+    
+    await record_metrics(inc, daily, metrics_day(transaction["created_at"]))
+
+async def reconcile_dashboard_metrics() -> tuple:
+    """Recompute the dashboard metrics from source collections; returns (metrics, failed)"""
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    def total_pipeline(match: dict) -> list:
+        return [{"$match": match}, {"$group": {"_id": None, "total": {"$sum": "$amount"}}}]
+    
+    results, failed = await gather_queries({
+        # Total AUM (Assets Under Management)
+        "total_aum": db.accounts.aggregate([
+            {"$group": {"_id": None, "total": {"$sum": "$balance"}}}
+        ]).to_list(1),
+        "total_customers": db.users.count_documents({}),
+        # Active customers (with balance > 0)
+        "active_customers": db.accounts.count_documents({"balance": {"$gt": 0}}),
+        "pending_transactions": db.transactions.count_documents({"status": {"$in": list(PENDING_STATUSES)}}),
+        "pending_verifications": db.transactions.count_documents({"status": "pending_verification"}),
+        "daily_deposits": db.transactions.aggregate(total_pipeline(
+            {"type": "deposit", "status": "completed", "created_at": {"$gte": today_start}}
+        )).to_list(1),
+        "daily_withdrawals": db.transactions.aggregate(total_pipeline(
+            {"type": "withdrawal", "status": "completed", "created_at": {"$gte": today_start}}
+        )).to_list(1),
+        "total_interest_paid": db.transactions.aggregate(total_pipeline({"type": "interest"})).to_list(1)
+    })
+    
+    metrics = {}
+    for name, result in results.items():
+        if name in failed:
+            continue
+        metrics[name] = first_total(result) if isinstance(result, list) else result
+    
+    daily = {k: metrics[k] for k in ("daily_deposits", "daily_withdrawals") if k in metrics}
+    totals = {k: v for k, v in metrics.items() if k not in daily}
+    
+    await db.metrics.update_one(
+        {"_id": "dashboard"},
+        {"$set": {**totals, "reconciled_at": datetime.utcnow()}},
+        upsert=True
+    )
+    if daily:
+        await db.metrics.update_one({"_id": f"daily:{metrics_day(today_start)}"}, {"$set": daily}, upsert=True)
+    return metrics, failed
+
+metrics_worker_task: Optional[asyncio.Task] = None
+
+async def metrics_reconcile_worker():
+    while True:
+        try:
+            await reconcile_dashboard_metrics()
+        except Exception as e:
+            logger.error(f"Dashboard metrics reconciliation failed: {e}")
+        await asyncio.sleep(METRICS_RECONCILE_SECONDS)
+
+# ============== LEDGER ==============
+# ledger_entries: append-only, per-account sequenced record of every balance movement.
+# accounts.balance and ledger_seq cache the latest entry and are written in the same transaction
+LEDGER_CONTRA_ACCOUNTS = {
+    "deposit": "mpesa_clearing",
+    "deposit_reversal": "mpesa_clearing",
+    "withdrawal": "mpesa_clearing",
+    "withdrawal_refund": "mpesa_clearing",
+    "interest": "interest_expense",
+    "admin_credit": "admin_adjustments",
+    "admin_debit": "admin_adjustments",
+    "opening_balance": "opening_balances"
+}
+
+def build_ledger_entry(
+    user_id: str,
+    seq: int,
+    amount: int,
+    balance_after: int,
+    entry_type: str,
+    transaction_id: Optional[str],
+    created_at: Optional[datetime] = None
+) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "seq": seq,
+        "amount": amount,  # customer side; the contra account moves by -amount
+        "balance_after": balance_after,
+        "entry_type": entry_type,
+        "contra_account": LEDGER_CONTRA_ACCOUNTS[entry_type],
+        "transaction_id": transaction_id,
+        "created_at": created_at or datetime.utcnow()
+    }
+
+def opening_ledger_entry(user_id: str, balance: int, created_at: Optional[datetime] = None) -> dict:
+    """First ledger entry of an account that predates the ledger, carrying its balance in"""
+    return build_ledger_entry(user_id, 1, balance, balance, "opening_balance", None, created_at)
+
+async def apply_balance_change(
+    user_id: str,
+    delta: int,
+    entry_type: str,
+    transaction_id: Optional[str],
+    session,
+    inc: Optional[dict] = None,
+    set_fields: Optional[dict] = None,
+    guard: Optional[dict] = None
+) -> Optional[dict]:
+    """Move an account balance and append its ledger entry inside run_in_transaction; returns the account before"""
+    update = {"$inc": {"balance": delta, "ledger_seq": 1, "version": 1, **(inc or {})}}
+    if set_fields:
+        update["$set"] = set_fields
+    
+    before = await db.accounts.find_one_and_update(
+        {"user_id": user_id, **(guard or {})},
+        update,
+        projection={"_id": 0, "balance": 1, "ledger_seq": 1, "version": 1},
+        return_document=ReturnDocument.BEFORE,
+        session=session
+    )
+    if before is None:
+        return None
+    
+    now = datetime.utcnow()
+    seq = before.get("ledger_seq")
+    entries = []
+    if seq is None:
+        # Not yet backfilled - open its ledger with the balance it had before this movement
+        await db.accounts.update_one({"user_id": user_id}, {"$inc": {"ledger_seq": 1}}, session=session)
+        entries.append(opening_ledger_entry(user_id, before["balance"], now))
+        seq = 1
+    entries.append(build_ledger_entry(
+        user_id, seq + 1, delta, before["balance"] + delta, entry_type, transaction_id, now
+    ))
+    await db.ledger_entries.insert_many(entries, session=session)
+    return before
+
+async def bump_account_version(user_id: str, session=None, inc: Optional[dict] = None) -> Optional[int]:
+    """Bump an account's version for a transaction write that moves no money"""
+    account = await db.accounts.find_one_and_update(
+        {"user_id": user_id},
+        {"$inc": {"version": 1, **(inc or {})}},
+        projection={"_id": 0, "version": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    return account["version"] if account else None
+
+def next_version(account_before: Optional[dict]) -> Optional[int]:
+    """Account version written by a change, given the document apply_balance_change returned"""
+    return account_before.get("version", 0) + 1 if account_before else None
+
+# Transactions are stamped with the account version they were written at
+def sync_stamp(version: Optional[int]) -> dict:
+    return {"sync_version": version, "updated_at": datetime.utcnow()}
+
+async def stamp_transaction_sync(transaction_id: str, version: Optional[int], session):
+    await db.transactions.update_one({"id": transaction_id}, {"$set": sync_stamp(version)}, session=session)
+
+async def balance_at(user_id: str, at: datetime) -> int:
+    """Account balance as of a point in time - one indexed seek to the last entry at or before it"""
+    entry = await db.ledger_entries.find_one(
+        {"user_id": user_id, "created_at": {"$lte": at}},
+        {"_id": 0, "balance_after": 1},
+        sort=[("created_at", -1), ("seq", -1)]
+    )
+    return entry["balance_after"] if entry else 0
+
+# Lifetime totals of completed transactions kept on the account, by transaction type
+ACCOUNT_COMPLETED_TOTALS = {"deposit": "total_deposits", "withdrawal": "total_withdrawals"}
+
+def account_counters(transaction: dict, old_status: Optional[str], new_status: str) -> dict:
+    """Account counter $inc for a transaction insert (old_status=None) or status change"""
+    inc = {"transaction_count": 1} if old_status is None else {}
+    field = ACCOUNT_COMPLETED_TOTALS.get(transaction["type"])
+    completed_delta = int(new_status == "completed") - int(old_status == "completed")
+    if field and completed_delta:
+        inc[field] = completed_delta * transaction["amount"]
+    return inc
+
+async def backfill_account_counters() -> int:
+    """Recompute the per-account transaction counters from the transactions collection"""
+    def completed_total(type: str) -> dict:
+        is_completed = {"$and": [{"$eq": ["$type", type]}, {"$eq": ["$status", "completed"]}]}
+        return {"$sum": {"$cond": [is_completed, "$amount", 0]}}
+    
+    updated = 0
+    async for account in db.accounts.find({}, {"_id": 0, "user_id": 1}):
+        async def apply(session, user_id=account["user_id"]):
+            totals = await db.transactions.aggregate([
+                {"$match": {"user_id": user_id}},
+                {"$group": {
+                    "_id": None,
+                    "transaction_count": {"$sum": 1},
+                    **{field: completed_total(type) for type, field in ACCOUNT_COMPLETED_TOTALS.items()}
+                }},
+                {"$project": {"_id": 0}}
+            ], session=session).to_list(1)
+            counters = totals[0] if totals else {
+                "transaction_count": 0, **{field: 0 for field in ACCOUNT_COMPLETED_TOTALS.values()}
+            }
+            await db.accounts.update_one({"user_id": user_id}, {"$set": counters}, session=session)
+        
+        await run_in_transaction(apply)
+        updated += 1
+    return updated
+
+async def ledger_started_at(user_id: str) -> Optional[datetime]:
+    """When the ledger started covering an account that predates it, or None"""
+    first = await db.ledger_entries.find_one(
+        {"user_id": user_id, "seq": 1}, {"_id": 0, "entry_type": 1, "created_at": 1}
+    )
+    return first["created_at"] if first and first["entry_type"] == "opening_balance" else None
+
+# Withdrawal statuses in which the amount is off the balance (reserved or paid out)
+WITHDRAWAL_HELD_STATUSES = {"pending", "pending_verification", "processing", "completed"}
+
+def transaction_balance_effect(t: dict) -> int:
+    """Signed effect a transaction in its current status has had on the balance"""
+    if t["type"] in ("deposit", "interest", "admin_credit"):
+        return t["amount"] if t["status"] == "completed" else 0
+    if t["type"] == "withdrawal":
+        return -t["amount"] if t["status"] in WITHDRAWAL_HELD_STATUSES else 0
+    if t["type"] == "admin_debit":
+        return -t["amount"] if t["status"] == "completed" else 0
+    return 0
+
+async def backfill_opening_balances() -> int:
+    """Give accounts that predate the ledger an opening_balance entry for their current balance"""
+    opened = 0
+    async for account in db.accounts.find({"ledger_seq": {"$exists": False}}, {"_id": 0, "user_id": 1}):
+        async def apply(session, user_id=account["user_id"]):
+            current = await db.accounts.find_one_and_update(
+                {"user_id": user_id, "ledger_seq": {"$exists": False}},
+                {"$set": {"ledger_seq": 1}, "$inc": {"version": 1}},
+                projection={"_id": 0, "balance": 1},
+                session=session
+            )
+            if current is None:
+                return False
+            await db.ledger_entries.insert_one(opening_ledger_entry(user_id, current["balance"]), session=session)
+            return True
+        
+        if await run_in_transaction(apply):
+            opened += 1
+    return opened
+
+# Stored money fields that held KES floats before amounts moved to integer cents
+MONEY_MIGRATION_FIELDS = {
+    "accounts": ["balance", "total_interest_earned"],
+    "transactions": ["amount"],
+    "ledger_entries": ["amount", "balance_after"],
+    "interest_runs": ["total_distributed"],
+}
+
+async def migrate_money_to_cents() -> dict:
+    """Convert legacy KES float fields to int64 cents; safe to re-run"""
+    converted = {}
+    for collection, fields in MONEY_MIGRATION_FIELDS.items():
+        for field in fields:
+            result = await db[collection].update_many(
+                {field: {"$type": "double"}},
+                [{"$set": {field: {"$toLong": {"$round": [{"$multiply": [f"${field}", 100]}, 0]}}}}]
+            )
+            converted[f"{collection}.{field}"] = result.modified_count
+    return converted
+
+# ============== TRANSACTION EVENTS ==============
+TRANSACTION_EVENT_PROJECTION = {
+    "_id": 0, "id": 1, "user_id": 1, "type": 1, "amount": 1, "status": 1, "sync_version": 1, "updated_at": 1
+}
+
+def transaction_event(t: dict) -> dict:
+    return {
+        "transaction_id": t["id"],
+        "type": t["type"],
+        "status": t["status"],
+        "amount": cents_to_kes(t["amount"]),
+        "sync_version": t.get("sync_version"),
+        "updated_at": t["updated_at"].isoformat() if t.get("updated_at") else None
+    }
+
+class EventBroker:
+    """Per-worker pub/sub of transaction events to the open event streams"""
+    
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers = {}
+        self.published = 0
+        self.dropped = 0
+    
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+    
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+    
+    def has_subscribers(self, user_id: str) -> bool:
+        return user_id in self.subscribers
+    
+    def publish(self, user_id: str, event: dict):
+        for queue in self.subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+                self.published += 1
+            except asyncio.QueueFull:
+                self.dropped += 1
+    
+    def stats(self) -> dict:
+        return {
+            "streams": sum(len(q) for q in self.subscribers.values()),
+            "customers": len(self.subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+            "change_stream": EVENTS_CHANGE_STREAM
+        }
+
+broker = EventBroker(EVENT_QUEUE_SIZE)
+events_worker_task: Optional[asyncio.Task] = None
+
+async def publish_transaction_change(user_id: str, transaction_id: str):
+    """Push a committed transaction change to the customer's event streams (best-effort)"""
+    if EVENTS_CHANGE_STREAM or not broker.has_subscribers(user_id):
+        # In change stream mode every worker's watcher publishes it
+        return
+    try:
+        t = await db.transactions.find_one({"id": transaction_id}, TRANSACTION_EVENT_PROJECTION)
+    except Exception as e:
+        # Clients catch up through /transactions/sync, so a missed event is not lost data
+        logger.warning(f"Event for transaction {transaction_id} not published: {e!r}")
+        return
+    if t:
+        broker.publish(user_id, transaction_event(t))
+
+async def transaction_change_stream_worker():
+    """Fan transaction status changes from the change stream out to this worker's streams"""
+    pipeline = [{"$match": {
+        "operationType": "update",
+        "updateDescription.updatedFields.status": {"$exists": True}
+    }}]
+    resume_token = None
+    while True:
+        try:
+            async with db.transactions.watch(
+                pipeline, full_document="updateLookup", resume_after=resume_token
+            ) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    t = change.get("fullDocument")
+                    if t and broker.has_subscribers(t["user_id"]):
+                        broker.publish(t["user_id"], transaction_event(t))
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as e:
+            logger.error(f"Transaction change stream error, reconnecting: {e}")
+            await asyncio.sleep(5)
+
 # ============== USER AUTH ROUTES ==============
 @api_router.post("/auth/signup", response_model=TokenResponse)
 async def signup(user_data: UserCreate):
@@ -292,21 +1302,32 @@ async def signup(user_data: UserCreate):
         "id": user_id,
         "phone": phone,
         "name": user_data.name,
-        "pin_hash": hash_pin(user_data.pin),
+        "pin_hash": await hash_pin(user_data.pin),
         "created_at": datetime.utcnow(),
-        "is_active": True
+        "is_active": True,
+        **build_search_keys(user_data.name, phone)
     }
-    await db.users.insert_one(user)
+    try:
+        await db.users.insert_one(user)
+    except DuplicateKeyError:
+        # A concurrent signup with the same phone won the unique index
+        raise HTTPException(status_code=400, detail="Phone number already registered")
     
     account = {
         "id": str(uuid.uuid4()),
         "user_id": user_id,
-        "balance": 0.0,
-        "total_interest_earned": 0.0,
+        "balance": 0,
+        "total_interest_earned": 0,
+        "ledger_seq": 0,
+        "version": 0,
+        "transaction_count": 0,
+        "total_deposits": 0,
+        "total_withdrawals": 0,
         "last_interest_date": None,
         "created_at": datetime.utcnow()
     }
     await db.accounts.insert_one(account)
+    await record_new_user(user["created_at"])
     
     token = create_access_token(user_id)
     
@@ -326,7 +1347,7 @@ async def login(login_data: UserLogin):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid phone number or PIN")
     
-    if not verify_pin(login_data.pin, user["pin_hash"]):
+    if not await verify_pin(login_data.pin, user["pin_hash"]):
         raise HTTPException(status_code=401, detail="Invalid phone number or PIN")
     
     token = create_access_token(user["id"])
@@ -338,15 +1359,43 @@ async def login(login_data: UserLogin):
     )
 
 # ============== USER ACCOUNT ROUTES ==============
+# The account and transaction history responses are validated with an ETag built from the
+# account's version counter, which every balance or transaction write for the customer bumps.
+def account_etag(account: dict) -> str:
+    return f'"{account["id"]}.{account.get("version", 0)}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses weak comparison, and proxies may weaken the tag
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
 @api_router.get("/account", response_model=AccountResponse)
-async def get_account(user = Depends(get_current_user)):
+async def get_account(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user = Depends(get_current_user)
+):
     account = await db.accounts.find_one({"user_id": user["id"]})
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
     
+    etag = account_etag(account)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
     balance = account["balance"]
-    daily_interest = balance * DAILY_INTEREST_RATE
-    annual_yield = balance * ANNUAL_INTEREST_RATE
+    daily_interest = cents_to_kes(balance) * DAILY_INTEREST_RATE
+    annual_yield = cents_to_kes(balance) * ANNUAL_INTEREST_RATE
     
     return AccountResponse(
         id=account["id"],
@@ -360,7 +1409,7 @@ async def get_account(user = Depends(get_current_user)):
 
 @api_router.post("/deposit")
 async def create_deposit(deposit: DepositRequest, user = Depends(get_current_user)):
-    if deposit.amount < 50:
+    if deposit.amount < MIN_TRANSACTION_CENTS:
         raise HTTPException(status_code=400, detail="Minimum deposit is KES 50")
     
     transaction = {
@@ -372,7 +1421,14 @@ async def create_deposit(deposit: DepositRequest, user = Depends(get_current_use
         "description": f"Deposit via M-Pesa Paybill 4114517",
         "created_at": datetime.utcnow()
     }
-    await db.transactions.insert_one(transaction)
+    async def record(session):
+        version = await bump_account_version(user["id"], session, inc=account_counters(transaction, None, "pending"))
+        await db.transactions.insert_one({**transaction, **sync_stamp(version)}, session=session)
+    
+    # The paybill account number is the phone the payment will be matched against
+    phone = await current_phone(user)
+    await run_in_transaction(record)
+    await record_transaction_metrics(transaction, None, "pending")
     
     return {
         "message": "Deposit initiated",
@@ -382,13 +1438,13 @@ async def create_deposit(deposit: DepositRequest, user = Depends(get_current_use
             "step2": "Select 'Lipa na M-Pesa'",
             "step3": "Select 'Pay Bill'",
             "step4": "Enter Business Number: 4114517",
-            "step5": f"Enter Account Number: {user['phone']}",
-            "step6": f"Enter Amount: KES {deposit.amount:,.0f}",
+            "step5": f"Enter Account Number: {phone}",
+            "step6": f"Enter Amount: KES {cents_to_kes(deposit.amount):,.0f}",
             "step7": "Enter your M-Pesa PIN and confirm"
         },
         "paybill": "4114517",
-        "account_number": user["phone"],
-        "amount": deposit.amount
+        "account_number": phone,
+        "amount": cents_to_kes(deposit.amount)
     }
 
 @api_router.post("/deposit/confirm/{transaction_id}")
@@ -405,19 +1461,28 @@ async def confirm_deposit(transaction_id: str, user = Depends(get_current_user))
         raise HTTPException(status_code=404, detail="Transaction not found")
     
     # Set to pending_verification - admin must approve before balance is credited
-    await db.transactions.update_one(
-        {"id": transaction_id},
-        {"$set": {
-            "status": "pending_verification",
-            "customer_confirmed_at": datetime.utcnow(),
-            "mpesa_confirmation": True
-        }}
-    )
+    async def confirm(session):
+        version = await bump_account_version(user["id"], session)
+        result = await db.transactions.update_one(
+            {"id": transaction_id, "status": "pending"},
+            {"$set": {
+                "status": "pending_verification",
+                "customer_confirmed_at": datetime.utcnow(),
+                "mpesa_confirmation": True,
+                **sync_stamp(version)
+            }},
+            session=session
+        )
+        if result.modified_count == 0:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+    
+    await run_in_transaction(confirm)
+    await record_transaction_metrics(transaction, "pending", "pending_verification")
     
     return {
         "message": "Payment confirmation received. Awaiting admin verification.",
         "status": "pending_verification",
-        "amount": transaction["amount"],
+        "amount": cents_to_kes(transaction["amount"]),
         "note": "Your deposit will reflect in your account once verified by admin (usually within 24 hours)."
     }
 
@@ -445,29 +1510,16 @@ async def get_deposit_status(transaction_id: str, user = Depends(get_current_use
         "transaction_id": transaction["id"],
         "status": transaction["status"],
         "message": status_messages.get(transaction["status"], "Unknown status"),
-        "amount": transaction["amount"],
+        "amount": cents_to_kes(transaction["amount"]),
         "created_at": transaction["created_at"]
     }
 
 @api_router.post("/withdraw")
 async def create_withdrawal(withdraw: WithdrawRequest, user = Depends(get_current_user)):
     """Create withdrawal request - requires admin approval"""
-    if withdraw.amount < 50:
+    if withdraw.amount < MIN_TRANSACTION_CENTS:
         raise HTTPException(status_code=400, detail="Minimum withdrawal is KES 50")
     
-    account = await db.accounts.find_one({"user_id": user["id"]})
-    if not account:
-        raise HTTPException(status_code=404, detail="Account not found")
-    
-    if account["balance"] < withdraw.amount:
-        raise HTTPException(status_code=400, detail="Insufficient balance")
-    
-    # Deduct balance immediately to prevent overdraw
-    await db.accounts.update_one(
-        {"user_id": user["id"]},
-        {"$inc": {"balance": -withdraw.amount}}
-    )
-    
     # Create pending withdrawal transaction
     transaction = {
         "id": str(uuid.uuid4()),
@@ -475,18 +1527,44 @@ async def create_withdrawal(withdraw: WithdrawRequest, user = Depends(get_curren
         "type": "withdrawal",
         "amount": withdraw.amount,
         "status": "pending_verification",  # Requires admin approval
-        "description": f"Withdrawal to M-Pesa {user['phone']}",
-        "mpesa_number": user["phone"],
         "created_at": datetime.utcnow(),
         "customer_requested_at": datetime.utcnow()
     }
-    await db.transactions.insert_one(transaction)
+    
+    # Reserve the funds and record the withdrawal atomically. The balance guard on the
+    # update means two concurrent withdrawals can never both pass the funds check.
+    async def reserve(session):
+        # Payout number read in the same transaction, never from the principal cache
+        phone = await current_phone(user, session)
+        transaction.update(description=f"Withdrawal to M-Pesa {phone}", mpesa_number=phone)
+        account = await apply_balance_change(
+            user["id"],
+            -withdraw.amount,
+            "withdrawal",
+            transaction["id"],
+            session,
+            inc=account_counters(transaction, None, "pending_verification"),
+            guard={"balance": {"$gte": withdraw.amount}}
+        )
+        if account is None:
+            if not await db.accounts.find_one({"user_id": user["id"]}, {"_id": 1}, session=session):
+                raise HTTPException(status_code=404, detail="Account not found")
+            raise HTTPException(status_code=400, detail="Insufficient balance")
+        
+        transaction.update(sync_stamp(next_version(account)))
+        await db.transactions.insert_one(dict(transaction), session=session)
+        return account
+    
+    account = await run_in_transaction(reserve)
+    
+    await record_balance_metrics(account["balance"], -withdraw.amount)
+    await record_transaction_metrics(transaction, None, "pending_verification")
     
     return {
         "message": "Withdrawal request submitted",
         "transaction_id": transaction["id"],
-        "amount": withdraw.amount,
-        "destination": user["phone"],
+        "amount": cents_to_kes(withdraw.amount),
+        "destination": transaction["mpesa_number"],
         "status": "pending_verification",
         "note": "Your withdrawal is being processed and will be sent to your M-Pesa within 24 hours after admin verification."
     }
@@ -515,31 +1593,435 @@ async def get_withdrawal_status(transaction_id: str, user = Depends(get_current_
         "transaction_id": transaction["id"],
         "status": transaction["status"],
         "message": status_messages.get(transaction["status"], "Unknown status"),
-        "amount": transaction["amount"],
+        "amount": cents_to_kes(transaction["amount"]),
         "destination": transaction.get("mpesa_number"),
         "created_at": transaction["created_at"],
         "completed_at": transaction.get("completed_at")
     }
 
-@api_router.get("/transactions", response_model=List[TransactionResponse])
-async def get_transactions(user = Depends(get_current_user)):
-    transactions = await db.transactions.find(
-        {"user_id": user["id"]}
-    ).sort("created_at", -1).to_list(100)
-    
-    return [TransactionResponse(
-        id=t["id"],
-        user_id=t["user_id"],
-        type=t["type"],
-        amount=t["amount"],
-        status=t["status"],
-        description=t["description"],
-        created_at=t["created_at"]
-    ) for t in transactions]
+# Only the fields the app renders are read for the customer's history
+TRANSACTION_LIST_PROJECTION = {
+    "_id": 0, "id": 1, "user_id": 1, "type": 1, "amount": 1, "status": 1, "description": 1, "created_at": 1
+}
+
+@api_router.get("/transactions", response_model=TransactionPage)
+async def get_transactions(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    user = Depends(get_current_user)
+):
+    """Transaction history, newest first - pass next_cursor as 'before' for older transactions"""
+    account = await db.accounts.find_one({"user_id": user["id"]}, {"_id": 0, "id": 1, "version": 1})
+    if account:
+        etag = account_etag(account)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+    
+    transactions, cursors = await fetch_page(
+        db.transactions,
+        {"user_id": user["id"]},
+        "created_at",
+        -1,
+        limit,
+        after=before,  # 'before' in time is 'after' in newest-first order
+        projection=TRANSACTION_LIST_PROJECTION
+    )
+    
+    return TransactionPage(
+        transactions=[TransactionResponse(
+            id=t["id"],
+            user_id=t["user_id"],
+            type=t["type"],
+            amount=t["amount"],
+            status=t["status"],
+            description=t["description"],
+            created_at=t["created_at"]
+        ) for t in transactions],
+        next_cursor=cursors["next_cursor"],
+        sync_token=str(account.get("version", 0)) if account else None
+    )
+
+@api_router.get("/transactions/sync", response_model=TransactionSync)
+async def sync_transactions(
+    since: str = Query(..., description="sync_token from a history page or the previous sync"),
+    limit: int = Query(200, ge=1, le=500),
+    user = Depends(get_current_user)
+):
+    """Transactions created or changed since a sync token, in change order"""
+    try:
+        since_version = int(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    
+    # Read the version first: every change at or below it is already committed
+    account = await db.accounts.find_one({"user_id": user["id"]}, {"_id": 0, "version": 1})
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    current = account.get("version", 0)
+    
+    changes = []
+    if current > since_version:
+        changes = await db.transactions.find(
+            {"user_id": user["id"], "sync_version": {"$gt": since_version, "$lte": current}},
+            {**TRANSACTION_LIST_PROJECTION, "sync_version": 1}
+        ).sort("sync_version", 1).limit(limit + 1).to_list(limit + 1)
+    
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    
+    return TransactionSync(
+        transactions=[TransactionResponse(
+            id=t["id"],
+            user_id=t["user_id"],
+            type=t["type"],
+            amount=t["amount"],
+            status=t["status"],
+            description=t["description"],
+            created_at=t["created_at"]
+        ) for t in changes],
+        sync_token=str(changes[-1]["sync_version"] if has_more else current),
+        has_more=has_more
+    )
+
+@api_router.post("/events/ticket")
+async def create_events_ticket(user = Depends(get_current_user)):
+    """Issue a ticket for opening /events from a client that cannot send an Authorization header"""
+    return {"ticket": create_stream_ticket(user["id"]), "expires_in": STREAM_TICKET_SECONDS}
+
+@api_router.get("/events")
+async def stream_events(request: Request, user = Depends(get_stream_user)):
+    """Server-sent events for changes to the customer's transactions, replayed from Last-Event-ID"""
+    queue = broker.subscribe(user["id"])
+    last_event_id = request.headers.get("last-event-id")
+    
+    def format_event(event: dict) -> str:
+        event_id = f"id: {event['sync_version']}\n" if event.get("sync_version") is not None else ""
+        return f"{event_id}event: transaction\ndata: {json.dumps(event)}\n\n"
+    
+    async def events():
+        try:
+            yield f"retry: {int(SSE_KEEPALIVE_SECONDS * 1000)}\n\n"
+            if last_event_id and last_event_id.isdigit():
+                missed = await db.transactions.find(
+                    {"user_id": user["id"], "sync_version": {"$gt": int(last_event_id)}},
+                    TRANSACTION_EVENT_PROJECTION
+                ).sort("sync_version", 1).to_list(EVENT_QUEUE_SIZE)
+                for t in missed:
+                    yield format_event(transaction_event(t))
+            
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event)
+        finally:
+            broker.unsubscribe(user["id"], queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Interest calculation is now admin-only - see /api/admin/distribute-interest
 # Customers can only view their estimated interest on the account endpoint
 
+# ============== STATEMENT BUILDER ==============
+# Statements are rendered once by a background worker and stored; views and downloads read the files
+class StatementFileMissing(Exception):
+    """A stored statement file is gone (e.g. local files lost with an ephemeral disk)"""
+
+class LocalStatementStore:
+    """Statement files on local disk under STATEMENT_DIR"""
+    
+    def __init__(self, directory: Path):
+        self.directory = directory
+    
+    async def save(self, filename: str, data: bytes) -> str:
+        def write():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            partial = self.directory / f".{filename}.partial"
+            partial.write_bytes(data)
+            partial.replace(self.directory / filename)
+        await asyncio.to_thread(write)
+        return filename
+    
+    async def load(self, key: str) -> bytes:
+        try:
+            return await asyncio.to_thread((self.directory / key).read_bytes)
+        except FileNotFoundError:
+            raise StatementFileMissing(key)
+    
+    async def delete(self, key: str):
+        await asyncio.to_thread((self.directory / key).unlink, True)
+
+class GridFSStatementStore:
+    """Statement files in the 'statements' GridFS bucket, shared by every API instance"""
+    
+    def __init__(self, database):
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name="statements")
+    
+    async def save(self, filename: str, data: bytes) -> str:
+        return str(await self.bucket.upload_from_stream(filename, data))
+    
+    async def load(self, key: str) -> bytes:
+        try:
+            stream = await self.bucket.open_download_stream(ObjectId(key))
+        except NoFile:
+            raise StatementFileMissing(key)
+        return await stream.read()
+    
+    async def delete(self, key: str):
+        try:
+            await self.bucket.delete(ObjectId(key))
+        except NoFile:
+            pass
+
+statement_store = GridFSStatementStore(db) if STATEMENT_STORAGE == "gridfs" else LocalStatementStore(STATEMENT_DIR)
+
+STATEMENT_CSV_COLUMNS = ["id", "created_at", "date", "time", "type", "status", "description", "amount"]
+STATEMENT_FORMATS = {"csv": "text/csv", "pdf": "application/pdf"}
+
+def _pdf_text(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def render_pdf(lines: List[str], lines_per_page: int = 60) -> bytes:
+    """Minimal multi-page PDF of monospaced text lines (Courier, A4), written by hand"""
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>"]  # 1 catalog, 2 pages, 3 font
+    kids = []
+    for page_lines in pages:
+        text = "".join(f"({_pdf_text(line)}) Tj T* " for line in page_lines)
+        stream = f"BT /F1 9 Tf 12 TL 40 800 Td {text}ET".encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        ).encode())
+        kids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode()
+    
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+def statement_pdf_lines(request: dict, user: Optional[dict], summary: dict, rows: List[str]) -> List[str]:
+    def kes(cents: Optional[int]) -> str:
+        return f"KES {cents_to_kes(cents):,.2f}" if cents is not None else "Not available"
+    
+    return [
+        "DOLAGLOBO FINANCE - MONEY MARKET FUND STATEMENT",
+        "",
+        f"Customer: {user['name'] if user else 'Unknown'}    Phone: {user['phone'] if user else 'Unknown'}",
+        f"Period:   {request['start_date']:%d %B %Y} to {request['end_date']:%d %B %Y}",
+        "",
+        f"Opening balance   {kes(summary['opening_balance']):>24}",
+        f"Deposits          {kes(summary['total_deposits']):>24}",
+        f"Withdrawals       {kes(summary['total_withdrawals']):>24}",
+        f"Interest          {kes(summary['total_interest']):>24}",
+        f"Closing balance   {kes(summary['closing_balance']):>24}",
+        "",
+        f"{'Date':<10} {'Time':<8}  {'Type':<14} {'Status':<20} {'Amount (KES)':>14}",
+        "-" * 70,
+        *rows,
+        "-" * 70,
+        f"{summary['transaction_count']} transaction(s)"
+    ]
+
+async def build_statement(request_id: str):
+    # Claim atomically - with several instances (or a retry) queuing the same build, only one gets it
+    build_id = str(uuid.uuid4())
+    request = await db.statement_requests.find_one_and_update(
+        {"id": request_id, "artifact_status": "queued"},
+        {"$set": {"artifact_status": "building", "artifact_build_id": build_id, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not request:
+        return
+    
+    try:
+        await _build_claimed_statement(request, build_id)
+    except Exception as e:
+        await db.statement_requests.update_one(
+            {"id": request_id, "artifact_build_id": build_id, "artifact_status": "building"},
+            {"$set": {"artifact_status": "failed", "artifact_error": str(e)}}
+        )
+        raise
+
+async def _build_claimed_statement(request: dict, build_id: str):
+    request_id = request["id"]
+    user_id = request["user_id"]
+    # Mongo dates are millisecond precision
+    opening_at = request["start_date"] - timedelta(milliseconds=1)
+    user, ledger_start, opening, closing = await asyncio.gather(
+        db.users.find_one({"id": user_id}, {"_id": 0, "name": 1, "phone": 1}),
+        ledger_started_at(user_id),
+        balance_at(user_id, opening_at),
+        balance_at(user_id, request["end_date"])
+    )
+    # For an account that predates the ledger, balance_at() knows nothing before the opening
+    # entry - such balances are derived from the period's transactions below, or left unknown
+    if ledger_start and ledger_start > request["end_date"]:
+        closing = None
+    opening_from_ledger = not ledger_start or ledger_start <= opening_at
+    
+    summary = {
+        "opening_balance": opening if opening_from_ledger else None,
+        "closing_balance": closing,
+        "total_deposits": 0,
+        "total_withdrawals": 0,
+        "total_interest": 0,
+        "transaction_count": 0
+    }
+    period_effect = 0
+    csv_buffer = io.StringIO()
+    writer = csv.writer(csv_buffer)
+    writer.writerow(STATEMENT_CSV_COLUMNS)
+    rows = []
+    
+    cursor = db.transactions.find(
+        {"user_id": user_id, "created_at": {"$gte": request["start_date"], "$lte": request["end_date"]}},
+        {"_id": 0, "id": 1, "type": 1, "amount": 1, "status": 1, "description": 1, "created_at": 1}
+    ).sort([("created_at", 1), ("id", 1)])
+    async for t in cursor:
+        summary["transaction_count"] += 1
+        if t["type"] == "deposit" and t["status"] == "completed":
+            summary["total_deposits"] += t["amount"]
+        elif t["type"] == "withdrawal" and t["status"] == "completed":
+            summary["total_withdrawals"] += t["amount"]
+        elif t["type"] == "interest":
+            summary["total_interest"] += t["amount"]
+        period_effect += transaction_balance_effect(t)
+        
+        date, time_of_day = t["created_at"].strftime("%Y-%m-%d"), t["created_at"].strftime("%H:%M:%S")
+        amount = f"{cents_to_kes(t['amount']):.2f}"
+        writer.writerow([
+            t["id"], t["created_at"].isoformat(), date, time_of_day, t["type"], t["status"], t.get("description", ""), amount
+        ])
+        rows.append(f"{date} {time_of_day}  {t['type'][:14]:<14} {t['status'][:20]:<20} {amount:>14}")
+    summary["net_change"] = summary["total_deposits"] - summary["total_withdrawals"] + summary["total_interest"]
+    if summary["opening_balance"] is None and closing is not None:
+        summary["opening_balance"] = closing - period_effect
+        summary["opening_balance_derived"] = True
+    
+    pdf = await asyncio.to_thread(render_pdf, statement_pdf_lines(request, user, summary, rows))
+    # Files are named per build, so a build that lost its claim never overwrites the current ones
+    name = f"statement-{request_id}-{build_id[:8]}"
+    csv_key, pdf_key = await asyncio.gather(
+        statement_store.save(f"{name}.csv", csv_buffer.getvalue().encode("utf-8")),
+        statement_store.save(f"{name}.pdf", pdf)
+    )
+    
+    result = await db.statement_requests.update_one(
+        {"id": request_id, "artifact_build_id": build_id, "artifact_status": "building"},
+        {
+            "$set": {
+                "artifact_status": "ready",
+                "statement": {
+                    **summary,
+                    "customer_name": user["name"] if user else "Unknown",
+                    "customer_phone": user["phone"] if user else "Unknown",
+                    "csv_key": csv_key,
+                    "pdf_key": pdf_key,
+                    "built_at": datetime.utcnow()
+                },
+                "updated_at": datetime.utcnow()
+            },
+            "$unset": {"artifact_error": ""}
+        }
+    )
+    if result.matched_count == 0:
+        # The claim was taken over as stale and another build owns the request now
+        await asyncio.gather(statement_store.delete(csv_key), statement_store.delete(pdf_key))
+        logger.warning(f"Statement {request_id} build {build_id} lost its claim, discarded its files")
+        return
+    
+    # A rebuild replaces the files; drop the previous ones
+    previous = request.get("statement") or {}
+    for key in {previous.get("csv_key"), previous.get("pdf_key")} - {None, csv_key, pdf_key}:
+        await statement_store.delete(key)
+    logger.info(f"Statement {request_id} built with {summary['transaction_count']} transaction(s)")
+
+statement_build_queue: asyncio.Queue = asyncio.Queue()
+statement_worker_task: Optional[asyncio.Task] = None
+
+async def queue_statement_build(request_id: str):
+    """Queue a build unless one is already queued or running"""
+    result = await db.statement_requests.update_one(
+        {"id": request_id, "artifact_status": {"$nin": ["queued", "building"]}},
+        {"$set": {"artifact_status": "queued", "updated_at": datetime.utcnow()}}
+    )
+    if result.modified_count:
+        statement_build_queue.put_nowait(request_id)
+
+async def statement_build_worker():
+    while True:
+        request_id = await statement_build_queue.get()
+        try:
+            await build_statement(request_id)
+        except Exception as e:
+            logger.error(f"Statement build error on {request_id}: {e}")
+        finally:
+            statement_build_queue.task_done()
+
+async def resume_statement_builds():
+    """Queue builds accepted before a restart and re-queue stale ones"""
+    stale_before = datetime.utcnow() - timedelta(seconds=STATEMENT_BUILD_STALE_SECONDS)
+    await db.statement_requests.update_many(
+        {"artifact_status": "building", "updated_at": {"$not": {"$gte": stale_before}}},
+        {"$set": {"artifact_status": "queued", "updated_at": datetime.utcnow()}}
+    )
+    pending = await db.statement_requests.find(
+        {"artifact_status": "queued"}, {"_id": 0, "id": 1}
+    ).sort("created_at", 1).to_list(None)
+    for request in pending:
+        statement_build_queue.put_nowait(request["id"])
+
+async def load_statement_file(request: dict, file_format: str) -> bytes:
+    """Read a built statement file, queueing a rebuild if it is not ready or missing"""
+    if request.get("artifact_status") != "ready":
+        # Requests from before the builder, or whose build failed, are built now
+        await queue_statement_build(request["id"])
+        raise HTTPException(status_code=409, detail="Statement is still being generated, try again shortly")
+    
+    key = request["statement"][f"{file_format}_key"]
+    try:
+        return await statement_store.load(key)
+    except StatementFileMissing as e:
+        logger.warning(f"Statement {request['id']} file {e} is missing, rebuilding")
+        # Only if the file is still current - a rebuild may have just replaced it
+        await db.statement_requests.update_one(
+            {"id": request["id"], "artifact_status": "ready", f"statement.{file_format}_key": key},
+            {"$set": {"artifact_status": "missing", "updated_at": datetime.utcnow()}}
+        )
+        await queue_statement_build(request["id"])
+        raise HTTPException(status_code=409, detail="Statement is being regenerated, try again shortly")
+
+async def read_statement_file(request: dict, file_format: str) -> Response:
+    if file_format not in STATEMENT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {list(STATEMENT_FORMATS)}")
+    
+    data = await load_statement_file(request, file_format)
+    return Response(
+        content=data,
+        media_type=STATEMENT_FORMATS[file_format],
+        headers={"Content-Disposition": f'attachment; filename="statement-{request["id"]}.{file_format}"'}
+    )
+
 # ============== CUSTOMER STATEMENT REQUESTS ==============
 @api_router.post("/statements/request")
 async def request_statement(request: StatementRequest, user = Depends(get_current_user)):
@@ -558,11 +2040,13 @@ async def request_statement(request: StatementRequest, user = Depends(get_curren
         "end_date": end_date,
         "status": "pending",
         "email": request.email or None,
+        "artifact_status": "queued",
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
     
     await db.statement_requests.insert_one(statement_request)
+    statement_build_queue.put_nowait(statement_request["id"])
     
     return {
         "message": "Statement request submitted successfully",
@@ -588,7 +2072,8 @@ async def get_my_statement_requests(user = Depends(get_current_user)):
         "email": r.get("email"),
         "created_at": r["created_at"],
         "sent_at": r.get("sent_at"),
-        "admin_note": r.get("admin_note")
+        "admin_note": r.get("admin_note"),
+        "file_available": statement_file_available(r)
     } for r in requests]
 
 @api_router.get("/statements/request/{request_id}")
@@ -611,9 +2096,28 @@ async def get_statement_request_status(request_id: str, user = Depends(get_curre
         "email": request.get("email"),
         "created_at": request["created_at"],
         "sent_at": request.get("sent_at"),
-        "admin_note": request.get("admin_note")
+        "admin_note": request.get("admin_note"),
+        "file_available": statement_file_available(request)
     }
 
+def statement_file_available(request: dict) -> bool:
+    """Customers can download a statement once an admin has completed or sent it"""
+    return request["status"] in ("completed", "sent") and request.get("artifact_status") == "ready"
+
+@api_router.get("/statements/request/{request_id}/file")
+async def download_my_statement(
+    request_id: str,
+    format: str = Query("pdf"),
+    user = Depends(get_current_user)
+):
+    """Download a completed statement as PDF or CSV"""
+    request = await db.statement_requests.find_one({"id": request_id, "user_id": user["id"]})
+    if not request:
+        raise HTTPException(status_code=404, detail="Statement request not found")
+    if request["status"] not in ("completed", "sent"):
+        raise HTTPException(status_code=409, detail="Statement has not been issued yet")
+    return await read_statement_file(request, format)
+
 @api_router.get("/user/profile")
 async def get_profile(user = Depends(get_current_user)):
     return UserResponse(
@@ -640,7 +2144,7 @@ async def admin_register(admin_data: AdminCreate):
         "id": admin_id,
         "email": admin_data.email.lower(),
         "name": admin_data.name,
-        "password_hash": hash_password(admin_data.password),
+        "password_hash": await hash_password(admin_data.password),
         "role": role.value,
         "created_at": datetime.utcnow(),
         "is_active": True
@@ -667,7 +2171,7 @@ async def admin_login(login_data: AdminLogin):
     if not admin:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if not verify_password(login_data.password, admin["password_hash"]):
+    if not await verify_password(login_data.password, admin["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     if not admin.get("is_active", True):
@@ -700,111 +2204,72 @@ async def get_admin_profile(admin = Depends(get_current_admin)):
 # ============== ADMIN DASHBOARD ROUTES ==============
 @admin_router.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(admin = Depends(get_current_admin)):
-    # Total AUM (Assets Under Management)
-    pipeline = [{"$group": {"_id": None, "total": {"$sum": "$balance"}}}]
-    aum_result = await db.accounts.aggregate(pipeline).to_list(1)
-    total_aum = aum_result[0]["total"] if aum_result else 0
-    
-    # Total customers
-    total_customers = await db.users.count_documents({})
+    today = metrics_day(datetime.utcnow())
+    docs = await db.metrics.find({"_id": {"$in": ["dashboard", f"daily:{today}"]}}).to_list(2)
+    by_id = {d["_id"]: d for d in docs}
     
-    # Active customers (with balance > 0)
-    active_customers = await db.accounts.count_documents({"balance": {"$gt": 0}})
+    if "dashboard" not in by_id:
+        # First load on a fresh database - build the materialized document now
+        metrics, failed = await reconcile_dashboard_metrics()
+        return DashboardStats(**{field: metrics.get(field, 0) for field in DashboardStats.model_fields
+                                 if field != "unavailable"}, unavailable=failed)
     
-    # Pending transactions (both pending and pending_verification)
-    pending_transactions = await db.transactions.count_documents({
-        "status": {"$in": ["pending", "pending_verification"]}
-    })
-    
-    # Pending verifications (deposits awaiting admin approval)
-    pending_verifications = await db.transactions.count_documents({"status": "pending_verification"})
-    
-    # Today's transactions
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # Daily deposits
-    deposit_pipeline = [
-        {"$match": {"type": "deposit", "status": "completed", "created_at": {"$gte": today_start}}},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]
-    deposit_result = await db.transactions.aggregate(deposit_pipeline).to_list(1)
-    daily_deposits = deposit_result[0]["total"] if deposit_result else 0
-    
-    # Daily withdrawals
-    withdrawal_pipeline = [
-        {"$match": {"type": "withdrawal", "status": "completed", "created_at": {"$gte": today_start}}},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]
-    withdrawal_result = await db.transactions.aggregate(withdrawal_pipeline).to_list(1)
-    daily_withdrawals = withdrawal_result[0]["total"] if withdrawal_result else 0
-    
-    # Total interest paid
-    interest_pipeline = [
-        {"$match": {"type": "interest"}},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]
-    interest_result = await db.transactions.aggregate(interest_pipeline).to_list(1)
-    total_interest_paid = interest_result[0]["total"] if interest_result else 0
+    metrics = by_id["dashboard"]
+    daily = by_id.get(f"daily:{today}", {})
     
     return DashboardStats(
-        total_aum=total_aum,
-        total_customers=total_customers,
-        active_customers=active_customers,
-        pending_transactions=pending_transactions,
-        pending_verifications=pending_verifications,
-        daily_deposits=daily_deposits,
-        daily_withdrawals=daily_withdrawals,
-        total_interest_paid=total_interest_paid
+        total_aum=metrics.get("total_aum", 0),
+        total_customers=metrics.get("total_customers", 0),
+        active_customers=metrics.get("active_customers", 0),
+        pending_transactions=metrics.get("pending_transactions", 0),
+        pending_verifications=metrics.get("pending_verifications", 0),
+        daily_deposits=daily.get("daily_deposits", 0),
+        daily_withdrawals=daily.get("daily_withdrawals", 0),
+        total_interest_paid=metrics.get("total_interest_paid", 0)
     )
 
 @admin_router.get("/dashboard/charts")
-async def get_dashboard_charts(admin = Depends(get_current_admin)):
-    # Transaction trends (last 7 days)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    
-    daily_pipeline = [
-        {"$match": {"created_at": {"$gte": seven_days_ago}}},
-        {"$group": {
-            "_id": {
-                "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
-                "type": "$type"
-            },
-            "total": {"$sum": "$amount"},
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"_id.date": 1}}
-    ]
-    daily_data = await db.transactions.aggregate(daily_pipeline).to_list(100)
-    
-    # Customer growth (last 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    growth_pipeline = [
-        {"$match": {"created_at": {"$gte": thirty_days_ago}}},
-        {"$group": {
-            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"_id": 1}}
+async def get_dashboard_charts(
+    days: int = Query(7, ge=1, le=366),
+    growth_days: int = Query(30, ge=1, le=366),
+    admin = Depends(get_current_admin)
+):
+    """Transaction trends and customer growth, read from the pre-aggregated daily_rollups"""
+    now = datetime.utcnow()
+    trends_start = metrics_day(now - timedelta(days=days))
+    growth_start = metrics_day(now - timedelta(days=growth_days))
+    
+    rollups = await db.daily_rollups.find(
+        {"_id": {"$gte": min(trends_start, growth_start)}}
+    ).sort("_id", 1).to_list(None)
+    
+    # Transaction trends
+    transaction_trends = [{
+        "_id": {"date": r["_id"], "type": tx_type},
+        "total": cents_to_kes(totals["total"]),
+        "count": totals["count"]
+    } for r in rollups if r["_id"] >= trends_start for tx_type, totals in sorted(r.get("types", {}).items())]
+    
+    # Customer growth
+    customer_growth = [
+        {"_id": r["_id"], "count": r["new_users"]}
+        for r in rollups if r["_id"] >= growth_start and r.get("new_users")
     ]
-    growth_data = await db.users.aggregate(growth_pipeline).to_list(100)
     
     return {
-        "transaction_trends": daily_data,
-        "customer_growth": growth_data
+        "transaction_trends": transaction_trends,
+        "customer_growth": customer_growth
     }
 
 # ============== ADMIN TRANSACTION ROUTES ==============
-@admin_router.get("/transactions")
-async def get_all_transactions(
-    page: int = Query(1, ge=1),
-    limit: int = Query(20, ge=1, le=100),
-    type: Optional[str] = None,
-    status: Optional[str] = None,
-    customer_search: Optional[str] = None,
-    date_from: Optional[str] = None,
-    date_to: Optional[str] = None,
-    admin = Depends(get_current_admin)
-):
+async def build_transaction_filter(
+    type: Optional[str],
+    status: Optional[str],
+    customer_search: Optional[str],
+    date_from: Optional[str],
+    date_to: Optional[str]
+) -> Optional[dict]:
+    """Admin transaction list/export filter; None when the customer search matches nobody"""
     query = {}
     
     if type:
@@ -827,46 +2292,130 @@ async def get_all_transactions(
             pass
     
     # If searching by customer
-    user_ids = []
     if customer_search:
-        users = await db.users.find({
-            "$or": [
-                {"name": {"$regex": customer_search, "$options": "i"}},
-                {"phone": {"$regex": customer_search, "$options": "i"}}
-            ]
-        }).to_list(100)
+        users = await db.users.find(customer_search_query(customer_search), {"_id": 0, "id": 1}).to_list(100)
         user_ids = [u["id"] for u in users]
-        if user_ids:
-            query["user_id"] = {"$in": user_ids}
-        else:
-            return {"transactions": [], "total": 0, "page": page, "limit": limit}
-    
-    total = await db.transactions.count_documents(query)
-    skip = (page - 1) * limit
+        if not user_ids:
+            return None
+        query["user_id"] = {"$in": user_ids}
     
-    transactions = await db.transactions.find(query).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    return query
+
+@admin_router.get("/transactions")
+async def get_all_transactions(
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    customer_search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    admin = Depends(get_current_admin)
+):
+    query = await build_transaction_filter(type, status, customer_search, date_from, date_to)
+    if query is None:
+        return {"transactions": [], "total": 0, "total_exact": True, "page": page, "limit": limit,
+                "next_cursor": None, "prev_cursor": None}
+    
+    total, total_exact = await count_cache.count(db.transactions, query)
+    transactions, cursors = await fetch_page(
+        db.transactions, query, "created_at", -1, limit, page=page, after=after, before=before
+    )
     
     # Enrich with user data
-    enriched = []
-    for t in transactions:
-        user = await db.users.find_one({"id": t["user_id"]})
-        account = await db.accounts.find_one({"user_id": t["user_id"]})
-        enriched.append({
-            **t,
-            "_id": str(t.get("_id", "")),
-            "customer_name": user["name"] if user else "Unknown",
-            "customer_phone": user["phone"] if user else "Unknown",
-            "account_balance": account["balance"] if account else 0
-        })
+    enriched = await enrich_transactions(transactions)
     
     return {
         "transactions": enriched,
         "total": total,
         "page": page,
         "limit": limit,
-        "pages": (total + limit - 1) // limit
+        "pages": (total + limit - 1) // limit,
+        "total_exact": total_exact,
+        **cursors
     }
 
+EXPORT_COLUMNS = ["id", "created_at", "type", "status", "amount", "user_id", "customer_name", "customer_phone", "description"]
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+@admin_router.get("/transactions/export")
+async def export_transactions(
+    format: str = Query("csv"),
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    customer_search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    admin = Depends(get_current_admin)
+):
+    """Stream every transaction matching the list filters as CSV or NDJSON, newest first"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {list(EXPORT_FORMATS)}")
+    
+    query = await build_transaction_filter(type, status, customer_search, date_from, date_to)
+    
+    await create_audit_log(
+        admin_id=admin["id"],
+        admin_name=admin["name"],
+        action="export_transactions",
+        target_type="system",
+        target_id="transactions",
+        details={"format": format, "type": type, "status": status, "customer_search": customer_search,
+                 "date_from": date_from, "date_to": date_to}
+    )
+    
+    async def render(batch: list) -> str:
+        users, _ = await load_customer_maps((t["user_id"] for t in batch), include_accounts=False)
+        rows = []
+        for t in batch:
+            user = users.get(t["user_id"])
+            rows.append({
+                "id": t["id"],
+                "created_at": t["created_at"].isoformat(),
+                "type": t["type"],
+                "status": t["status"],
+                "amount": cents_to_kes(t["amount"]),
+                "user_id": t["user_id"],
+                "customer_name": user["name"] if user else "Unknown",
+                "customer_phone": user["phone"] if user else "Unknown",
+                "description": t.get("description", "")
+            })
+        
+        if format == "ndjson":
+            return "".join(json.dumps(row) + "\n" for row in rows)
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, EXPORT_COLUMNS).writerows(rows)
+        return buffer.getvalue()
+    
+    async def stream():
+        if format == "csv":
+            yield ",".join(EXPORT_COLUMNS) + "\r\n"
+        if query is None:
+            return
+        
+        cursor = db.transactions.find(
+            query,
+            {"_id": 0, "id": 1, "created_at": 1, "type": 1, "status": 1, "amount": 1, "user_id": 1, "description": 1}
+        ).sort([("created_at", -1), ("id", -1)]).batch_size(EXPORT_BATCH_SIZE)
+        
+        batch = []
+        async for t in cursor:
+            batch.append(t)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                yield await render(batch)
+                batch = []
+        if batch:
+            yield await render(batch)
+    
+    filename = f"transactions-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        stream(),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @admin_router.get("/transactions/{transaction_id}")
 async def get_transaction_detail(transaction_id: str, admin = Depends(get_current_admin)):
     transaction = await db.transactions.find_one({"id": transaction_id})
@@ -883,7 +2432,7 @@ async def get_transaction_detail(transaction_id: str, admin = Depends(get_curren
     
     return {
         "transaction": {
-            **transaction,
+            **money_out(transaction),
             "_id": str(transaction.get("_id", "")),
             "customer_name": user["name"] if user else "Unknown",
             "customer_phone": user["phone"] if user else "Unknown"
@@ -895,101 +2444,123 @@ async def get_transaction_detail(transaction_id: str, admin = Depends(get_curren
             "created_at": user["created_at"] if user else None
         },
         "account": {
-            "balance": account["balance"] if account else 0,
-            "total_interest_earned": account["total_interest_earned"] if account else 0
+            "balance": cents_to_kes(account["balance"]) if account else 0,
+            "total_interest_earned": cents_to_kes(account["total_interest_earned"]) if account else 0
         },
         "transaction_history": [{
-            **t,
+            **money_out(t),
             "_id": str(t.get("_id", ""))
         } for t in user_transactions]
     }
 
+def status_change_balance_delta(transaction: dict, old_status: str, new_status: str) -> int:
+    """Balance effect of moving a transaction from old_status to new_status"""
+    if transaction["type"] == "deposit":
+        # Approve pending_verification deposit (or legacy pending) - credit the balance
+        if old_status in ["pending_verification", "pending"] and new_status == "completed":
+            return transaction["amount"]
+        # Reverse credit if completed deposit is cancelled/failed
+        if old_status == "completed" and new_status in ["failed", "cancelled"]:
+            return -transaction["amount"]
+    
+    elif transaction["type"] == "withdrawal":
+        # If withdrawal is failed/cancelled, return funds to customer
+        if old_status in ["processing", "pending"] and new_status in ["failed", "cancelled"]:
+            return transaction["amount"]
+    
+    return 0
+
 @admin_router.put("/transactions/{transaction_id}/status")
 async def update_transaction_status(
     transaction_id: str,
     update: TransactionStatusUpdate,
     admin = Depends(require_role([AdminRole.TRANSACTION_MANAGER, AdminRole.SUPER_ADMIN]))
 ):
-    transaction = await db.transactions.find_one({"id": transaction_id})
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-    
-    old_status = transaction["status"]
     new_status = update.status.value
     
-    # Update transaction
-    await db.transactions.update_one(
-        {"id": transaction_id},
-        {"$set": {
-            "status": new_status,
-            "status_note": update.note,
-            "updated_at": datetime.utcnow(),
-            "updated_by": admin["id"],
-            "verified_by": admin["name"] if new_status == "completed" else None,
-            "verified_at": datetime.utcnow() if new_status == "completed" else None
-        }}
-    )
-    
-    # Handle balance adjustments for status changes
-    if transaction["type"] == "deposit":
-        # Approve pending_verification deposit - credit the balance
-        if old_status == "pending_verification" and new_status == "completed":
-            await db.accounts.update_one(
-                {"user_id": transaction["user_id"]},
-                {"$inc": {"balance": transaction["amount"]}}
-            )
-            logger.info(f"Deposit {transaction_id} verified by {admin['name']}, credited {transaction['amount']}")
+    async def apply(session):
+        transaction = await db.transactions.find_one({"id": transaction_id}, session=session)
+        if not transaction:
+            raise HTTPException(status_code=404, detail="Transaction not found")
         
-        # Also handle legacy pending -> completed
-        elif old_status == "pending" and new_status == "completed":
-            await db.accounts.update_one(
-                {"user_id": transaction["user_id"]},
-                {"$inc": {"balance": transaction["amount"]}}
-            )
+        old_status = transaction["status"]
+        if old_status == new_status:
+            # Repeated request for a transition that already happened
+            return transaction, None
         
-        # Reverse credit if completed deposit is cancelled/failed
-        elif old_status == "completed" and new_status in ["failed", "cancelled"]:
-            await db.accounts.update_one(
-                {"user_id": transaction["user_id"]},
-                {"$inc": {"balance": -transaction["amount"]}}
+        # Conditional on the status we read, so concurrent admins cannot both apply a transition
+        result = await db.transactions.update_one(
+            {"id": transaction_id, "status": old_status},
+            {"$set": {
+                "status": new_status,
+                "status_note": update.note,
+                "updated_at": datetime.utcnow(),
+                "updated_by": admin["id"],
+                "verified_by": admin["name"] if new_status == "completed" else None,
+                "verified_at": datetime.utcnow() if new_status == "completed" else None
+            }},
+            session=session
+        )
+        if result.modified_count == 0:
+            raise HTTPException(status_code=409, detail="Transaction was updated by someone else, please reload")
+        
+        # Handle balance adjustments for status changes
+        delta = status_change_balance_delta(transaction, old_status, new_status)
+        counters = account_counters(transaction, old_status, new_status)
+        account = None
+        if delta:
+            if transaction["type"] == "deposit":
+                entry_type = "deposit" if delta > 0 else "deposit_reversal"
+            else:
+                entry_type = "withdrawal_refund"
+            account = await apply_balance_change(
+                transaction["user_id"], delta, entry_type, transaction_id, session, inc=counters
             )
-            logger.info(f"Deposit {transaction_id} reversed by {admin['name']}, debited {transaction['amount']}")
+            version = next_version(account)
+        else:
+            version = await bump_account_version(transaction["user_id"], session, inc=counters)
+        await stamp_transaction_sync(transaction_id, version, session)
+        
+        # Create audit log
+        await create_audit_log(
+            admin_id=admin["id"],
+            admin_name=admin["name"],
+            action="update_transaction_status",
+            target_type="transaction",
+            target_id=transaction_id,
+            details={
+                "old_status": old_status,
+                "new_status": new_status,
+                "amount": cents_to_kes(transaction["amount"]),
+                "customer_id": transaction["user_id"],
+                "note": update.note
+            },
+            session=session
+        )
+        return transaction, account
     
-    elif transaction["type"] == "withdrawal":
-        # If withdrawal is failed/cancelled, return funds to customer
-        if old_status in ["processing", "pending"] and new_status in ["failed", "cancelled"]:
-            await db.accounts.update_one(
-                {"user_id": transaction["user_id"]},
-                {"$inc": {"balance": transaction["amount"]}}
-            )
-            logger.info(f"Withdrawal {transaction_id} cancelled by {admin['name']}, returned {transaction['amount']}")
+    transaction, account = await run_in_transaction(apply)
+    old_status = transaction["status"]
     
-    # Create audit log
-    await create_audit_log(
-        admin_id=admin["id"],
-        admin_name=admin["name"],
-        action="update_transaction_status",
-        target_type="transaction",
-        target_id=transaction_id,
-        details={
-            "old_status": old_status,
-            "new_status": new_status,
-            "amount": transaction["amount"],
-            "customer_id": transaction["user_id"],
-            "note": update.note
-        }
-    )
+    if old_status != new_status:
+        await record_transaction_metrics(transaction, old_status, new_status)
+        await publish_transaction_change(transaction["user_id"], transaction_id)
+        if account is not None:
+            delta = status_change_balance_delta(transaction, old_status, new_status)
+            await record_balance_metrics(account["balance"], delta)
+            logger.info(f"{transaction['type'].capitalize()} {transaction_id} moved {old_status} -> {new_status} "
+                        f"by {admin['name']}, balance change {delta}")
     
     return {
-        "message": "Transaction status updated",
+        "message": "Transaction status updated" if old_status != new_status else "Transaction already in this status",
         "old_status": old_status,
         "new_status": new_status,
-        "amount": transaction["amount"]
+        "amount": cents_to_kes(transaction["amount"])
     }
 
 # ============== ADMIN BALANCE ADJUSTMENT ==============
 class BalanceAdjustment(BaseModel):
-    amount: float
+    amount: KesAmount
     type: str  # "credit" or "debit"
     reason: str
 
@@ -1004,29 +2575,15 @@ async def adjust_customer_balance(
     if not user:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    account = await db.accounts.find_one({"user_id": customer_id})
-    if not account:
-        raise HTTPException(status_code=404, detail="Account not found")
-    
     if adjustment.type not in ["credit", "debit"]:
         raise HTTPException(status_code=400, detail="Type must be 'credit' or 'debit'")
     
     if adjustment.amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
     
-    # For debit, check sufficient balance
-    if adjustment.type == "debit" and account["balance"] < adjustment.amount:
-        raise HTTPException(status_code=400, detail="Insufficient balance for debit")
-    
     # Calculate adjustment
     amount_change = adjustment.amount if adjustment.type == "credit" else -adjustment.amount
     
-    # Update balance
-    await db.accounts.update_one(
-        {"user_id": customer_id},
-        {"$inc": {"balance": amount_change}}
-    )
-    
     # Create a transaction record for audit trail
     transaction = {
         "id": str(uuid.uuid4()),
@@ -1040,30 +2597,48 @@ async def adjust_customer_balance(
         "admin_id": admin["id"],
         "admin_name": admin["name"]
     }
-    await db.transactions.insert_one(transaction)
     
-    # Create audit log
-    await create_audit_log(
-        admin_id=admin["id"],
-        admin_name=admin["name"],
-        action=f"balance_{adjustment.type}",
-        target_type="customer",
-        target_id=customer_id,
-        details={
-            "amount": adjustment.amount,
-            "type": adjustment.type,
-            "reason": adjustment.reason,
-            "old_balance": account["balance"],
-            "new_balance": account["balance"] + amount_change
-        }
-    )
+    async def apply(session):
+        # For debit, the update only matches if the balance covers it
+        guard = {"balance": {"$gte": adjustment.amount}} if adjustment.type == "debit" else None
+        account = await apply_balance_change(
+            customer_id, amount_change, f"admin_{adjustment.type}", transaction["id"], session,
+            inc=account_counters(transaction, None, "completed"), guard=guard
+        )
+        if account is None:
+            if not await db.accounts.find_one({"user_id": customer_id}, {"_id": 1}, session=session):
+                raise HTTPException(status_code=404, detail="Account not found")
+            raise HTTPException(status_code=400, detail="Insufficient balance for debit")
+        
+        transaction.update(sync_stamp(next_version(account)))
+        await db.transactions.insert_one(dict(transaction), session=session)
+        
+        # Create audit log
+        await create_audit_log(
+            admin_id=admin["id"],
+            admin_name=admin["name"],
+            action=f"balance_{adjustment.type}",
+            target_type="customer",
+            target_id=customer_id,
+            details={
+                "amount": cents_to_kes(adjustment.amount),
+                "type": adjustment.type,
+                "reason": adjustment.reason,
+                "old_balance": cents_to_kes(account["balance"]),
+                "new_balance": cents_to_kes(account["balance"] + amount_change)
+            },
+            session=session
+        )
+        return account
     
-    updated_account = await db.accounts.find_one({"user_id": customer_id})
+    account = await run_in_transaction(apply)
+    await record_balance_metrics(account["balance"], amount_change)
+    await record_transaction_metrics(transaction, None, "completed")
     
     return {
         "message": f"Balance {adjustment.type}ed successfully",
-        "amount": adjustment.amount,
-        "new_balance": updated_account["balance"],
+        "amount": cents_to_kes(adjustment.amount),
+        "new_balance": cents_to_kes(account["balance"] + amount_change),
         "transaction_id": transaction["id"]
     }
 
@@ -1072,98 +2647,374 @@ class InterestDistribution(BaseModel):
     customer_id: Optional[str] = None  # If None, distribute to all customers
     custom_rate: Optional[float] = None  # Override daily rate if provided
 
-@admin_router.post("/distribute-interest")
-async def distribute_interest(
-    distribution: InterestDistribution = None,
-    admin = Depends(require_role([AdminRole.SUPER_ADMIN]))
-):
-    """
-    Distribute daily interest to customers.
-    Super Admin only.
-    - If customer_id is provided, distribute only to that customer
-    - If customer_id is None, distribute to ALL customers with positive balance
-    - Uses daily rate (15% annual / 365 days) unless custom_rate is provided
-    """
-    daily_rate = DAILY_INTEREST_RATE
-    if distribution and distribution.custom_rate:
-        daily_rate = distribution.custom_rate
-    
-    results = {
-        "total_distributed": 0,
-        "customers_credited": 0,
-        "transactions": []
+class LedgerConflict(Exception):
+    """An account moved between being read and being written by a batched posting"""
+
+def build_interest_transaction(
+    user_id: str, amount: int, description: str, distributed_by: str, created_at: datetime,
+    run: Optional[dict] = None
+) -> dict:
+    transaction = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "type": "interest",
+        "amount": amount,
+        "status": "completed",
+        "description": description,
+        "created_at": created_at,
+        "distributed_by": distributed_by
     }
-    
-    # Build query
-    if distribution and distribution.customer_id:
-        # Single customer
-        accounts = await db.accounts.find({
-            "user_id": distribution.customer_id,
-            "balance": {"$gt": 0}
-        }).to_list(1)
-    else:
-        # All customers with positive balance
-        accounts = await db.accounts.find({"balance": {"$gt": 0}}).to_list(1000)
-    
-    for account in accounts:
-        interest = account["balance"] * daily_rate
-        
+    if run:
+        transaction["interest_run_id"] = run["id"]
+    return transaction
+
+# An interest run credits each account at most once for its interest_date: accounts carry the
+# date of the last run that credited them, and runs only select accounts not yet credited for it
+def interest_due_query(run: dict) -> dict:
+    return {"last_interest_run_date": {"$not": {"$gte": run["interest_date"]}}}
+
+def interest_credit_fields(now: datetime, run: Optional[dict]) -> dict:
+    fields = {"last_interest_date": now}
+    if run:
+        fields["last_interest_run_date"] = run["interest_date"]
+    return fields
+
+async def credit_interest(
+    user_id: str, daily_rate: float, description: str, distributed_by: str, run: Optional[dict] = None
+) -> tuple:
+    """Credit one account's daily interest; returns (transaction, account_before)"""
+    async def apply(session):
+        query = {"user_id": user_id, **(interest_due_query(run) if run else {})}
+        account = await db.accounts.find_one(query, {"_id": 0, "balance": 1}, session=session)
+        interest = apply_rate(account["balance"], daily_rate) if account else 0
         if interest <= 0:
-            continue
+            return None, account
         
-        # Update account
-        await db.accounts.update_one(
-            {"user_id": account["user_id"]},
+        now = datetime.utcnow()
+        transaction = build_interest_transaction(user_id, interest, description, distributed_by, now, run)
+        before = await apply_balance_change(
+            user_id,
+            interest,
+            "interest",
+            transaction["id"],
+            session,
+            inc={"total_interest_earned": interest, **account_counters(transaction, None, "completed")},
+            set_fields=interest_credit_fields(now, run)
+        )
+        transaction.update(sync_stamp(next_version(before)))
+        await db.transactions.insert_one(dict(transaction), session=session)
+        return transaction, before
+    
+    return await run_in_transaction(apply)
+
+async def _flush_interest_batch(
+    accounts: list, daily_rate: float, description: str, distributed_by: str, run: Optional[dict] = None
+) -> list:
+    """Credit one chunk of accounts in one transaction; returns the interest transactions written"""
+    if not accounts:
+        return []
+    
+    now = datetime.utcnow()
+    updates, transactions, entries = [], [], []
+    for account in accounts:
+        interest = apply_rate(account["balance"], daily_rate)
+        seq = account.get("ledger_seq")
+        version = account.get("version")
+        transaction = build_interest_transaction(account["user_id"], interest, description, distributed_by, now, run)
+        transaction.update(sync_version=(version or 0) + 1, updated_at=now)
+        posted = 1
+        if seq is None:
+            # Not yet backfilled - open its ledger first, as apply_balance_change does
+            entries.append(opening_ledger_entry(account["user_id"], account["balance"], now))
+            posted = 2
+        updates.append(UpdateOne(
+            {"user_id": account["user_id"], "ledger_seq": seq, "version": version},
             {
-                "$inc": {"balance": interest, "total_interest_earned": interest},
-                "$set": {"last_interest_date": datetime.utcnow()}
+                "$inc": {
+                    "balance": interest, "total_interest_earned": interest, "ledger_seq": posted, "version": 1,
+                    **account_counters(transaction, None, "completed")
+                },
+                "$set": interest_credit_fields(now, run)
             }
-        )
-        
-        # Create transaction record
-        transaction = {
-            "id": str(uuid.uuid4()),
-            "user_id": account["user_id"],
-            "type": "interest",
-            "amount": interest,
-            "status": "completed",
-            "description": f"Daily interest ({daily_rate * 365 * 100:.1f}% p.a.)",
-            "created_at": datetime.utcnow(),
-            "distributed_by": admin["id"]
-        }
-        await db.transactions.insert_one(transaction)
+        ))
+        transactions.append(transaction)
+        entries.append(build_ledger_entry(
+            account["user_id"], (seq or 0) + posted, interest, account["balance"] + interest, "interest", transaction["id"], now
+        ))
+    
+    async def apply(session):
+        result = await db.accounts.bulk_write(updates, ordered=False, session=session)
+        if result.matched_count != len(updates):
+            raise LedgerConflict()
+        await db.transactions.insert_many([dict(t) for t in transactions], ordered=False, session=session)
+        await db.ledger_entries.insert_many([dict(e) for e in entries], ordered=False, session=session)
+    
+    try:
+        await run_in_transaction(apply)
+        credited = transactions
+    except LedgerConflict:
+        logger.info(f"Interest chunk of {len(accounts)} hit concurrently updated accounts, crediting one by one")
+        credited = []
+        for account in accounts:
+            transaction, _ = await credit_interest(account["user_id"], daily_rate, description, distributed_by, run)
+            if transaction:
+                credited.append(transaction)
+    
+    await record_interest_metrics(credited)
+    return credited
+
+async def run_interest_distribution(
+    query: dict,
+    daily_rate: float,
+    distributed_by: str,
+    on_progress: Optional[Callable[[dict], Awaitable[None]]] = None,
+    run: Optional[dict] = None,
+    results: Optional[dict] = None
+) -> dict:
+    """Credit daily interest to every account matching query, in chunks of INTEREST_BATCH_SIZE"""
+    results = results or {"total_distributed": 0, "customers_credited": 0, "processed": 0}
+    description = f"Daily interest ({daily_rate * 365 * 100:.1f}% p.a.)"
+    if run:
+        query = {**query, **interest_due_query(run)}
+    
+    cursor = db.accounts.find(
+        query,
+        {"_id": 0, "user_id": 1, "balance": 1, "ledger_seq": 1, "version": 1}
+    ).batch_size(INTEREST_BATCH_SIZE)
+    
+    async def flush(accounts: list):
+        credited = await _flush_interest_batch(accounts, daily_rate, description, distributed_by, run)
+        results["total_distributed"] += sum(t["amount"] for t in credited)
+        results["customers_credited"] += len(credited)
+        if on_progress:
+            await on_progress(results)
+    
+    pending = []
+    async for account in cursor:
+        results["processed"] += 1
+        # Balances too small to earn a whole cent are skipped
+        if apply_rate(account["balance"], daily_rate) <= 0:
+            continue
         
-        results["total_distributed"] += interest
-        results["customers_credited"] += 1
-        results["transactions"].append({
-            "user_id": account["user_id"],
-            "interest": interest,
-            "new_balance": account["balance"] + interest
-        })
+        pending.append(account)
+        if len(pending) >= INTEREST_BATCH_SIZE:
+            await flush(pending)
+            pending = []
+    
+    await flush(pending)
+    return results
+
+# ============== INTEREST RUN JOBS ==============
+# Interest runs are executed by a background worker in whichever process claims them first.
+# A run whose process died is queued again and resumes, since credited accounts are no longer due
+interest_run_queue: asyncio.Queue = asyncio.Queue()
+INTEREST_RUN_ACTIVE_STATUSES = ["queued", "running"]
+interest_worker_task: Optional[asyncio.Task] = None
+
+async def interest_run_heartbeat(run_id: str):
+    """Keep a claimed run's updated_at fresh so other instances do not resume it as abandoned"""
+    while True:
+        await asyncio.sleep(INTEREST_RUN_HEARTBEAT_SECONDS)
+        try:
+            await db.interest_runs.update_one(
+                {"id": run_id, "owner": WORKER_ID, "status": "running"},
+                {"$set": {"updated_at": datetime.utcnow()}}
+            )
+        except PyMongoError as e:
+            logger.warning(f"Interest run {run_id} heartbeat failed: {e!r}")
+
+async def execute_interest_run(run_id: str):
+    # Claim atomically - with several instances queuing the same run, only one gets it
+    now = datetime.utcnow()
+    run = await db.interest_runs.find_one_and_update(
+        {"id": run_id, "status": "queued"},
+        [{"$set": {
+            "status": "running",
+            "owner": WORKER_ID,
+            "started_at": {"$ifNull": ["$started_at", now]},
+            "updated_at": now
+        }}],
+        return_document=ReturnDocument.AFTER
+    )
+    if not run:
+        return
+    
+    heartbeat = asyncio.create_task(interest_run_heartbeat(run_id))
+    try:
+        await _execute_claimed_interest_run(run)
+    finally:
+        heartbeat.cancel()
+
+async def _execute_claimed_interest_run(run: dict):
+    run_id = run["id"]
+    owned = {"id": run_id, "owner": WORKER_ID}
+    
+    query = {"balance": {"$gt": 0}}
+    if run.get("customer_id"):
+        query["user_id"] = run["customer_id"]
+    # Runs queued before interest_date existed credit for the day they were requested
+    run.setdefault("interest_date", run["created_at"].replace(hour=0, minute=0, second=0, microsecond=0))
+    
+    # A resumed run picks up the totals of the chunks it committed before it was interrupted
+    done = await db.transactions.aggregate([
+        {"$match": {"interest_run_id": run_id}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}}
+    ]).to_list(1)
+    credited = done[0]["count"] if done else 0
+    resume_from = {
+        "total_distributed": first_total(done), "customers_credited": credited, "processed": credited
+    }
+    total = credited + await db.accounts.count_documents({**query, **interest_due_query(run)})
+    await db.interest_runs.update_one(owned, {"$set": {"total": total, **resume_from}})
+    
+    async def record_progress(progress: dict):
+        await db.interest_runs.update_one(
+            owned,
+            {"$set": {
+                "processed": progress["processed"],
+                "customers_credited": progress["customers_credited"],
+                "total_distributed": progress["total_distributed"],
+                "updated_at": datetime.utcnow()
+            }}
+        )
+    
+    try:
+        results = await run_interest_distribution(
+            query, run["daily_rate"], distributed_by=run["requested_by"], on_progress=record_progress,
+            run=run, results=resume_from
+        )
+    except Exception as e:
+        logger.error(f"Interest run {run_id} failed: {e}")
+        await db.interest_runs.update_one(
+            owned,
+            {"$set": {"status": "failed", "error": str(e), "finished_at": datetime.utcnow()}}
+        )
+        return
+    
+    await db.interest_runs.update_one(
+        owned,
+        {"$set": {"status": "completed", "finished_at": datetime.utcnow()}}
+    )
     
     # Create audit log
     await create_audit_log(
-        admin_id=admin["id"],
-        admin_name=admin["name"],
+        admin_id=run["requested_by"],
+        admin_name=run["requested_by_name"],
         action="distribute_interest",
         target_type="system",
-        target_id="all" if not (distribution and distribution.customer_id) else distribution.customer_id,
+        target_id=run.get("customer_id") or "all",
         details={
-            "daily_rate": daily_rate,
-            "annual_rate": daily_rate * 365,
-            "total_distributed": results["total_distributed"],
+            "run_id": run_id,
+            "daily_rate": run["daily_rate"],
+            "annual_rate": run["daily_rate"] * 365,
+            "total_distributed": cents_to_kes(results["total_distributed"]),
             "customers_credited": results["customers_credited"]
         }
     )
+    logger.info(f"Interest run {run_id} credited {results['customers_credited']} customer(s)")
+
+async def interest_run_worker():
+    while True:
+        run_id = await interest_run_queue.get()
+        try:
+            await execute_interest_run(run_id)
+        except Exception as e:
+            logger.error(f"Interest run worker error on {run_id}: {e}")
+        finally:
+            interest_run_queue.task_done()
+
+async def resume_interest_runs():
+    """Queue runs accepted before a restart and resume ones whose heartbeat stopped"""
+    stale_before = datetime.utcnow() - timedelta(seconds=INTEREST_RUN_STALE_SECONDS)
+    await db.interest_runs.update_many(
+        {"status": "running", "updated_at": {"$not": {"$gte": stale_before}}},
+        {"$set": {"status": "queued", "owner": None, "resumed_at": datetime.utcnow()}}
+    )
+    queued = await db.interest_runs.find(
+        {"status": "queued"}, {"_id": 0, "id": 1}
+    ).sort("created_at", 1).to_list(None)
+    for run in queued:
+        interest_run_queue.put_nowait(run["id"])
+
+@admin_router.post("/distribute-interest", status_code=202)
+async def distribute_interest(
+    distribution: InterestDistribution = None,
+    admin = Depends(require_role([AdminRole.SUPER_ADMIN]))
+):
+    """
+    Queue a daily interest run for customers.
+    Super Admin only.
+    - If customer_id is provided, distribute only to that customer
+    - If customer_id is None, distribute to ALL customers with positive balance
+    - Uses daily rate (15% annual / 365 days) unless custom_rate is provided
+    - Accounts already credited by a run today are skipped
+    The run is executed in the background - poll /api/admin/interest-runs/{run_id} for progress.
+    """
+    daily_rate = DAILY_INTEREST_RATE
+    if distribution and distribution.custom_rate:
+        daily_rate = distribution.custom_rate
+    
+    customer_id = distribution.customer_id if distribution else None
+    
+    now = datetime.utcnow()
+    run = {
+        "id": str(uuid.uuid4()),
+        "customer_id": customer_id,
+        "daily_rate": daily_rate,
+        # Re-running a day - after a failure, or by mistake - only credits accounts it missed
+        "interest_date": now.replace(hour=0, minute=0, second=0, microsecond=0),
+        "status": "queued",
+        "total": None,
+        "processed": 0,
+        "customers_credited": 0,
+        "total_distributed": 0,
+        "requested_by": admin["id"],
+        "requested_by_name": admin["name"],
+        "created_at": now,
+        "started_at": None,
+        "finished_at": None,
+        "error": None
+    }
+    # A second run for the same target while one is active would credit interest twice;
+    # the unique partial index on active runs rejects it even when two requests race
+    try:
+        await db.interest_runs.insert_one(run)
+    except DuplicateKeyError:
+        active = await db.interest_runs.find_one(
+            {"customer_id": customer_id, "status": {"$in": INTEREST_RUN_ACTIVE_STATUSES}}, {"_id": 0, "id": 1, "status": 1}
+        )
+        detail = f"Interest run {active['id']} is already {active['status']}" if active else "An interest run is already active"
+        raise HTTPException(status_code=409, detail=detail)
+    interest_run_queue.put_nowait(run["id"])
     
     return {
-        "message": f"Interest distributed to {results['customers_credited']} customer(s)",
-        "total_distributed": results["total_distributed"],
-        "customers_credited": results["customers_credited"],
+        "message": "Interest run queued",
+        "run_id": run["id"],
+        "status": "queued",
         "daily_rate": daily_rate,
         "annual_rate": daily_rate * 365
     }
 
+@admin_router.get("/interest-runs/{run_id}")
+async def get_interest_run(run_id: str, admin = Depends(get_current_admin)):
+    """Get progress of a background interest run"""
+    run = await db.interest_runs.find_one({"id": run_id}, {"_id": 0})
+    if not run:
+        raise HTTPException(status_code=404, detail="Interest run not found")
+    
+    throughput = None
+    if run.get("started_at"):
+        elapsed = ((run.get("finished_at") or datetime.utcnow()) - run["started_at"]).total_seconds()
+        if elapsed > 0:
+            throughput = run["processed"] / elapsed
+    
+    return {
+        **run,
+        "total_distributed": cents_to_kes(run["total_distributed"]),
+        "annual_rate": run["daily_rate"] * 365,
+        "throughput_per_second": throughput
+    }
+
 @admin_router.post("/distribute-interest/{customer_id}")
 async def distribute_interest_to_customer(
     customer_id: str,
@@ -1178,37 +3029,17 @@ async def distribute_interest_to_customer(
     if not user:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    account = await db.accounts.find_one({"user_id": customer_id})
-    if not account:
+    daily_rate = custom_rate if custom_rate else DAILY_INTEREST_RATE
+    description = f"Daily interest ({daily_rate * 365 * 100:.1f}% p.a.)"
+    transaction, account = await credit_interest(customer_id, daily_rate, description, admin["id"])
+    if account is None:
         raise HTTPException(status_code=404, detail="Account not found")
-    
-    if account["balance"] <= 0:
+    if transaction is None:
         raise HTTPException(status_code=400, detail="Customer has no balance to earn interest")
     
-    daily_rate = custom_rate if custom_rate else DAILY_INTEREST_RATE
-    interest = account["balance"] * daily_rate
-    
-    # Update account
-    await db.accounts.update_one(
-        {"user_id": customer_id},
-        {
-            "$inc": {"balance": interest, "total_interest_earned": interest},
-            "$set": {"last_interest_date": datetime.utcnow()}
-        }
-    )
-    
-    # Create transaction record
-    transaction = {
-        "id": str(uuid.uuid4()),
-        "user_id": customer_id,
-        "type": "interest",
-        "amount": interest,
-        "status": "completed",
-        "description": f"Daily interest ({daily_rate * 365 * 100:.1f}% p.a.)",
-        "created_at": datetime.utcnow(),
-        "distributed_by": admin["id"]
-    }
-    await db.transactions.insert_one(transaction)
+    interest = transaction["amount"]
+    await record_balance_metrics(account["balance"], interest)
+    await record_transaction_metrics(transaction, None, "completed")
     
     # Create audit log
     await create_audit_log(
@@ -1219,10 +3050,10 @@ async def distribute_interest_to_customer(
         target_id=customer_id,
         details={
             "daily_rate": daily_rate,
-            "interest_amount": interest,
+            "interest_amount": cents_to_kes(interest),
             "customer_name": user["name"],
-            "old_balance": account["balance"],
-            "new_balance": account["balance"] + interest
+            "old_balance": cents_to_kes(account["balance"]),
+            "new_balance": cents_to_kes(account["balance"] + interest)
         }
     )
     
@@ -1230,8 +3061,8 @@ async def distribute_interest_to_customer(
         "message": f"Interest distributed to {user['name']}",
         "customer_id": customer_id,
         "customer_name": user["name"],
-        "interest": interest,
-        "new_balance": account["balance"] + interest,
+        "interest": cents_to_kes(interest),
+        "new_balance": cents_to_kes(account["balance"] + interest),
         "daily_rate": daily_rate
     }
 
@@ -1240,35 +3071,29 @@ async def distribute_interest_to_customer(
 async def get_pending_withdrawals(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
     admin = Depends(get_current_admin)
 ):
     """Get all withdrawals pending admin verification"""
     query = {"type": "withdrawal", "status": "pending_verification"}
     
-    total = await db.transactions.count_documents(query)
-    skip = (page - 1) * limit
-    
-    transactions = await db.transactions.find(query).sort("created_at", 1).skip(skip).limit(limit).to_list(limit)
+    total, total_exact = await count_cache.count(db.transactions, query)
+    transactions, cursors = await fetch_page(
+        db.transactions, query, "created_at", 1, limit, page=page, after=after, before=before
+    )
     
     # Enrich with user data
-    enriched = []
-    for t in transactions:
-        user = await db.users.find_one({"id": t["user_id"]})
-        account = await db.accounts.find_one({"user_id": t["user_id"]})
-        enriched.append({
-            **t,
-            "_id": str(t.get("_id", "")),
-            "customer_name": user["name"] if user else "Unknown",
-            "customer_phone": user["phone"] if user else "Unknown",
-            "account_balance": account["balance"] if account else 0
-        })
+    enriched = await enrich_transactions(transactions)
     
     return {
         "transactions": enriched,
         "total": total,
         "page": page,
         "limit": limit,
-        "pages": (total + limit - 1) // limit
+        "pages": (total + limit - 1) // limit,
+        "total_exact": total_exact,
+        **cursors
     }
 
 @admin_router.post("/withdrawals/{transaction_id}/approve")
@@ -1278,47 +3103,53 @@ async def approve_withdrawal(
     admin = Depends(require_role([AdminRole.TRANSACTION_MANAGER, AdminRole.SUPER_ADMIN]))
 ):
     """Approve a pending withdrawal - marks as completed"""
-    transaction = await db.transactions.find_one({
-        "id": transaction_id,
-        "type": "withdrawal",
-        "status": "pending_verification"
-    })
-    
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Pending withdrawal not found")
-    
-    user = await db.users.find_one({"id": transaction["user_id"]})
-    
-    # Mark as completed - balance was already deducted
-    await db.transactions.update_one(
-        {"id": transaction_id},
-        {"$set": {
-            "status": "completed",
-            "completed_at": datetime.utcnow(),
-            "verified_by": admin["name"],
-            "verified_at": datetime.utcnow(),
-            "admin_note": note
-        }}
-    )
+    async def apply(session):
+        # Mark as completed - balance was already deducted. Conditional on the pending status,
+        # so a repeated approval matches nothing.
+        transaction = await db.transactions.find_one_and_update(
+            {"id": transaction_id, "type": "withdrawal", "status": "pending_verification"},
+            {"$set": {
+                "status": "completed",
+                "completed_at": datetime.utcnow(),
+                "verified_by": admin["name"],
+                "verified_at": datetime.utcnow(),
+                "admin_note": note
+            }},
+            session=session
+        )
+        if not transaction:
+            raise HTTPException(status_code=404, detail="Pending withdrawal not found")
+        
+        version = await bump_account_version(
+            transaction["user_id"], session, inc=account_counters(transaction, "pending_verification", "completed")
+        )
+        await stamp_transaction_sync(transaction_id, version, session)
+        user = await db.users.find_one({"id": transaction["user_id"]}, session=session)
+        
+        # Create audit log
+        await create_audit_log(
+            admin_id=admin["id"],
+            admin_name=admin["name"],
+            action="approve_withdrawal",
+            target_type="transaction",
+            target_id=transaction_id,
+            details={
+                "amount": cents_to_kes(transaction["amount"]),
+                "customer_id": transaction["user_id"],
+                "customer_name": user["name"] if user else "Unknown",
+                "mpesa_number": transaction.get("mpesa_number"),
+                "note": note
+            },
+            session=session
+        )
+        return transaction
     
-    # Create audit log
-    await create_audit_log(
-        admin_id=admin["id"],
-        admin_name=admin["name"],
-        action="approve_withdrawal",
-        target_type="transaction",
-        target_id=transaction_id,
-        details={
-            "amount": transaction["amount"],
-            "customer_id": transaction["user_id"],
-            "customer_name": user["name"] if user else "Unknown",
-            "mpesa_number": transaction.get("mpesa_number"),
-            "note": note
-        }
-    )
+    transaction = await run_in_transaction(apply)
+    await record_transaction_metrics(transaction, "pending_verification", "completed")
+    await publish_transaction_change(transaction["user_id"], transaction_id)
     
     return {
-        "message": f"Withdrawal of KES {transaction['amount']:,.2f} approved and sent to M-Pesa",
+        "message": f"Withdrawal of KES {cents_to_kes(transaction['amount']):,.2f} approved and sent to M-Pesa",
         "transaction_id": transaction_id,
         "status": "completed"
     }
@@ -1330,53 +3161,55 @@ async def reject_withdrawal(
     admin = Depends(require_role([AdminRole.TRANSACTION_MANAGER, AdminRole.SUPER_ADMIN]))
 ):
     """Reject a pending withdrawal - returns funds to customer"""
-    transaction = await db.transactions.find_one({
-        "id": transaction_id,
-        "type": "withdrawal",
-        "status": "pending_verification"
-    })
-    
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Pending withdrawal not found")
-    
-    user = await db.users.find_one({"id": transaction["user_id"]})
-    
-    # Return funds to customer
-    await db.accounts.update_one(
-        {"user_id": transaction["user_id"]},
-        {"$inc": {"balance": transaction["amount"]}}
-    )
-    
-    # Mark as failed
-    await db.transactions.update_one(
-        {"id": transaction_id},
-        {"$set": {
-            "status": "failed",
-            "failed_at": datetime.utcnow(),
-            "rejected_by": admin["name"],
-            "admin_note": note or "Withdrawal rejected by admin",
-            "funds_returned": True
-        }}
-    )
+    async def apply(session):
+        # Mark as failed
+        transaction = await db.transactions.find_one_and_update(
+            {"id": transaction_id, "type": "withdrawal", "status": "pending_verification"},
+            {"$set": {
+                "status": "failed",
+                "failed_at": datetime.utcnow(),
+                "rejected_by": admin["name"],
+                "admin_note": note or "Withdrawal rejected by admin",
+                "funds_returned": True
+            }},
+            session=session
+        )
+        if not transaction:
+            raise HTTPException(status_code=404, detail="Pending withdrawal not found")
+        
+        # Return funds to customer
+        account = await apply_balance_change(
+            transaction["user_id"], transaction["amount"], "withdrawal_refund", transaction_id, session
+        )
+        await stamp_transaction_sync(transaction_id, next_version(account), session)
+        user = await db.users.find_one({"id": transaction["user_id"]}, session=session)
+        
+        # Create audit log
+        await create_audit_log(
+            admin_id=admin["id"],
+            admin_name=admin["name"],
+            action="reject_withdrawal",
+            target_type="transaction",
+            target_id=transaction_id,
+            details={
+                "amount": cents_to_kes(transaction["amount"]),
+                "customer_id": transaction["user_id"],
+                "customer_name": user["name"] if user else "Unknown",
+                "funds_returned": True,
+                "note": note
+            },
+            session=session
+        )
+        return transaction, account
     
-    # Create audit log
-    await create_audit_log(
-        admin_id=admin["id"],
-        admin_name=admin["name"],
-        action="reject_withdrawal",
-        target_type="transaction",
-        target_id=transaction_id,
-        details={
-            "amount": transaction["amount"],
-            "customer_id": transaction["user_id"],
-            "customer_name": user["name"] if user else "Unknown",
-            "funds_returned": True,
-            "note": note
-        }
-    )
+    transaction, account = await run_in_transaction(apply)
+    if account is not None:
+        await record_balance_metrics(account["balance"], transaction["amount"])
+    await record_transaction_metrics(transaction, "pending_verification", "failed")
+    await publish_transaction_change(transaction["user_id"], transaction_id)
     
     return {
-        "message": f"Withdrawal rejected. KES {transaction['amount']:,.2f} returned to customer",
+        "message": f"Withdrawal rejected. KES {cents_to_kes(transaction['amount']):,.2f} returned to customer",
         "transaction_id": transaction_id,
         "status": "failed"
     }
@@ -1388,56 +3221,59 @@ async def reverse_completed_withdrawal(
     admin = Depends(require_role([AdminRole.SUPER_ADMIN]))
 ):
     """Super Admin can reverse a completed withdrawal if it failed on M-Pesa side"""
-    transaction = await db.transactions.find_one({
-        "id": transaction_id,
-        "type": "withdrawal",
-        "status": "completed"
-    })
-    
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Completed withdrawal not found")
-    
-    user = await db.users.find_one({"id": transaction["user_id"]})
-    
-    # Return funds to customer
-    await db.accounts.update_one(
-        {"user_id": transaction["user_id"]},
-        {"$inc": {"balance": transaction["amount"]}}
-    )
-    
-    # Mark as reversed
-    await db.transactions.update_one(
-        {"id": transaction_id},
-        {"$set": {
-            "status": "reversed",
-            "reversed_at": datetime.utcnow(),
-            "reversed_by": admin["name"],
-            "reversal_reason": reason,
-            "funds_returned": True
-        }}
-    )
+    async def apply(session):
+        # Mark as reversed
+        transaction = await db.transactions.find_one_and_update(
+            {"id": transaction_id, "type": "withdrawal", "status": "completed"},
+            {"$set": {
+                "status": "reversed",
+                "reversed_at": datetime.utcnow(),
+                "reversed_by": admin["name"],
+                "reversal_reason": reason,
+                "funds_returned": True
+            }},
+            session=session
+        )
+        if not transaction:
+            raise HTTPException(status_code=404, detail="Completed withdrawal not found")
+        
+        # Return funds to customer
+        account = await apply_balance_change(
+            transaction["user_id"], transaction["amount"], "withdrawal_refund", transaction_id, session,
+            inc=account_counters(transaction, "completed", "reversed")
+        )
+        await stamp_transaction_sync(transaction_id, next_version(account), session)
+        user = await db.users.find_one({"id": transaction["user_id"]}, session=session)
+        
+        # Create audit log
+        await create_audit_log(
+            admin_id=admin["id"],
+            admin_name=admin["name"],
+            action="reverse_withdrawal",
+            target_type="transaction",
+            target_id=transaction_id,
+            details={
+                "amount": cents_to_kes(transaction["amount"]),
+                "customer_id": transaction["user_id"],
+                "customer_name": user["name"] if user else "Unknown",
+                "reason": reason,
+                "funds_returned": True
+            },
+            session=session
+        )
+        return transaction, account, user
     
-    # Create audit log
-    await create_audit_log(
-        admin_id=admin["id"],
-        admin_name=admin["name"],
-        action="reverse_withdrawal",
-        target_type="transaction",
-        target_id=transaction_id,
-        details={
-            "amount": transaction["amount"],
-            "customer_id": transaction["user_id"],
-            "customer_name": user["name"] if user else "Unknown",
-            "reason": reason,
-            "funds_returned": True
-        }
-    )
+    transaction, account, user = await run_in_transaction(apply)
+    if account is not None:
+        await record_balance_metrics(account["balance"], transaction["amount"])
+    await record_transaction_metrics(transaction, "completed", "reversed")
+    await publish_transaction_change(transaction["user_id"], transaction_id)
     
     return {
-        "message": f"Withdrawal reversed. KES {transaction['amount']:,.2f} returned to {user['name'] if user else 'customer'}",
+        "message": f"Withdrawal reversed. KES {cents_to_kes(transaction['amount']):,.2f} returned to {user['name'] if user else 'customer'}",
         "transaction_id": transaction_id,
         "status": "reversed",
-        "new_customer_balance": (await db.accounts.find_one({"user_id": transaction["user_id"]}))["balance"]
+        "new_customer_balance": cents_to_kes(account["balance"] + transaction["amount"]) if account else 0
     }
 
 # ============== ADMIN STATEMENT REQUESTS ==============
@@ -1446,6 +3282,8 @@ async def get_all_statement_requests(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
     status: Optional[str] = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
     admin = Depends(get_current_admin)
 ):
     """Get all statement requests for admin review"""
@@ -1453,22 +3291,23 @@ async def get_all_statement_requests(
     if status:
         query["status"] = status
     
-    total = await db.statement_requests.count_documents(query)
-    skip = (page - 1) * limit
-    
-    requests = await db.statement_requests.find(query).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    total, total_exact = await count_cache.count(db.statement_requests, query)
+    requests, cursors = await fetch_page(
+        db.statement_requests, query, "created_at", -1, limit, page=page, after=after, before=before
+    )
     
     # Enrich with user data
+    users, accounts = await load_customer_maps(r["user_id"] for r in requests)
     enriched = []
     for r in requests:
-        user = await db.users.find_one({"id": r["user_id"]})
-        account = await db.accounts.find_one({"user_id": r["user_id"]})
+        user = users.get(r["user_id"])
+        account = accounts.get(r["user_id"])
         enriched.append({
             "id": r["id"],
             "user_id": r["user_id"],
             "customer_name": user["name"] if user else "Unknown",
             "customer_phone": user["phone"] if user else "Unknown",
-            "customer_balance": account["balance"] if account else 0,
+            "customer_balance": cents_to_kes(account["balance"]) if account else 0,
             "months": r["months"],
             "start_date": r["start_date"],
             "end_date": r["end_date"],
@@ -1486,7 +3325,9 @@ async def get_all_statement_requests(
         "total": total,
         "page": page,
         "limit": limit,
-        "pages": (total + limit - 1) // limit
+        "pages": (total + limit - 1) // limit,
+        "total_exact": total_exact,
+        **cursors
     }
 
 @admin_router.get("/statements/pending")
@@ -1497,9 +3338,10 @@ async def get_pending_statement_requests(admin = Depends(get_current_admin)):
     
     pending = await db.statement_requests.find({"status": "pending"}).sort("created_at", 1).limit(10).to_list(10)
     
+    users, _ = await load_customer_maps(r["user_id"] for r in pending)
     enriched = []
     for r in pending:
-        user = await db.users.find_one({"id": r["user_id"]})
+        user = users.get(r["user_id"])
         enriched.append({
             "id": r["id"],
             "customer_name": user["name"] if user else "Unknown",
@@ -1516,24 +3358,17 @@ async def get_pending_statement_requests(admin = Depends(get_current_admin)):
 
 @admin_router.get("/statements/{request_id}")
 async def get_statement_request_detail(request_id: str, admin = Depends(get_current_admin)):
-    """Get details of a specific statement request including transaction data"""
+    """Get details of a specific statement request from its built summary and CSV file"""
     request = await db.statement_requests.find_one({"id": request_id})
     if not request:
         raise HTTPException(status_code=404, detail="Statement request not found")
     
-    user = await db.users.find_one({"id": request["user_id"]})
-    account = await db.accounts.find_one({"user_id": request["user_id"]})
-    
-    # Get transactions for the period
-    transactions = await db.transactions.find({
-        "user_id": request["user_id"],
-        "created_at": {"$gte": request["start_date"], "$lte": request["end_date"]}
-    }).sort("created_at", -1).to_list(1000)
-    
-    # Calculate summary
-    deposits = sum(t["amount"] for t in transactions if t["type"] == "deposit" and t["status"] == "completed")
-    withdrawals = sum(t["amount"] for t in transactions if t["type"] == "withdrawal" and t["status"] == "completed")
-    interest = sum(t["amount"] for t in transactions if t["type"] == "interest")
+    csv_data = await load_statement_file(request, "csv")
+    account = await db.accounts.find_one(
+        {"user_id": request["user_id"]}, {"_id": 0, "balance": 1, "total_interest_earned": 1}
+    )
+    statement = request["statement"]
+    rows = list(csv.DictReader(io.StringIO(csv_data.decode("utf-8"))))
     
     return {
         "request": {
@@ -1546,35 +3381,37 @@ async def get_statement_request_detail(request_id: str, admin = Depends(get_curr
             "created_at": request["created_at"]
         },
         "customer": {
-            "id": user["id"] if user else None,
-            "name": user["name"] if user else "Unknown",
-            "phone": user["phone"] if user else "Unknown",
-            "current_balance": account["balance"] if account else 0,
-            "total_interest_earned": account["total_interest_earned"] if account else 0
+            "id": request["user_id"],
+            "name": statement["customer_name"],
+            "phone": statement["customer_phone"],
+            "current_balance": cents_to_kes(account["balance"]) if account else 0,
+            "total_interest_earned": cents_to_kes(account["total_interest_earned"]) if account else 0
         },
         "summary": {
-            "total_deposits": deposits,
-            "total_withdrawals": withdrawals,
-            "total_interest": interest,
-            "net_change": deposits - withdrawals + interest,
-            "transaction_count": len(transactions)
+            "total_deposits": cents_to_kes(statement["total_deposits"]),
+            "total_withdrawals": cents_to_kes(statement["total_withdrawals"]),
+            "total_interest": cents_to_kes(statement["total_interest"]),
+            "net_change": cents_to_kes(statement["net_change"]),
+            "transaction_count": statement["transaction_count"],
+            "opening_balance": cents_to_kes(statement["opening_balance"]) if statement["opening_balance"] is not None else None,
+            "closing_balance": cents_to_kes(statement["closing_balance"]) if statement["closing_balance"] is not None else None
         },
-        "transactions": [{
-            "id": t["id"],
-            "type": t["type"],
-            "amount": t["amount"],
-            "status": t["status"],
-            "description": t.get("description", ""),
-            "created_at": t["created_at"],
-            "date": t["created_at"].strftime("%Y-%m-%d"),
-            "time": t["created_at"].strftime("%H:%M:%S"),
-            "day": t["created_at"].strftime("%d"),
-            "month": t["created_at"].strftime("%B"),
-            "year": t["created_at"].strftime("%Y"),
-            "datetime_formatted": t["created_at"].strftime("%d %B %Y at %H:%M")
-        } for t in transactions]
+        "transactions": [{**row, "amount": float(row["amount"])} for row in rows],
+        "built_at": statement["built_at"]
     }
 
+@admin_router.get("/statements/{request_id}/file")
+async def download_statement(
+    request_id: str,
+    format: str = Query("pdf"),
+    admin = Depends(get_current_admin)
+):
+    """Download the built statement as PDF or CSV"""
+    request = await db.statement_requests.find_one({"id": request_id})
+    if not request:
+        raise HTTPException(status_code=404, detail="Statement request not found")
+    return await read_statement_file(request, format)
+
 class StatementAction(BaseModel):
     action: str  # "process", "complete", "send", "reject"
     note: Optional[str] = None
@@ -1595,6 +3432,11 @@ async def process_statement_request(
     if action_data.action not in valid_actions:
         raise HTTPException(status_code=400, detail=f"Invalid action. Must be one of: {valid_actions}")
     
+    # What is completed or sent is the built file, so it has to exist first
+    if action_data.action in ("complete", "send") and request.get("artifact_status") != "ready":
+        await queue_statement_build(request_id)
+        raise HTTPException(status_code=409, detail="Statement is still being generated, try again shortly")
+    
     update_data = {
         "updated_at": datetime.utcnow(),
         "processed_by": admin["id"],
@@ -1653,35 +3495,29 @@ async def process_statement_request(
 async def get_pending_verifications(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
     admin = Depends(get_current_admin)
 ):
     """Get all transactions pending admin verification"""
     query = {"status": "pending_verification"}
     
-    total = await db.transactions.count_documents(query)
-    skip = (page - 1) * limit
-    
-    transactions = await db.transactions.find(query).sort("created_at", 1).skip(skip).limit(limit).to_list(limit)
+    total, total_exact = await count_cache.count(db.transactions, query)
+    transactions, cursors = await fetch_page(
+        db.transactions, query, "created_at", 1, limit, page=page, after=after, before=before
+    )
     
     # Enrich with user data
-    enriched = []
-    for t in transactions:
-        user = await db.users.find_one({"id": t["user_id"]})
-        account = await db.accounts.find_one({"user_id": t["user_id"]})
-        enriched.append({
-            **t,
-            "_id": str(t.get("_id", "")),
-            "customer_name": user["name"] if user else "Unknown",
-            "customer_phone": user["phone"] if user else "Unknown",
-            "account_balance": account["balance"] if account else 0
-        })
+    enriched = await enrich_transactions(transactions)
     
     return {
         "transactions": enriched,
         "total": total,
         "page": page,
         "limit": limit,
-        "pages": (total + limit - 1) // limit
+        "pages": (total + limit - 1) // limit,
+        "total_exact": total_exact,
+        **cursors
     }
 
 @admin_router.post("/transactions/{transaction_id}/verify")
@@ -1692,52 +3528,63 @@ async def verify_deposit(
     admin = Depends(require_role([AdminRole.TRANSACTION_MANAGER, AdminRole.SUPER_ADMIN]))
 ):
     """Quick verify or reject a pending deposit"""
-    transaction = await db.transactions.find_one({
-        "id": transaction_id,
-        "status": "pending_verification"
-    })
+    new_status = "completed" if approve else "failed"
+    
+    async def apply(session):
+        # Conditional on the pending status, so a double-clicked approval cannot credit twice
+        transaction = await db.transactions.find_one_and_update(
+            {"id": transaction_id, "status": "pending_verification"},
+            {"$set": {
+                "status": new_status,
+                "status_note": note or ("Verified by admin" if approve else "Rejected by admin"),
+                "verified_by": admin["name"],
+                "verified_at": datetime.utcnow(),
+                "updated_by": admin["id"]
+            }},
+            session=session
+        )
+        if not transaction:
+            raise HTTPException(status_code=404, detail="Pending transaction not found")
+        
+        # Approve - credit the balance
+        account = None
+        if approve:
+            account = await apply_balance_change(
+                transaction["user_id"], transaction["amount"], "deposit", transaction_id, session,
+                inc=account_counters(transaction, "pending_verification", "completed")
+            )
+            version = next_version(account)
+        else:
+            version = await bump_account_version(transaction["user_id"], session)
+        await stamp_transaction_sync(transaction_id, version, session)
+        
+        # Create audit log
+        await create_audit_log(
+            admin_id=admin["id"],
+            admin_name=admin["name"],
+            action="verify_deposit" if approve else "reject_deposit",
+            target_type="transaction",
+            target_id=transaction_id,
+            details={
+                "approved": approve,
+                "amount": cents_to_kes(transaction["amount"]),
+                "customer_id": transaction["user_id"],
+                "note": note
+            },
+            session=session
+        )
+        return transaction, account
     
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Pending transaction not found")
+    transaction, account = await run_in_transaction(apply)
+    if account is not None:
+        await record_balance_metrics(account["balance"], transaction["amount"])
+    await record_transaction_metrics(transaction, "pending_verification", new_status)
+    await publish_transaction_change(transaction["user_id"], transaction_id)
     
     if approve:
-        # Approve - credit the balance
-        new_status = "completed"
-        await db.accounts.update_one(
-            {"user_id": transaction["user_id"]},
-            {"$inc": {"balance": transaction["amount"]}}
-        )
-        message = f"Deposit of KES {transaction['amount']:,.2f} verified and credited"
+        message = f"Deposit of KES {cents_to_kes(transaction['amount']):,.2f} verified and credited"
     else:
-        # Reject
-        new_status = "failed"
-        message = f"Deposit of KES {transaction['amount']:,.2f} rejected"
-    
-    await db.transactions.update_one(
-        {"id": transaction_id},
-        {"$set": {
-            "status": new_status,
-            "status_note": note or ("Verified by admin" if approve else "Rejected by admin"),
-            "verified_by": admin["name"],
-            "verified_at": datetime.utcnow(),
-            "updated_by": admin["id"]
-        }}
-    )
-    
-    # Create audit log
-    await create_audit_log(
-        admin_id=admin["id"],
-        admin_name=admin["name"],
-        action="verify_deposit" if approve else "reject_deposit",
-        target_type="transaction",
-        target_id=transaction_id,
-        details={
-            "approved": approve,
-            "amount": transaction["amount"],
-            "customer_id": transaction["user_id"],
-            "note": note
-        }
-    )
+        message = f"Deposit of KES {cents_to_kes(transaction['amount']):,.2f} rejected"
     
     return {
         "message": message,
@@ -1746,40 +3593,51 @@ async def verify_deposit(
     }
 
 # ============== ADMIN CUSTOMER ROUTES ==============
+CUSTOMER_LIST_PROJECTION = {"_id": 0, "id": 1, "name": 1, "phone": 1, "created_at": 1, "is_active": 1}
+CUSTOMER_ACCOUNT_LOOKUP = [
+    {"$lookup": {
+        "from": "accounts",
+        "localField": "id",
+        "foreignField": "user_id",
+        "pipeline": [{"$project": {"_id": 0, "balance": 1, "total_interest_earned": 1, "transaction_count": 1}}],
+        "as": "account"
+    }},
+    {"$unwind": {"path": "$account", "preserveNullAndEmptyArrays": True}}
+]
+
 @admin_router.get("/customers")
 async def get_all_customers(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
     search: Optional[str] = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
     admin = Depends(get_current_admin)
 ):
     query = {}
     
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"phone": {"$regex": search, "$options": "i"}}
-        ]
-    
-    total = await db.users.count_documents(query)
-    skip = (page - 1) * limit
+        query = customer_search_query(search)
     
-    users = await db.users.find(query).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    total, total_exact = await count_cache.count(db.users, query)
+    # One aggregation: the page of users, each joined to its account's stored counters
+    users, cursors = await fetch_page(
+        db.users, query, "created_at", -1, limit, page=page, after=after, before=before,
+        projection=CUSTOMER_LIST_PROJECTION, stages=CUSTOMER_ACCOUNT_LOOKUP
+    )
     
-    # Enrich with account data
     enriched = []
     for u in users:
-        account = await db.accounts.find_one({"user_id": u["id"]})
-        tx_count = await db.transactions.count_documents({"user_id": u["id"]})
+        account = u.get("account")
         enriched.append({
             "id": u["id"],
             "name": u["name"],
             "phone": u["phone"],
             "created_at": u["created_at"],
             "is_active": u.get("is_active", True),
-            "balance": account["balance"] if account else 0,
-            "total_interest_earned": account["total_interest_earned"] if account else 0,
-            "transaction_count": tx_count
+            "balance": cents_to_kes(account["balance"]) if account else 0,
+            "total_interest_earned": cents_to_kes(account["total_interest_earned"]) if account else 0,
+            "transaction_count": account.get("transaction_count", 0) if account else 0
         })
     
     return {
@@ -1787,19 +3645,31 @@ async def get_all_customers(
         "total": total,
         "page": page,
         "limit": limit,
-        "pages": (total + limit - 1) // limit
+        "pages": (total + limit - 1) // limit,
+        "total_exact": total_exact,
+        **cursors
     }
 
+CUSTOMER_DETAIL_PAGE_SIZE = 20
+
 @admin_router.get("/customers/{customer_id}")
 async def get_customer_detail(customer_id: str, admin = Depends(get_current_admin)):
-    user = await db.users.find_one({"id": customer_id})
+    """Customer, account with its lifetime totals, and the first page of transactions"""
+    results, failed = await gather_queries({
+        "user": db.users.find_one({"id": customer_id}),
+        "account": db.accounts.find_one({"user_id": customer_id}),
+        "transactions": fetch_page(
+            db.transactions, {"user_id": customer_id}, "created_at", -1, CUSTOMER_DETAIL_PAGE_SIZE
+        )
+    })
+    if "user" in failed:
+        raise HTTPException(status_code=503, detail="Customer data is temporarily unavailable")
+    user = results["user"]
     if not user:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    account = await db.accounts.find_one({"user_id": customer_id})
-    transactions = await db.transactions.find(
-        {"user_id": customer_id}
-    ).sort("created_at", -1).to_list(100)
+    account = results["account"] or {}
+    transactions, cursors = results["transactions"] or ([], {"next_cursor": None})
     
     return {
         "customer": {
@@ -1810,23 +3680,60 @@ async def get_customer_detail(customer_id: str, admin = Depends(get_current_admi
             "is_active": user.get("is_active", True)
         },
         "account": {
-            "id": account["id"] if account else None,
-            "balance": account["balance"] if account else 0,
-            "total_interest_earned": account["total_interest_earned"] if account else 0,
-            "last_interest_date": account.get("last_interest_date") if account else None
+            "id": account.get("id"),
+            "balance": cents_to_kes(account.get("balance", 0)),
+            "total_interest_earned": cents_to_kes(account.get("total_interest_earned", 0)),
+            "last_interest_date": account.get("last_interest_date")
         },
         "transactions": [{
-            **t,
+            **money_out(t),
             "_id": str(t.get("_id", ""))
         } for t in transactions],
+        "transactions_next_cursor": cursors["next_cursor"],
+        # Lifetime totals maintained on the account by every transaction write
         "stats": {
-            "total_deposits": sum(t["amount"] for t in transactions if t["type"] == "deposit" and t["status"] == "completed"),
-            "total_withdrawals": sum(t["amount"] for t in transactions if t["type"] == "withdrawal" and t["status"] == "completed"),
-            "total_interest": sum(t["amount"] for t in transactions if t["type"] == "interest"),
-            "transaction_count": len(transactions)
-        }
+            "total_deposits": cents_to_kes(account.get("total_deposits", 0)),
+            "total_withdrawals": cents_to_kes(account.get("total_withdrawals", 0)),
+            "total_interest": cents_to_kes(account.get("total_interest_earned", 0)),
+            "transaction_count": account.get("transaction_count", 0)
+        },
+        "unavailable": failed
+    }
+
+@admin_router.get("/customers/{customer_id}/transactions")
+async def get_customer_transactions(
+    customer_id: str,
+    limit: int = Query(CUSTOMER_DETAIL_PAGE_SIZE, ge=1, le=100),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    admin = Depends(get_current_admin)
+):
+    """Page through a customer's transactions, newest first - continue from transactions_next_cursor"""
+    transactions, cursors = await fetch_page(
+        db.transactions, {"user_id": customer_id}, "created_at", -1, limit, after=after, before=before,
+        projection={"_id": 0}
+    )
+    return {
+        "transactions": [money_out(t) for t in transactions],
+        "limit": limit,
+        **cursors
     }
 
+@admin_router.get("/customers/{customer_id}/balance-at")
+async def get_customer_balance_at(
+    customer_id: str,
+    at: datetime = Query(..., description="ISO 8601 timestamp"),
+    admin = Depends(get_current_admin)
+):
+    """Get a customer's balance as of a point in time, from the ledger"""
+    if at.tzinfo:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    if not await db.accounts.find_one({"user_id": customer_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Account not found")
+    
+    return {"customer_id": customer_id, "at": at, "balance": cents_to_kes(await balance_at(customer_id, at))}
+
 @admin_router.put("/customers/{customer_id}")
 async def update_customer(
     customer_id: str,
@@ -1844,11 +3751,18 @@ async def update_customer(
         phone = update.phone.strip()
         if phone.startswith('0'):
             phone = '+254' + phone[1:]
+        if await db.users.find_one({"phone": phone, "id": {"$ne": customer_id}}, {"_id": 1}):
+            raise HTTPException(status_code=400, detail="Phone number already registered")
         update_data["phone"] = phone
     
     if update_data:
         update_data["updated_at"] = datetime.utcnow()
-        await db.users.update_one({"id": customer_id}, {"$set": update_data})
+        search_keys = build_search_keys(update_data.get("name", user["name"]), update_data.get("phone", user["phone"]))
+        try:
+            await db.users.update_one({"id": customer_id}, {"$set": {**update_data, **search_keys}})
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Phone number already registered")
+        principal_cache.invalidate("user", customer_id)
         
         # Create audit log
         await create_audit_log(
@@ -1867,12 +3781,14 @@ async def update_customer(
 async def get_audit_logs(
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=100),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
     admin = Depends(require_role([AdminRole.SUPER_ADMIN]))
 ):
-    total = await db.audit_logs.count_documents({})
-    skip = (page - 1) * limit
-    
-    logs = await db.audit_logs.find({}).sort("timestamp", -1).skip(skip).limit(limit).to_list(limit)
+    total, total_exact = await count_cache.count(db.audit_logs, {})
+    logs, cursors = await fetch_page(
+        db.audit_logs, {}, "timestamp", -1, limit, page=page, after=after, before=before
+    )
     
     return {
         "logs": [{
@@ -1882,7 +3798,20 @@ async def get_audit_logs(
         "total": total,
         "page": page,
         "limit": limit,
-        "pages": (total + limit - 1) // limit
+        "pages": (total + limit - 1) // limit,
+        "total_exact": total_exact,
+        **cursors
+    }
+
+# ============== SYSTEM METRICS ==============
+@admin_router.get("/system/metrics")
+async def get_system_metrics(admin = Depends(require_role([AdminRole.SUPER_ADMIN]))):
+    """In-process runtime metrics for this API worker"""
+    return {
+        "kdf": kdf_pool.stats(),
+        "count_cache": count_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "events": broker.stats()
     }
 
 # ============== HEALTH CHECK ==============
@@ -1901,6 +3830,131 @@ async def health_check():
         "database": db_status
     }
 
+# ============== IDEMPOTENCY KEYS ==============
+# Money-moving routes that honour an Idempotency-Key header
+IDEMPOTENT_ROUTES = [re.compile(pattern) for pattern in (
+    r"^/api/deposit$",
+    r"^/api/deposit/confirm/[^/]+$",
+    r"^/api/withdraw$",
+    r"^/api/admin/transactions/[^/]+/(verify|status)$",
+    r"^/api/admin/withdrawals/[^/]+/(approve|reject|reverse)$",
+    r"^/api/admin/customers/[^/]+/adjust-balance$",
+    r"^/api/admin/distribute-interest(/[^/]+)?$",
+)]
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_LOST_RESPONSE = "The request was applied but its response was lost; check the transaction history"
+
+def idempotency_principal(request: Request) -> Optional[str]:
+    """Verified token subject the key is scoped to, or None to let the route reject the request"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    is_admin = request.url.path.startswith(admin_router.prefix + "/")
+    try:
+        payload = jwt.decode(token, ADMIN_SECRET_KEY if is_admin else SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    subject = payload.get("sub")
+    return f"{'admin' if is_admin else 'user'}:{subject}" if subject else None
+
+async def claim_idempotency_key(key_id: str, fingerprint: str) -> Optional[dict]:
+    """Claim a key for a new request; returns None if claimed, otherwise the existing record"""
+    existing = await db.idempotency_keys.find_one({"id": key_id}, {"_id": 0})
+    now = datetime.utcnow()
+    
+    if existing is None:
+        try:
+            await db.idempotency_keys.insert_one({
+                "id": key_id,
+                "status": "in_progress",
+                "fingerprint": fingerprint,
+                "created_at": now,
+                "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+                "expires_at": now + timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+            })
+            return None
+        except DuplicateKeyError:
+            # A concurrent duplicate claimed it first
+            return await db.idempotency_keys.find_one({"id": key_id}, {"_id": 0})
+    
+    if (existing["status"] == "in_progress" and existing["fingerprint"] == fingerprint
+            and existing["locked_until"] < now and not existing.get("committed")):
+        result = await db.idempotency_keys.update_one(
+            {"id": key_id, "status": "in_progress", "committed": {"$ne": True},
+             "locked_until": existing["locked_until"]},
+            {"$set": {"locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)}}
+        )
+        if result.modified_count:
+            return None
+    return existing
+
+@app.middleware("http")
+async def idempotency_middleware(request: Request, call_next):
+    """Replay the stored response for a repeated Idempotency-Key"""
+    key = request.headers.get("idempotency-key")
+    if (not key or request.method not in ("POST", "PUT")
+            or not any(route.match(request.url.path) for route in IDEMPOTENT_ROUTES)):
+        return await call_next(request)
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return JSONResponse(status_code=400, content={
+            "detail": f"Idempotency-Key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters"
+        })
+    principal = idempotency_principal(request)
+    if principal is None:
+        return await call_next(request)
+    
+    key_id = hashlib.sha256(f"{principal}\n{request.method}\n{request.url.path}\n{key}".encode()).hexdigest()
+    fingerprint = hashlib.sha256(request.url.query.encode() + b"\n" + await request.body()).hexdigest()
+    
+    existing = await claim_idempotency_key(key_id, fingerprint)
+    if existing is not None:
+        if existing["fingerprint"] != fingerprint:
+            return JSONResponse(status_code=422, content={
+                "detail": "Idempotency-Key was already used for a different request"
+            })
+        if existing["status"] == "in_progress" and existing.get("committed") \
+                and existing["locked_until"] < datetime.utcnow():
+            # The request committed but its worker died before storing the response
+            return JSONResponse(status_code=500, content={"detail": IDEMPOTENCY_LOST_RESPONSE})
+        if existing["status"] == "in_progress":
+            return JSONResponse(status_code=409, content={
+                "detail": "A request with this Idempotency-Key is still being processed"
+            })
+        return Response(
+            content=existing["body"],
+            status_code=existing["status_code"],
+            media_type=existing.get("content_type"),
+            headers={"Idempotent-Replayed": "true"}
+        )
+    
+    async def store(status_code: int, content_type: Optional[str], body: bytes):
+        await db.idempotency_keys.update_one({"id": key_id}, {"$set": {
+            "status": "completed",
+            "status_code": status_code,
+            "content_type": content_type,
+            "body": body,
+            "completed_at": datetime.utcnow()
+        }})
+    
+    async def release_unless_committed() -> bool:
+        result = await db.idempotency_keys.delete_one({"id": key_id, "committed": {"$ne": True}})
+        return result.deleted_count == 1
+    
+    token = current_idempotency_key.set(key_id)
+    try:
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+    except Exception:
+        if not await release_unless_committed():
+            await store(500, "application/json", json.dumps({"detail": IDEMPOTENCY_LOST_RESPONSE}).encode())
+        raise
+    finally:
+        current_idempotency_key.reset(token)
+    
+    if response.status_code < 500 or not await release_unless_committed():
+        await store(response.status_code, response.headers.get("content-type"), body)
+    return Response(content=body, status_code=response.status_code, headers=dict(response.headers))
+
 # Include routers
 app.include_router(api_router)
 app.include_router(admin_router)
@@ -1911,28 +3965,145 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Idempotent-Replayed"],
 )
 
+# ============== DATABASE INDEXES ==============
+# Every query shape the API issues should be served by one of these indexes
+def _index(*fields: str, **options) -> IndexModel:
+    return IndexModel([(field, ASCENDING) for field in fields], **options)
+
+INDEX_PLAN = {
+    "users": [
+        _index("id", unique=True),
+        _index("phone", unique=True),
+        _index("created_at", "id"),                                # customer list
+        _index("search_name_tokens"),                              # admin search by name prefix
+        _index("search_phone_keys"),                               # admin search by phone prefix
+        _index("search_phone_rev"),                                # admin search by phone suffix
+    ],
+    "admins": [
+        _index("id", unique=True),
+        _index("email", unique=True),
+    ],
+    "accounts": [
+        _index("user_id", unique=True),
+        _index("balance"),                                         # interest runs, active customers
+    ],
+    "transactions": [
+        _index("id", unique=True),
+        _index("user_id", "created_at", "id"),                     # customer history, statements
+        _index("type", "status", "created_at", "id"),              # pending withdrawals, daily totals
+        _index("status", "created_at", "id"),                      # pending verifications, status filter
+        _index("created_at", "id"),                                # admin transaction list
+        _index("user_id", "sync_version"),                         # customer change sync
+        _index("interest_run_id", sparse=True),                    # totals of a resumed interest run
+    ],
+    "statement_requests": [
+        _index("id", unique=True),
+        _index("user_id", "created_at"),                           # customer's own requests
+        _index("status", "created_at", "id"),                      # admin list by status, pending queue
+        _index("artifact_status"),                                 # statement builds to resume
+        _index("created_at", "id"),                                # admin list
+    ],
+    "audit_logs": [
+        _index("timestamp", "id"),
+    ],
+    "ledger_entries": [
+        _index("id", unique=True),
+        _index("user_id", "seq", unique=True),                     # one entry per account sequence number
+        _index("user_id", "created_at", "seq"),                    # balance as of a date
+        _index("transaction_id"),
+    ],
+    "interest_runs": [
+        _index("id", unique=True),
+        _index("status", "created_at"),                            # restart recovery
+        _index("customer_id", unique=True,                         # one active run per target
+               partialFilterExpression={"status": {"$in": INTEREST_RUN_ACTIVE_STATUSES}}),
+    ],
+    "idempotency_keys": [
+        _index("id", unique=True),
+        _index("expires_at", expireAfterSeconds=0),                # TTL expiry of stored responses
+    ],
+}
+
+def _key_spec(keys) -> tuple:
+    return tuple((field, int(direction)) for field, direction in keys.items())
+
+async def find_duplicate_phones() -> list:
+    """Phone numbers held by more than one customer - these block the unique users.phone index"""
+    return await db.users.aggregate([
+        {"$group": {"_id": "$phone", "user_ids": {"$push": "$id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$project": {"_id": 0, "phone": "$_id", "user_ids": 1}}
+    ]).to_list(None)
+
+async def ensure_indexes():
+    """Create every index in INDEX_PLAN. Errors propagate so a bad index plan stops startup."""
+    for collection, indexes in INDEX_PLAN.items():
+        await db[collection].create_indexes(indexes)
+    logger.info(f"Ensured indexes on {len(INDEX_PLAN)} collections")
+
+async def index_report() -> dict:
+    """Compare INDEX_PLAN with the indexes in the database and their usage since server start"""
+    report = {}
+    for collection, indexes in INDEX_PLAN.items():
+        declared = {_key_spec(index.document["key"]) for index in indexes}
+        existing = {}
+        async for index in db[collection].list_indexes():
+            existing[_key_spec(index["key"])] = index["name"]
+        try:
+            stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+            usage = {stat["name"]: stat["accesses"]["ops"] for stat in stats}
+        except OperationFailure:
+            # $indexStats is not available on every deployment tier
+            usage = None
+        
+        report[collection] = {
+            "missing": [dict(spec) for spec in declared - existing.keys()],
+            "undeclared": [name for spec, name in existing.items() if spec not in declared and name != "_id_"],
+            "unused": [name for name in existing.values() if name != "_id_" and usage is not None and usage.get(name, 0) == 0],
+            "usage": usage
+        }
+    return report
+
+@admin_router.get("/system/indexes")
+async def get_index_report(admin = Depends(require_role([AdminRole.SUPER_ADMIN]))):
+    """Missing, undeclared and unused indexes per collection"""
+    return await index_report()
+
 @app.on_event("startup")
 async def startup_db_client():
+    await db.command('ping')
+    logger.info("Successfully connected to MongoDB")
+    await check_transaction_support()
+    
     try:
-        await db.command('ping')
-        logger.info("Successfully connected to MongoDB")
-        
-        # Create indexes for better performance
-        await db.users.create_index("phone", unique=True)
-        await db.users.create_index("id", unique=True)
-        await db.admins.create_index("email", unique=True)
-        await db.admins.create_index("id", unique=True)
-        await db.transactions.create_index("user_id")
-        await db.transactions.create_index("created_at")
-        await db.accounts.create_index("user_id", unique=True)
-        
+        await ensure_indexes()
     except Exception as e:
-        logger.error(f"Failed to connect to MongoDB: {e}")
+        logger.error(f"Failed to create indexes: {e}")
+        raise
+    
+    for collection, entry in (await index_report()).items():
+        if entry["undeclared"]:
+            logger.warning(f"Undeclared indexes on {collection}: {entry['undeclared']}")
+    
+    await resume_interest_runs()
+    await resume_statement_builds()
+    
+    global interest_worker_task, metrics_worker_task, events_worker_task, statement_worker_task
+    interest_worker_task = asyncio.create_task(interest_run_worker())
+    metrics_worker_task = asyncio.create_task(metrics_reconcile_worker())
+    statement_worker_task = asyncio.create_task(statement_build_worker())
+    if EVENTS_CHANGE_STREAM:
+        events_worker_task = asyncio.create_task(transaction_change_stream_worker())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in (interest_worker_task, metrics_worker_task, events_worker_task, statement_worker_task):
+        if task:
+            task.cancel()
+    kdf_pool.shutdown()
     client.close()
     logger.info("MongoDB connection closed")
 
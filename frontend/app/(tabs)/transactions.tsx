@@ -10,17 +10,35 @@ import {
 import { SafeAreaView } from 'react-native-safe-area-context';
 import { Ionicons } from '@expo/vector-icons';
 import { COLORS, SPACING, FONT_SIZES, formatKES } from '@/src/constants/theme';
-import { getTransactions, Transaction } from '@/src/utils/api';
+import { getTransactions, syncTransactions, Transaction } from '@/src/utils/api';
+
+// Apply synced changes to the loaded list: replace changed rows and add new ones, ignoring
+// rows older than the loaded window (they arrive with the next page instead)
+const mergeChanges = (current: Transaction[], changes: Transaction[]): Transaction[] => {
+  const oldest = current.length ? current[current.length - 1].created_at : '';
+  const byId = new Map(current.map((t) => [t.id, t]));
+  changes.forEach((t) => {
+    if (byId.has(t.id) || t.created_at >= oldest) {
+      byId.set(t.id, t);
+    }
+  });
+  return Array.from(byId.values()).sort((a, b) => b.created_at.localeCompare(a.created_at));
+};
 
 export default function TransactionsScreen() {
   const [transactions, setTransactions] = useState<Transaction[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [syncToken, setSyncToken] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const fetchTransactions = async () => {
     try {
       const data = await getTransactions();
-      setTransactions(data);
+      setTransactions(data.transactions);
+      setNextCursor(data.next_cursor);
+      setSyncToken(data.sync_token);
     } catch (error) {
       console.error('Failed to fetch transactions:', error);
     } finally {
@@ -29,14 +47,53 @@ export default function TransactionsScreen() {
     }
   };
 
+  // Refresh by pulling only what changed since the last sync
+  const syncChanges = async (since: string) => {
+    try {
+      let token = since;
+      let changes: Transaction[] = [];
+      let hasMore = true;
+      while (hasMore) {
+        const data = await syncTransactions(token);
+        changes = [...changes, ...data.transactions];
+        token = data.sync_token;
+        hasMore = data.has_more;
+      }
+      setTransactions((current) => mergeChanges(current, changes));
+      setSyncToken(token);
+    } catch (error) {
+      console.error('Failed to sync transactions:', error);
+    } finally {
+      setRefreshing(false);
+    }
+  };
+
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore || refreshing) return;
+    setLoadingMore(true);
+    try {
+      const data = await getTransactions(nextCursor);
+      setTransactions((current) => [...current, ...data.transactions]);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error('Failed to fetch more transactions:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchTransactions();
   }, []);
 
   const onRefresh = useCallback(() => {
     setRefreshing(true);
-    fetchTransactions();
-  }, []);
+    if (syncToken) {
+      syncChanges(syncToken);
+    } else {
+      fetchTransactions();
+    }
+  }, [syncToken]);
 
   const getTransactionIcon = (type: string) => {
     switch (type) {
@@ -151,6 +208,13 @@ export default function TransactionsScreen() {
             <RefreshControl refreshing={refreshing} onRefresh={onRefresh} />
           }
           ItemSeparatorComponent={() => <View style={styles.separator} />}
+          onEndReached={loadMore}
+          onEndReachedThreshold={0.5}
+          ListFooterComponent={
+            loadingMore ? (
+              <ActivityIndicator style={styles.footerLoader} color={COLORS.primary} />
+            ) : null
+          }
         />
       )}
     </SafeAreaView>
@@ -235,6 +299,9 @@ const styles = StyleSheet.create({
   separator: {
     height: SPACING.sm,
   },
+  footerLoader: {
+    paddingVertical: SPACING.md,
+  },
   emptyContainer: {
     flex: 1,
     justifyContent: 'center',
@@ -16,6 +16,7 @@ import {
   getCustomers, 
   distributeInterestToAll, 
   distributeInterestToCustomer,
+  getInterestRun,
   getDashboardStats,
   Customer,
   DashboardStats
@@ -24,6 +25,9 @@ import { useAdminStore } from '@/src/store/adminStore';
 
 const ANNUAL_RATE = 0.15; // 15% p.a.
 const DAILY_RATE = ANNUAL_RATE / 365;
+const RUN_POLL_INTERVAL_MS = 2000;
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
 
 export default function AdminInterest() {
   const { admin } = useAdminStore();
@@ -66,9 +70,29 @@ export default function AdminInterest() {
   const handleDistributeAll = async () => {
     setDistributing(true);
     try {
-      const res = await distributeInterestToAll();
-      setResult(res);
+      const queued = await distributeInterestToAll();
       setShowConfirmModal(false);
+      setResult({ message: 'Interest run queued...' });
+
+      // The run executes in the background - poll until it finishes
+      let run = await getInterestRun(queued.run_id);
+      while (run.status === 'queued' || run.status === 'running') {
+        if (run.total) {
+          setResult({ message: `Distributing interest... ${run.processed}/${run.total}` });
+        }
+        await sleep(RUN_POLL_INTERVAL_MS);
+        run = await getInterestRun(queued.run_id);
+      }
+
+      if (run.status === 'completed') {
+        setResult({
+          message: `Interest distributed to ${run.customers_credited} customer(s)`,
+          total_distributed: run.total_distributed,
+        });
+      } else {
+        // A run only credits customers not yet paid for its day, so running again finishes the job
+        setResult({ error: `${run.error || 'Interest run failed'}. Distribute again to credit the remaining customers.` });
+      }
       fetchData();
     } catch (error: any) {
       console.error('Failed to distribute interest:', error);
@@ -1,4 +1,4 @@
-import React, { useEffect, useState, useCallback } from 'react';
+import React, { useEffect, useState, useCallback, useRef } from 'react';
 import {
   View,
   Text,
@@ -10,6 +10,7 @@ import {
   Modal,
   TextInput,
 } from 'react-native';
+import axios from 'axios';
 import { Ionicons } from '@expo/vector-icons';
 import { ADMIN_COLORS as COLORS, SPACING, FONT_SIZES, formatKES } from '@/src/constants/theme';
 import { 
@@ -39,6 +40,10 @@ interface StatementDetail {
   transactions: any[];
 }
 
+// The detail answers 409 while the statement file is being built; poll until it is ready
+const DETAIL_RETRY_MS = 3000;
+const DETAIL_MAX_ATTEMPTS = 20;
+
 export default function AdminStatements() {
   const { admin } = useAdminStore();
   const [requests, setRequests] = useState<StatementRequest[]>([]);
@@ -47,6 +52,9 @@ export default function AdminStatements() {
   const [selectedRequest, setSelectedRequest] = useState<StatementRequest | null>(null);
   const [statementDetail, setStatementDetail] = useState<StatementDetail | null>(null);
   const [showDetailModal, setShowDetailModal] = useState(false);
+  const [detailMessage, setDetailMessage] = useState<string | null>(null);
+  const [detailFailed, setDetailFailed] = useState(false);
+  const openDetailId = useRef<string | null>(null);
   const [processing, setProcessing] = useState(false);
   const [note, setNote] = useState('');
   const [filter, setFilter] = useState<string | undefined>(undefined);
@@ -76,25 +84,56 @@ export default function AdminStatements() {
 
   const handleViewDetail = async (request: StatementRequest) => {
     setSelectedRequest(request);
-    try {
-      const detail = await getStatementDetail(request.id);
-      setStatementDetail(detail);
-      setShowDetailModal(true);
-    } catch (error) {
-      console.error('Failed to fetch statement detail:', error);
+    setStatementDetail(null);
+    setDetailMessage(null);
+    setDetailFailed(false);
+    setShowDetailModal(true);
+    openDetailId.current = request.id;
+
+    for (let attempt = 1; ; attempt++) {
+      try {
+        const detail = await getStatementDetail(request.id);
+        if (openDetailId.current !== request.id) return;
+        setStatementDetail(detail);
+        setDetailMessage(null);
+        return;
+      } catch (error) {
+        if (openDetailId.current !== request.id) return;
+        const building = axios.isAxiosError(error) && error.response?.status === 409;
+        if (building && attempt < DETAIL_MAX_ATTEMPTS) {
+          setDetailMessage('This statement is being generated. It will open here as soon as it is ready.');
+          await new Promise((resolve) => setTimeout(resolve, DETAIL_RETRY_MS));
+          if (openDetailId.current !== request.id) return;
+          continue;
+        }
+        console.error('Failed to fetch statement detail:', error);
+        setDetailFailed(true);
+        setDetailMessage(
+          building
+            ? 'The statement is taking longer than usual to generate. Close this and try again in a few minutes.'
+            : 'Could not load this statement. Close this and try again.'
+        );
+        return;
+      }
     }
   };
 
+  const closeDetail = () => {
+    openDetailId.current = null;
+    setShowDetailModal(false);
+    setStatementDetail(null);
+    setDetailMessage(null);
+    setNote('');
+  };
+
   const handleAction = async (action: 'process' | 'complete' | 'send' | 'reject') => {
     if (!selectedRequest) return;
     
     setProcessing(true);
     try {
       await processStatementRequest(selectedRequest.id, action, note || undefined);
-      setShowDetailModal(false);
+      closeDetail();
       setSelectedRequest(null);
-      setStatementDetail(null);
-      setNote('');
       fetchRequests();
     } catch (error) {
       console.error('Failed to process request:', error);
@@ -228,17 +267,13 @@ export default function AdminStatements() {
         visible={showDetailModal}
         transparent
         animationType="slide"
-        onRequestClose={() => setShowDetailModal(false)}
+        onRequestClose={closeDetail}
       >
         <View style={styles.modalOverlay}>
           <View style={styles.modalContent}>
             <View style={styles.modalHeader}>
               <Text style={styles.modalTitle}>Statement Request</Text>
-              <Pressable onPress={() => {
-                setShowDetailModal(false);
-                setStatementDetail(null);
-                setNote('');
-              }}>
+              <Pressable onPress={closeDetail}>
                 <Ionicons name="close" size={24} color={COLORS.text} />
               </Pressable>
             </View>
@@ -380,7 +415,10 @@ export default function AdminStatements() {
                 )}
               </>
             ) : (
-              <ActivityIndicator size="large" color={COLORS.primary} style={{ marginVertical: 40 }} />
+              <View style={styles.detailPending}>
+                {!detailFailed && <ActivityIndicator size="large" color={COLORS.primary} />}
+                {detailMessage && <Text style={styles.detailMessage}>{detailMessage}</Text>}
+              </View>
             )}
           </View>
         </View>
@@ -530,6 +568,16 @@ const styles = StyleSheet.create({
     alignItems: 'center',
     paddingVertical: SPACING.xxl,
   },
+  detailPending: {
+    alignItems: 'center',
+    marginVertical: 40,
+    gap: SPACING.md,
+  },
+  detailMessage: {
+    fontSize: FONT_SIZES.sm,
+    color: COLORS.textSecondary,
+    textAlign: 'center',
+  },
   emptyText: {
     fontSize: FONT_SIZES.md,
     color: COLORS.textSecondary,
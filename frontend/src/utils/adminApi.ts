@@ -65,6 +65,7 @@ export interface CustomerDetail {
     last_interest_date?: string;
   };
   transactions: Transaction[];
+  transactions_next_cursor: string | null;
   stats: {
     total_deposits: number;
     total_withdrawals: number;
@@ -188,6 +189,11 @@ export const distributeInterestToAll = async (customRate?: number) => {
   return response.data;
 };
 
+export const getInterestRun = async (runId: string) => {
+  const response = await adminApi.get(`/interest-runs/${runId}`);
+  return response.data;
+};
+
 export const distributeInterestToCustomer = async (customerId: string, customRate?: number) => {
   const params = customRate ? `?custom_rate=${customRate}` : '';
   const response = await adminApi.post(`/distribute-interest/${customerId}${params}`);
@@ -15,6 +15,49 @@ api.interceptors.request.use(async (config) => {
   return config;
 });
 
+// Last ETag and body per GET URL, so an unchanged poll is answered with a bodiless 304
+const etagCache = new Map<string, { etag: string; data: unknown }>();
+
+const getWithEtag = async <T>(url: string, params?: Record<string, unknown>): Promise<T> => {
+  const key = api.getUri({ url, params });
+  const cached = etagCache.get(key);
+  const response = await api.get(url, {
+    params,
+    headers: cached ? { 'If-None-Match': cached.etag } : undefined,
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+  if (response.status === 304 && cached) {
+    return cached.data as T;
+  }
+  const etag = response.headers['etag'];
+  if (etag) {
+    etagCache.set(key, { etag, data: response.data });
+  }
+  return response.data;
+};
+
+// Money-moving POSTs carry one Idempotency-Key across retries, so a request whose response was
+// lost on a flaky network is replayed by the server instead of being applied twice
+const IDEMPOTENT_RETRIES = 2;
+
+const newIdempotencyKey = () =>
+  `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+
+const postIdempotent = async <T>(url: string, data?: unknown): Promise<T> => {
+  const headers = { 'Idempotency-Key': newIdempotencyKey() };
+  for (let attempt = 0; ; attempt++) {
+    try {
+      const response = await api.post(url, data, { headers });
+      return response.data;
+    } catch (error) {
+      // Only retry when no response arrived; any server answer is final
+      if (!axios.isAxiosError(error) || error.response || attempt >= IDEMPOTENT_RETRIES) {
+        throw error;
+      }
+    }
+  }
+};
+
 export interface Account {
   id: string;
   user_id: string;
@@ -45,28 +88,42 @@ export interface DepositResponse {
 }
 
 export const getAccount = async (): Promise<Account> => {
-  const response = await api.get('/account');
-  return response.data;
+  return getWithEtag<Account>('/account');
 };
 
-export const getTransactions = async (): Promise<Transaction[]> => {
-  const response = await api.get('/transactions');
+export interface TransactionPage {
+  transactions: Transaction[];
+  next_cursor: string | null;
+  sync_token: string | null;
+}
+
+export interface TransactionSync {
+  transactions: Transaction[];
+  sync_token: string;
+  has_more: boolean;
+}
+
+// Newest first; pass the previous page's next_cursor as `before` to load older transactions
+export const getTransactions = async (before?: string, limit = 20): Promise<TransactionPage> => {
+  return getWithEtag<TransactionPage>('/transactions', { limit, before });
+};
+
+// Transactions created or changed since a sync token, oldest change first
+export const syncTransactions = async (since: string): Promise<TransactionSync> => {
+  const response = await api.get('/transactions/sync', { params: { since } });
   return response.data;
 };
 
 export const createDeposit = async (amount: number): Promise<DepositResponse> => {
-  const response = await api.post('/deposit', { amount });
-  return response.data;
+  return postIdempotent<DepositResponse>('/deposit', { amount });
 };
 
 export const confirmDeposit = async (transactionId: string) => {
-  const response = await api.post(`/deposit/confirm/${transactionId}`);
-  return response.data;
+  return postIdempotent<any>(`/deposit/confirm/${transactionId}`);
 };
 
 export const createWithdrawal = async (amount: number) => {
-  const response = await api.post('/withdraw', { amount });
-  return response.data;
+  return postIdempotent<any>('/withdraw', { amount });
 };
 
 // Statement Request APIs
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# The API is a single module run from backend/ (uvicorn server:app), so import it the same way
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# Database tests need multi-document transactions, so they run against a replica set (a
+# single-node one is enough) named by TEST_MONGO_URI, in a throwaway database. Without it they
+# are skipped and only the pure helper tests run.
+TEST_MONGO_URI = os.environ.get("TEST_MONGO_URI")
+if TEST_MONGO_URI:
+    os.environ["MONGO_URI"] = TEST_MONGO_URI
+    os.environ["DB_NAME"] = f"dolaglobo_test_{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture(scope="session")
+def loop():
+    # Motor binds the module-level client to the loop it first runs on, so every test shares one
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def database(loop):
+    if not TEST_MONGO_URI:
+        pytest.skip("set TEST_MONGO_URI to a MongoDB replica set to run database tests")
+    import server
+    loop.run_until_complete(server.ensure_indexes())
+    yield server.db
+    loop.run_until_complete(server.client.drop_database(server.db.name))
+
+
+@pytest.fixture
+def run(loop, database):
+    """Run a coroutine to completion, against collections emptied before each test"""
+    import server
+
+    async def clear():
+        for name in await database.list_collection_names():
+            await database[name].delete_many({})
+
+    loop.run_until_complete(clear())
+    server.principal_cache.entries.clear()
+    server.count_cache.entries.clear()
+    for queue in (server.interest_run_queue, server.statement_build_queue):
+        while not queue.empty():
+            queue.get_nowait()
+    return loop.run_until_complete
+
+
+@pytest.fixture
+def api(run):
+    """HTTP client for the app, served in-process on the test loop"""
+    import httpx
+    import server
+
+    # Unhandled route errors come back as 500 responses, as they would from uvicorn
+    transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+    client = httpx.AsyncClient(transport=transport, base_url="http://test")
+    yield client
+    run(client.aclose())
+
+
+@pytest.fixture
+def signup(run, api):
+    """Sign up a customer; returns their user id and auth headers"""
+    def signup(phone: str = "0712345678", name: str = "Jane Doe") -> dict:
+        response = run(api.post("/api/auth/signup", json={"phone": phone, "name": name, "pin": "1234"}))
+        assert response.status_code == 200, response.text
+        body = response.json()
+        return {"id": body["user"]["id"], "headers": {"Authorization": f"Bearer {body['access_token']}"}}
+    return signup
+
+
+@pytest.fixture
+def customer(signup):
+    return signup()
+
+
+@pytest.fixture
+def admin(run, api):
+    """Register the first admin, who becomes Super Admin; returns their id and auth headers"""
+    response = run(api.post("/api/admin/auth/register", json={
+        "email": "ops@example.com", "password": "correct horse", "name": "Ops Lead"
+    }))
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return {"id": body["admin"]["id"], "headers": {"Authorization": f"Bearer {body['access_token']}"}}
+
+
+@pytest.fixture
+def open_account(run, database, fund):
+    """Insert a customer account the way signup creates it, optionally funded"""
+    def open_account(user_id: str, cents: int = 0):
+        run(database.accounts.insert_one({
+            "id": f"acc-{user_id}", "user_id": user_id, "balance": 0, "total_interest_earned": 0,
+            "ledger_seq": 0, "version": 0, "transaction_count": 0, "total_deposits": 0,
+            "total_withdrawals": 0, "last_interest_date": None, "created_at": datetime.utcnow()
+        }))
+        if cents:
+            fund(user_id, cents)
+    return open_account
+
+
+@pytest.fixture
+def fund(run):
+    """Credit a customer's account through the ledger, as a verified deposit would"""
+    import server
+
+    def fund(user_id: str, cents: int):
+        async def apply(session):
+            await server.apply_balance_change(user_id, cents, "deposit", None, session)
+        run(server.run_in_transaction(apply))
+    return fund
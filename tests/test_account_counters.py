@@ -0,0 +1,67 @@
+import server
+from server import account_counters
+
+
+def transaction(type: str, amount: int = 5000) -> dict:
+    return {"id": "t1", "type": type, "amount": amount}
+
+
+def test_account_counters_on_insert():
+    assert account_counters(transaction("deposit"), None, "pending") == {"transaction_count": 1}
+    assert account_counters(transaction("withdrawal"), None, "pending_verification") == {"transaction_count": 1}
+    assert account_counters(transaction("interest"), None, "completed") == {"transaction_count": 1}
+    assert account_counters(transaction("admin_credit"), None, "completed") == {"transaction_count": 1}
+
+
+def test_account_counters_track_completed_totals():
+    deposit, withdrawal = transaction("deposit", 12000), transaction("withdrawal", 7000)
+    assert account_counters(deposit, "pending_verification", "completed") == {"total_deposits": 12000}
+    assert account_counters(deposit, "completed", "failed") == {"total_deposits": -12000}
+    assert account_counters(withdrawal, "pending_verification", "completed") == {"total_withdrawals": 7000}
+    assert account_counters(withdrawal, "completed", "reversed") == {"total_withdrawals": -7000}
+
+
+def test_account_counters_ignore_moves_outside_completed():
+    assert account_counters(transaction("deposit"), "pending", "pending_verification") == {}
+    assert account_counters(transaction("withdrawal"), "pending_verification", "failed") == {}
+    assert account_counters(transaction("deposit"), "completed", "completed") == {}
+
+
+def verified_deposit(run, api, customer, admin, amount: float) -> str:
+    transaction_id = run(api.post("/api/deposit", json={"amount": amount}, headers=customer["headers"])).json()["transaction_id"]
+    assert run(api.post(f"/api/deposit/confirm/{transaction_id}", headers=customer["headers"])).status_code == 200
+    response = run(api.post(f"/api/admin/transactions/{transaction_id}/verify", headers=admin["headers"]))
+    assert response.status_code == 200, response.text
+    return transaction_id
+
+
+def test_customer_detail_reads_totals_from_the_account_and_pages_transactions(run, api, admin, customer, monkeypatch):
+    monkeypatch.setattr(server, "CUSTOMER_DETAIL_PAGE_SIZE", 2)
+    for amount in (100, 200):
+        verified_deposit(run, api, customer, admin, amount)
+    run(api.post("/api/deposit", json={"amount": 400}, headers=customer["headers"]))  # never confirmed
+
+    detail = run(api.get(f"/api/admin/customers/{customer['id']}", headers=admin["headers"])).json()
+
+    assert detail["stats"] == {"total_deposits": 300, "total_withdrawals": 0, "total_interest": 0, "transaction_count": 3}
+    assert len(detail["transactions"]) == 2 and detail["transactions_next_cursor"]
+    rest = run(api.get(
+        f"/api/admin/customers/{customer['id']}/transactions",
+        params={"limit": 2, "after": detail["transactions_next_cursor"]}, headers=admin["headers"]
+    )).json()
+    assert len(rest["transactions"]) == 1 and rest["next_cursor"] is None
+    seen = {t["id"] for t in detail["transactions"] + rest["transactions"]}
+    assert len(seen) == 3
+
+
+def test_backfill_recomputes_drifted_counters(run, api, admin, customer, database):
+    verified_deposit(run, api, customer, admin, 100)
+    run(api.post("/api/deposit", json={"amount": 400}, headers=customer["headers"]))
+    run(database.accounts.update_one(
+        {"user_id": customer["id"]}, {"$set": {"transaction_count": 0, "total_deposits": 999}}
+    ))
+
+    assert run(server.backfill_account_counters()) == 1
+
+    account = run(database.accounts.find_one({"user_id": customer["id"]}))
+    assert (account["transaction_count"], account["total_deposits"], account["total_withdrawals"]) == (2, 10000, 0)
@@ -0,0 +1,49 @@
+import pytest
+
+from server import build_search_keys, customer_search_query
+
+
+def test_build_search_keys():
+    assert build_search_keys("Jane  Wanjiku Doe", "+254712345678") == {
+        "search_name_tokens": ["doe", "jane", "wanjiku"],
+        "search_phone_keys": ["0712345678", "254712345678"],
+        "search_phone_rev": "876543217452"
+    }
+
+
+def test_search_by_phone_prefix_or_suffix():
+    assert customer_search_query(" 0712 ") == {"$or": [
+        {"search_phone_keys": {"$regex": "^0712"}},
+        {"search_phone_rev": {"$regex": "^2170"}}
+    ]}
+    assert customer_search_query("+254 712-345")["$or"][0] == {"search_phone_keys": {"$regex": "^254712345"}}
+
+
+def test_search_by_name_word_prefixes():
+    assert customer_search_query("Jane W") == {"$and": [
+        {"search_name_tokens": {"$regex": "^jane"}},
+        {"search_name_tokens": {"$regex": "^w"}}
+    ]}
+
+
+@pytest.mark.parametrize("term", ["", "   ", "(*", "$."])
+def test_search_without_words_matches_everyone(term):
+    assert customer_search_query(term) == {}
+
+
+@pytest.mark.parametrize("term, names", [
+    ("wanj", ["Jane Wanjiku Doe"]),
+    ("doe", ["John Doe", "Jane Wanjiku Doe"]),
+    ("0722", ["John Doe"]),
+    ("+254712", ["Jane Wanjiku Doe"]),
+    ("5678", ["Jane Wanjiku Doe"]),
+    ("otieno", []),
+])
+def test_admin_customer_search(run, api, admin, signup, term, names):
+    signup("0712345678", "Jane Wanjiku Doe")
+    signup("0722000000", "John Doe")
+
+    response = run(api.get("/api/admin/customers", params={"search": term}, headers=admin["headers"]))
+
+    assert response.status_code == 200, response.text
+    assert [c["name"] for c in response.json()["customers"]] == names
@@ -0,0 +1,31 @@
+import pytest
+
+from server import etag_matches
+
+
+@pytest.mark.parametrize("if_none_match, matches", [
+    (None, False),
+    ("", False),
+    ('"acc.3"', True),
+    ('W/"acc.3"', True),
+    ('"other.1", "acc.3"', True),
+    ("*", True),
+    ('"acc.2"', False),
+])
+def test_etag_matches(if_none_match, matches):
+    assert etag_matches(if_none_match, '"acc.3"') is matches
+
+
+@pytest.mark.parametrize("path", ["/api/account", "/api/transactions"])
+def test_unchanged_reads_are_not_modified_until_the_account_changes(run, api, customer, path):
+    first = run(api.get(path, headers=customer["headers"]))
+    etag = first.headers["ETag"]
+
+    unchanged = run(api.get(path, headers={**customer["headers"], "If-None-Match": etag}))
+    assert unchanged.status_code == 304
+    assert unchanged.headers["ETag"] == etag and not unchanged.content
+
+    assert run(api.post("/api/deposit", json={"amount": 500}, headers=customer["headers"])).status_code == 200
+    changed = run(api.get(path, headers={**customer["headers"], "If-None-Match": etag}))
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+
+def deposit(run, api, customer, key: str = "key-1", amount: float = 500):
+    headers = {**customer["headers"], "Idempotency-Key": key}
+    return run(api.post("/api/deposit", json={"amount": amount}, headers=headers))
+
+
+def test_repeated_request_replays_the_stored_response(run, api, customer, database):
+    first = deposit(run, api, customer)
+    second = deposit(run, api, customer)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert run(database.transactions.count_documents({"user_id": customer["id"]})) == 1
+
+
+def test_key_reused_for_a_different_request_is_rejected(run, api, customer, database):
+    deposit(run, api, customer, amount=500)
+
+    response = deposit(run, api, customer, amount=900)
+
+    assert response.status_code == 422
+    assert run(database.transactions.count_documents({"user_id": customer["id"]})) == 1
+
+
+def test_keys_are_scoped_to_the_caller(run, api, signup, database):
+    jane, john = signup("0712345678", "Jane Doe"), signup("0722000000", "John Doe")
+
+    assert deposit(run, api, jane).json()["transaction_id"] != deposit(run, api, john).json()["transaction_id"]
+    assert run(database.transactions.count_documents({})) == 2
+
+
+def test_requests_without_a_key_are_not_deduplicated(run, api, customer, database):
+    for _ in range(2):
+        response = run(api.post("/api/deposit", json={"amount": 500}, headers=customer["headers"]))
+        assert response.status_code == 200
+    assert run(database.transactions.count_documents({})) == 2
+
+
+def test_error_before_commit_releases_the_key(run, api, customer, database, monkeypatch):
+    async def unavailable(*args, **kwargs):
+        raise RuntimeError("users collection unavailable")
+    monkeypatch.setattr(server, "current_phone", unavailable)
+
+    assert deposit(run, api, customer).status_code == 500
+    assert run(database.idempotency_keys.count_documents({})) == 0
+
+    monkeypatch.undo()
+    retry = deposit(run, api, customer)
+    assert retry.status_code == 200 and "Idempotent-Replayed" not in retry.headers
+    assert run(database.transactions.count_documents({})) == 1
+
+
+def test_error_after_commit_is_stored_instead_of_released(run, api, customer, database, monkeypatch):
+    # The deposit response is built after the transaction committed
+    def broken(cents):
+        raise RuntimeError("serializer bug")
+    monkeypatch.setattr(server, "cents_to_kes", broken)
+
+    assert deposit(run, api, customer).status_code == 500
+    monkeypatch.undo()
+
+    retry = deposit(run, api, customer)
+    assert retry.status_code == 500
+    assert retry.json()["detail"] == server.IDEMPOTENCY_LOST_RESPONSE
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert run(database.transactions.count_documents({})) == 1
+
+
+# ============== KEY RECORDS ==============
+def test_claim_takes_over_an_abandoned_claim_only_if_it_never_committed(run, database):
+    assert run(server.claim_idempotency_key("k1", "fp")) is None
+    assert run(server.claim_idempotency_key("k1", "fp"))["status"] == "in_progress"
+
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    run(database.idempotency_keys.update_one({"id": "k1"}, {"$set": {"locked_until": expired}}))
+    assert run(server.claim_idempotency_key("k1", "fp")) is None
+
+    run(database.idempotency_keys.update_one({"id": "k1"}, {"$set": {"locked_until": expired, "committed": True}}))
+    assert run(server.claim_idempotency_key("k1", "fp"))["committed"] is True
+
+
+@pytest.mark.parametrize("fails, committed", [(False, True), (True, False)])
+def test_transaction_marks_the_key_committed_with_the_change(run, database, fails, committed):
+    run(server.claim_idempotency_key("k1", "fp"))
+
+    async def work(session):
+        await database.scratch.insert_one({"written": True}, session=session)
+        if fails:
+            raise RuntimeError("route failed")
+
+    token = server.current_idempotency_key.set("k1")
+    try:
+        if fails:
+            with pytest.raises(RuntimeError):
+                run(server.run_in_transaction(work))
+        else:
+            run(server.run_in_transaction(work))
+    finally:
+        server.current_idempotency_key.reset(token)
+
+    record = run(database.idempotency_keys.find_one({"id": "k1"}))
+    assert bool(record.get("committed")) is committed
+    assert run(database.scratch.count_documents({})) == int(committed)
@@ -0,0 +1,48 @@
+import server
+
+ACCOUNT_FIELDS = {"_id": 0, "user_id": 1, "balance": 1, "ledger_seq": 1, "version": 1}
+
+
+def snapshot(run, database) -> list:
+    return run(database.accounts.find({}, ACCOUNT_FIELDS).sort("user_id", 1).to_list(None))
+
+
+def test_chunk_is_written_in_one_transaction(run, database, open_account):
+    open_account("c1", 1_000_000)
+    open_account("c2", 2_000_000)
+
+    credited = run(server._flush_interest_batch(snapshot(run, database), 0.001, "Daily interest", "admin-1"))
+
+    assert sorted(t["amount"] for t in credited) == [1000, 2000]
+    c2 = run(database.accounts.find_one({"user_id": "c2"}))
+    assert (c2["balance"], c2["total_interest_earned"], c2["ledger_seq"], c2["transaction_count"]) == (2_002_000, 2000, 2, 1)
+    entry = run(database.ledger_entries.find_one({"user_id": "c2", "entry_type": "interest"}))
+    assert (entry["seq"], entry["balance_after"]) == (2, 2_002_000)
+    transaction = run(database.transactions.find_one({"user_id": "c2"}))
+    assert transaction["sync_version"] == c2["version"]
+
+
+def test_chunk_falls_back_to_per_account_credits_when_an_account_moved(run, database, open_account, fund):
+    open_account("c1", 1_000_000)
+    open_account("c2", 1_000_000)
+    accounts = snapshot(run, database)
+    fund("c1", 1_000_000)  # c1 moves after the chunk was read
+
+    credited = run(server._flush_interest_batch(accounts, 0.001, "Daily interest", "admin-1"))
+
+    # Interest is computed on the balance at the time of the credit, and the ledger stays gapless
+    assert sorted(t["amount"] for t in credited) == [1000, 2000]
+    entries = run(database.ledger_entries.find({"user_id": "c1"}).sort("seq", 1).to_list(None))
+    assert [(e["seq"], e["entry_type"], e["balance_after"]) for e in entries] == [
+        (1, "deposit", 1_000_000), (2, "deposit", 2_000_000), (3, "interest", 2_002_000)
+    ]
+
+
+def test_balances_too_small_to_earn_a_cent_are_skipped(run, database, open_account):
+    open_account("tiny", 100)
+    open_account("c1", 1_000_000)
+
+    results = run(server.run_interest_distribution({"balance": {"$gt": 0}}, 0.001, "admin-1"))
+
+    assert results == {"total_distributed": 1000, "customers_credited": 1, "processed": 2}
+    assert run(database.accounts.find_one({"user_id": "tiny"}))["balance"] == 100
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+DAILY_RATE = 0.001  # 1000 cents on a KES 10,000 balance
+
+
+@pytest.fixture
+def accounts(open_account, monkeypatch):
+    """Three funded customers, credited one per chunk"""
+    monkeypatch.setattr(server, "INTEREST_BATCH_SIZE", 1)
+    for user_id in ("c1", "c2", "c3"):
+        open_account(user_id, 1_000_000)
+    return ["c1", "c2", "c3"]
+
+
+def queue_run(run, api, admin) -> str:
+    response = run(api.post("/api/admin/distribute-interest", json={"custom_rate": DAILY_RATE}, headers=admin["headers"]))
+    assert response.status_code == 202, response.text
+    return response.json()["run_id"]
+
+
+def interest_entries(run, database, user_id: str) -> list:
+    return run(database.ledger_entries.find({"user_id": user_id, "entry_type": "interest"}).to_list(None))
+
+
+def interrupt_after_first_chunk(monkeypatch, error: BaseException):
+    """Make the run fail on its second chunk; returns the real flush to restore"""
+    flush = server._flush_interest_batch
+    calls = []
+
+    async def flaky_flush(*args, **kwargs):
+        calls.append(1)
+        if len(calls) > 1:
+            raise error
+        return await flush(*args, **kwargs)
+    monkeypatch.setattr(server, "_flush_interest_batch", flaky_flush)
+    return flush
+
+
+def assert_credited_once(run, database, accounts):
+    for user_id in accounts:
+        assert len(interest_entries(run, database, user_id)) == 1, user_id
+        assert run(database.accounts.find_one({"user_id": user_id}))["balance"] == 1_001_000
+
+
+def test_run_credits_every_account_in_chunks(run, api, admin, database, accounts):
+    run_id = queue_run(run, api, admin)
+
+    run(server.execute_interest_run(run_id))
+
+    interest_run = run(database.interest_runs.find_one({"id": run_id}))
+    assert interest_run["status"] == "completed"
+    assert (interest_run["total"], interest_run["processed"], interest_run["customers_credited"]) == (3, 3, 3)
+    assert interest_run["total_distributed"] == 3000
+    assert_credited_once(run, database, accounts)
+    assert run(database.transactions.count_documents({"interest_run_id": run_id})) == 3
+
+
+def test_failed_run_can_be_run_again_without_double_crediting(run, api, admin, database, accounts, monkeypatch):
+    flush = interrupt_after_first_chunk(monkeypatch, RuntimeError("primary stepped down"))
+    first = queue_run(run, api, admin)
+    run(server.execute_interest_run(first))
+
+    failed = run(database.interest_runs.find_one({"id": first}))
+    assert (failed["status"], failed["customers_credited"]) == ("failed", 1)
+
+    monkeypatch.setattr(server, "_flush_interest_batch", flush)
+    second = queue_run(run, api, admin)
+    run(server.execute_interest_run(second))
+
+    rerun = run(database.interest_runs.find_one({"id": second}))
+    assert (rerun["status"], rerun["customers_credited"]) == ("completed", 2)
+    assert_credited_once(run, database, accounts)
+
+
+def test_run_cut_off_by_a_dead_process_resumes_after_restart(run, api, admin, database, accounts, monkeypatch):
+    # CancelledError escapes the run's error handling, leaving it "running" as a killed process would
+    flush = interrupt_after_first_chunk(monkeypatch, asyncio.CancelledError())
+    run_id = queue_run(run, api, admin)
+    with pytest.raises(asyncio.CancelledError):
+        run(server.execute_interest_run(run_id))
+    monkeypatch.setattr(server, "_flush_interest_batch", flush)
+    server.interest_run_queue.get_nowait()
+
+    # A live heartbeat keeps the run with its owner
+    run(server.resume_interest_runs())
+    assert run(database.interest_runs.find_one({"id": run_id}))["status"] == "running"
+
+    stale = datetime.utcnow() - timedelta(seconds=server.INTEREST_RUN_STALE_SECONDS + 1)
+    run(database.interest_runs.update_one({"id": run_id}, {"$set": {"updated_at": stale}}))
+    run(server.resume_interest_runs())
+    assert server.interest_run_queue.get_nowait() == run_id
+    run(server.execute_interest_run(run_id))
+
+    resumed = run(database.interest_runs.find_one({"id": run_id}))
+    assert resumed["status"] == "completed"
+    assert (resumed["total"], resumed["customers_credited"], resumed["total_distributed"]) == (3, 3, 3000)
+    assert_credited_once(run, database, accounts)
+
+
+def test_concurrent_workers_claim_a_run_once(run, api, admin, database, accounts):
+    run_id = queue_run(run, api, admin)
+
+    async def two_workers():
+        await asyncio.gather(server.execute_interest_run(run_id), server.execute_interest_run(run_id))
+    run(two_workers())
+
+    assert run(database.interest_runs.find_one({"id": run_id}))["status"] == "completed"
+    assert_credited_once(run, database, accounts)
+
+
+def test_only_one_active_run_per_target(run, api, admin, accounts):
+    queue_run(run, api, admin)
+
+    response = run(api.post("/api/admin/distribute-interest", json={"custom_rate": DAILY_RATE}, headers=admin["headers"]))
+
+    assert response.status_code == 409
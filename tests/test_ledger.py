@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import server
+
+
+def legacy_account(run, database, user_id: str, balance: int):
+    """An account written before the ledger existed - no ledger_seq or version"""
+    run(database.accounts.insert_one({
+        "id": f"acc-{user_id}", "user_id": user_id, "balance": balance, "total_interest_earned": 0
+    }))
+
+
+def post(run, user_id: str, delta: int, entry_type: str = "deposit"):
+    async def apply(session):
+        return await server.apply_balance_change(user_id, delta, entry_type, None, session)
+    return run(server.run_in_transaction(apply))
+
+
+def ledger(run, database, user_id: str) -> list:
+    return run(database.ledger_entries.find(
+        {"user_id": user_id}, {"_id": 0, "seq": 1, "entry_type": 1, "amount": 1, "balance_after": 1}
+    ).sort("seq", 1).to_list(None))
+
+
+def test_movements_are_sequenced_with_running_balances(run, database, customer, fund):
+    fund(customer["id"], 10000)
+    post(run, customer["id"], -2500, "withdrawal")
+
+    assert ledger(run, database, customer["id"]) == [
+        {"seq": 1, "entry_type": "deposit", "amount": 10000, "balance_after": 10000},
+        {"seq": 2, "entry_type": "withdrawal", "amount": -2500, "balance_after": 7500},
+    ]
+    account = run(database.accounts.find_one({"user_id": customer["id"]}))
+    assert (account["balance"], account["ledger_seq"], account["version"]) == (7500, 2, 2)
+    assert run(server.balance_at(customer["id"], datetime.utcnow())) == 7500
+    assert run(server.ledger_started_at(customer["id"])) is None
+
+
+def test_first_movement_opens_the_ledger_of_a_legacy_account(run, database):
+    legacy_account(run, database, "legacy", 10000)
+
+    before = post(run, "legacy", 500)
+
+    assert before["balance"] == 10000
+    assert ledger(run, database, "legacy") == [
+        {"seq": 1, "entry_type": "opening_balance", "amount": 10000, "balance_after": 10000},
+        {"seq": 2, "entry_type": "deposit", "amount": 500, "balance_after": 10500},
+    ]
+    assert run(database.accounts.find_one({"user_id": "legacy"}))["ledger_seq"] == 2
+    assert run(server.balance_at("legacy", datetime.utcnow())) == 10500
+    assert run(server.ledger_started_at("legacy")) is not None
+    # Already opened, so the backfill leaves it alone
+    assert run(server.backfill_opening_balances()) == 0
+    assert len(ledger(run, database, "legacy")) == 2
+
+
+def test_backfill_opens_untouched_legacy_accounts_once(run, database):
+    legacy_account(run, database, "legacy", 7000)
+
+    assert run(server.backfill_opening_balances()) == 1
+    assert run(server.backfill_opening_balances()) == 0
+    post(run, "legacy", 300)
+
+    assert ledger(run, database, "legacy") == [
+        {"seq": 1, "entry_type": "opening_balance", "amount": 7000, "balance_after": 7000},
+        {"seq": 2, "entry_type": "deposit", "amount": 300, "balance_after": 7300},
+    ]
+
+
+def test_interest_chunk_opens_the_ledger_of_a_legacy_account(run, database):
+    legacy_account(run, database, "legacy", 1_000_000)
+    accounts = run(database.accounts.find({}, {"_id": 0, "user_id": 1, "balance": 1, "ledger_seq": 1, "version": 1}).to_list(None))
+
+    credited = run(server._flush_interest_batch(accounts, 0.001, "Daily interest", "admin-1"))
+
+    assert [t["amount"] for t in credited] == [1000]
+    assert ledger(run, database, "legacy") == [
+        {"seq": 1, "entry_type": "opening_balance", "amount": 1_000_000, "balance_after": 1_000_000},
+        {"seq": 2, "entry_type": "interest", "amount": 1000, "balance_after": 1_001_000},
+    ]
+    account = run(database.accounts.find_one({"user_id": "legacy"}))
+    assert (account["balance"], account["ledger_seq"]) == (1_001_000, 2)
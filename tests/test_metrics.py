@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import server
+
+
+async def unavailable(*args, **kwargs):
+    raise server.PyMongoError("metrics unavailable")
+
+
+def test_signup_creates_the_account_even_if_metrics_fail(run, api, database, monkeypatch):
+    monkeypatch.setattr(server, "record_metrics", unavailable)
+
+    response = run(api.post("/api/auth/signup", json={"phone": "0712345678", "name": "Jane Doe", "pin": "1234"}))
+
+    assert response.status_code == 200, response.text
+    user_id = response.json()["user"]["id"]
+    assert run(database.accounts.count_documents({"user_id": user_id})) == 1
+
+
+def test_committed_interest_chunk_survives_a_metrics_failure(run, database, customer, fund, monkeypatch):
+    fund(customer["id"], 1_000_000)
+    monkeypatch.setattr(server, "record_metrics", unavailable)
+    monkeypatch.setattr(server, "record_rollups", unavailable)
+    accounts = run(database.accounts.find({}, {"_id": 0, "user_id": 1, "balance": 1, "ledger_seq": 1, "version": 1}).to_list(None))
+
+    credited = run(server._flush_interest_batch(accounts, 0.001, "Daily interest", "admin-1"))
+
+    assert [t["amount"] for t in credited] == [1000]
+    assert run(database.accounts.find_one({"user_id": customer["id"]}))["balance"] == 1_001_000
+
+
+def test_transaction_metrics_and_rollups_follow_status_changes(run, database):
+    created_at = datetime(2024, 5, 1, 9, 30)
+    deposit = {"id": "t1", "type": "deposit", "amount": 5000, "created_at": created_at}
+
+    run(server.record_transaction_metrics(deposit, None, "pending"))
+    run(server.record_transaction_metrics(deposit, "pending", "pending_verification"))
+    run(server.record_transaction_metrics(deposit, "pending_verification", "completed"))
+
+    dashboard = run(database.metrics.find_one({"_id": "dashboard"}))
+    assert (dashboard["pending_transactions"], dashboard["pending_verifications"]) == (0, 0)
+    assert run(database.metrics.find_one({"_id": "daily:2024-05-01"}))["daily_deposits"] == 5000
+    rollup = run(database.daily_rollups.find_one({"_id": "2024-05-01"}))
+    assert rollup["types"]["deposit"] == {"total": 5000, "count": 1}
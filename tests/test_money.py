@@ -0,0 +1,84 @@
+import pytest
+from pydantic import BaseModel, ValidationError
+
+from server import Cents, KesAmount, MAX_AMOUNT_CENTS, apply_rate, cents_to_kes, kes_to_cents, money_out
+
+
+class AmountBody(BaseModel):
+    amount: KesAmount
+
+
+class AmountResponse(BaseModel):
+    amount: Cents
+
+
+@pytest.mark.parametrize("value, cents", [
+    (50, 5000),
+    (0.1, 10),
+    (12.34, 1234),
+    ("12.34", 1234),
+    ("1000", 100000),
+    (0, 0),
+])
+def test_kes_to_cents(value, cents):
+    assert kes_to_cents(value) == cents
+    assert isinstance(kes_to_cents(value), int)
+
+
+@pytest.mark.parametrize("value", [10.005, "0.001", 1.999])
+def test_kes_to_cents_rejects_sub_cent_amounts(value):
+    with pytest.raises(ValueError, match="2 decimal places"):
+        kes_to_cents(value)
+
+
+@pytest.mark.parametrize("value", [True, False, float("nan"), float("inf"), "-inf", "abc", None])
+def test_kes_to_cents_rejects_non_numbers(value):
+    with pytest.raises(ValueError):
+        kes_to_cents(value)
+
+
+def test_kes_to_cents_rejects_amounts_above_the_maximum():
+    assert kes_to_cents(cents_to_kes(MAX_AMOUNT_CENTS)) == MAX_AMOUNT_CENTS
+    with pytest.raises(ValueError, match="cannot exceed"):
+        kes_to_cents(1e20)
+
+
+def test_kes_amount_rejects_invalid_request_amounts():
+    assert AmountBody(amount="99.99").amount == 9999
+    for value in (1e20, 10.005, True):
+        with pytest.raises(ValidationError):
+            AmountBody(amount=value)
+
+
+def test_cents_serialize_as_kes():
+    assert AmountResponse(amount=123456).model_dump() == {"amount": 1234.56}
+
+
+def test_apply_rate_rounds_half_even_to_whole_cents():
+    assert apply_rate(15, 0.5) == 8    # 7.5 -> 8
+    assert apply_rate(5, 0.5) == 2     # 2.5 -> 2
+    assert apply_rate(1_000_000, 0.15 / 365) == 411
+    assert apply_rate(0, 0.15 / 365) == 0
+    assert isinstance(apply_rate(1_000_000, 0.15 / 365), int)
+
+
+def test_money_out_converts_only_integer_money_fields():
+    doc = {"id": "t1", "amount": 12345, "balance": 100, "balance_after": None, "status": "completed", "seq": 7}
+    assert money_out(doc) == {
+        "id": "t1", "amount": 123.45, "balance": 1.0, "balance_after": None, "status": "completed", "seq": 7
+    }
+    assert doc["amount"] == 12345
+
+
+def test_deposit_stores_integer_cents(run, api, customer, database):
+    response = run(api.post("/api/deposit", json={"amount": 1234.56}, headers=customer["headers"]))
+    assert response.status_code == 200, response.text
+    assert response.json()["amount"] == 1234.56
+    stored = run(database.transactions.find_one({"id": response.json()["transaction_id"]}))
+    assert stored["amount"] == 123456 and isinstance(stored["amount"], int)
+
+
+def test_deposit_above_the_maximum_is_a_validation_error(run, api, customer, database):
+    response = run(api.post("/api/deposit", json={"amount": 1e20}, headers=customer["headers"]))
+    assert response.status_code == 422
+    assert run(database.transactions.count_documents({})) == 0
@@ -0,0 +1,111 @@
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from server import decode_cursor, encode_cursor, fetch_page
+
+T0 = datetime(2024, 5, 1, 12, 0, 0)
+
+
+# ============== CURSORS ==============
+def test_cursor_round_trip():
+    at = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    cursor = encode_cursor(at, "9b2c-id")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (at, "9b2c-id")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor!!",
+    "",
+    base64.urlsafe_b64encode(b'{"a": 1}').decode(),
+    base64.urlsafe_b64encode(b'["yesterday", "id"]').decode(),
+    base64.urlsafe_b64encode(b'["2024-05-01T00:00:00", "id", "extra"]').decode(),
+    base64.urlsafe_b64encode(b"5").decode(),
+])
+def test_decode_cursor_rejects_invalid_input(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+# ============== FETCH PAGE ==============
+@pytest.fixture
+def rows(run, database):
+    """Seven rows, newest first by (created_at, id), with ties on created_at"""
+    docs = [{"id": f"r{i}", "created_at": T0 + timedelta(minutes=i // 2)} for i in range(7)]
+    run(database.pages.insert_many([dict(doc) for doc in docs]))
+    return [doc["id"] for doc in sorted(docs, key=lambda d: (d["created_at"], d["id"]), reverse=True)]
+
+
+def page(run, database, limit: int, **kwargs) -> tuple:
+    found, cursors = run(fetch_page(database.pages, {}, "created_at", -1, limit, projection={"_id": 0}, **kwargs))
+    return [row["id"] for row in found], cursors
+
+
+def test_after_cursors_walk_every_row_once(run, database, rows):
+    seen, after = [], None
+    while True:
+        ids, cursors = page(run, database, 3, after=after)
+        seen += ids
+        after = cursors["next_cursor"]
+        if after is None:
+            break
+    assert seen == rows
+
+
+def test_last_full_page_has_no_next_cursor(run, database, rows):
+    ids, cursors = page(run, database, 7)
+    assert ids == rows
+    assert cursors == {"next_cursor": None, "prev_cursor": None}
+
+
+def test_before_cursor_returns_the_previous_page_in_order(run, database, rows):
+    _, first = page(run, database, 3)
+    second, cursors = page(run, database, 3, after=first["next_cursor"])
+    assert second == rows[3:6]
+
+    back, back_cursors = page(run, database, 3, before=cursors["prev_cursor"])
+    assert back == rows[:3]
+    assert back_cursors["prev_cursor"] is None and back_cursors["next_cursor"] is not None
+
+
+def test_page_numbers_fall_back_to_skip(run, database, rows):
+    ids, cursors = page(run, database, 3, page=3)
+    assert ids == rows[6:]
+    assert cursors["next_cursor"] is None and cursors["prev_cursor"] is not None
+
+
+def test_empty_result_has_no_cursors(run, database):
+    assert page(run, database, 3) == ([], {"next_cursor": None, "prev_cursor": None})
+
+
+def test_stages_run_as_one_aggregation_over_the_page(run, database, rows):
+    stages = [{"$addFields": {"joined": True}}]
+    found, cursors = run(fetch_page(database.pages, {}, "created_at", -1, 3, projection={"_id": 0}, stages=stages))
+
+    assert [row["id"] for row in found] == rows[:3]
+    assert all(row["joined"] for row in found)
+    assert cursors == page(run, database, 3)[1]
+
+
+def test_after_and_before_together_are_rejected(run, database, rows):
+    cursor = encode_cursor(T0, "r0")
+    with pytest.raises(HTTPException) as error:
+        page(run, database, 3, after=cursor, before=cursor)
+    assert error.value.status_code == 400
+
+
+def test_customer_history_pages_through_the_api(run, api, customer):
+    for amount in (100, 200, 300):
+        assert run(api.post("/api/deposit", json={"amount": amount}, headers=customer["headers"])).status_code == 200
+
+    first = run(api.get("/api/transactions?limit=2", headers=customer["headers"])).json()
+    rest = run(api.get(f"/api/transactions?limit=2&before={first['next_cursor']}", headers=customer["headers"])).json()
+
+    # Deposits made within the same millisecond tie on created_at, so only check each appears once
+    assert (len(first["transactions"]), len(rest["transactions"])) == (2, 1)
+    assert sorted(t["amount"] for t in first["transactions"] + rest["transactions"]) == [100, 200, 300]
+    assert rest["next_cursor"] is None
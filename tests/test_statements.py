@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = server.LocalStatementStore(tmp_path)
+    monkeypatch.setattr(server, "statement_store", store)
+    return store
+
+
+@pytest.fixture
+def statement(run, api, customer, fund, store):
+    """A queued statement request for a customer with some history"""
+    fund(customer["id"], 10000)
+    response = run(api.post("/api/statements/request", json={"months": 1}, headers=customer["headers"]))
+    assert response.status_code == 200, response.text
+    return response.json()["request_id"]
+
+
+def stored_files(store) -> list:
+    return sorted(path.name for path in store.directory.iterdir())
+
+
+def test_build_writes_both_files_and_the_summary(run, database, statement, store):
+    run(server.build_statement(statement))
+
+    request = run(database.statement_requests.find_one({"id": statement}))
+    assert request["artifact_status"] == "ready"
+    assert stored_files(store) == sorted([request["statement"]["csv_key"], request["statement"]["pdf_key"]])
+    assert request["statement"]["closing_balance"] == 10000
+
+
+def test_racing_builds_claim_the_request_once(run, database, statement, store):
+    async def two_workers():
+        await asyncio.gather(server.build_statement(statement), server.build_statement(statement))
+    run(two_workers())
+
+    assert run(database.statement_requests.find_one({"id": statement}))["artifact_status"] == "ready"
+    assert len(stored_files(store)) == 2
+
+
+def test_build_that_lost_its_claim_discards_its_files(run, database, statement, store, monkeypatch):
+    save = store.save
+
+    async def save_after_takeover(filename: str, data: bytes) -> str:
+        # Another instance took the build over as stale while this one was rendering
+        await database.statement_requests.update_one({"id": statement}, {"$set": {"artifact_build_id": "other"}})
+        return await save(filename, data)
+    monkeypatch.setattr(store, "save", save_after_takeover)
+
+    run(server.build_statement(statement))
+
+    request = run(database.statement_requests.find_one({"id": statement}))
+    assert request["artifact_status"] == "building" and "statement" not in request
+    assert stored_files(store) == []
+
+
+def test_rebuild_replaces_the_previous_files(run, database, statement, store):
+    run(server.build_statement(statement))
+    run(server.queue_statement_build(statement))
+    assert run(database.statement_requests.find_one({"id": statement}))["artifact_status"] == "queued"
+
+    run(server.build_statement(statement))
+
+    request = run(database.statement_requests.find_one({"id": statement}))
+    assert stored_files(store) == sorted([request["statement"]["csv_key"], request["statement"]["pdf_key"]])
+
+
+def test_restart_requeues_only_stale_builds(run, database, statement):
+    stale_at = datetime.utcnow() - timedelta(seconds=server.STATEMENT_BUILD_STALE_SECONDS + 1)
+    run(database.statement_requests.insert_many([
+        {"id": "stale", "artifact_status": "building", "created_at": stale_at, "updated_at": stale_at},
+        {"id": "live", "artifact_status": "building", "created_at": stale_at, "updated_at": datetime.utcnow()},
+    ]))
+    server.statement_build_queue.get_nowait()
+
+    run(server.resume_statement_builds())
+
+    queued = []
+    while not server.statement_build_queue.empty():
+        queued.append(server.statement_build_queue.get_nowait())
+    assert queued == ["stale", statement]
+    assert run(database.statement_requests.find_one({"id": "live"}))["artifact_status"] == "building"
+
+
+def test_admin_detail_is_served_from_the_built_statement(run, api, admin, statement):
+    run(server.build_statement(statement))
+
+    response = run(api.get(f"/api/admin/statements/{statement}", headers=admin["headers"]))
+
+    assert response.status_code == 200, response.text
+    detail = response.json()
+    assert detail["customer"]["current_balance"] == 100
+    assert detail["summary"]["closing_balance"] == 100
+    assert "unavailable" not in detail
+
+
+def test_admin_detail_of_an_unbuilt_statement_is_not_ready(run, api, admin, statement):
+    response = run(api.get(f"/api/admin/statements/{statement}", headers=admin["headers"]))
+    assert response.status_code == 409
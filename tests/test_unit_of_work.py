@@ -0,0 +1,103 @@
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import PyMongoError
+
+import server
+
+
+def transaction(type: str, amount: int = 5000) -> dict:
+    return {"id": "t1", "type": type, "amount": amount}
+
+
+# ============== STATUS CHANGES ==============
+def test_status_change_balance_delta_for_deposits():
+    deposit = transaction("deposit", 5000)
+    assert server.status_change_balance_delta(deposit, "pending_verification", "completed") == 5000
+    assert server.status_change_balance_delta(deposit, "pending", "completed") == 5000
+    assert server.status_change_balance_delta(deposit, "completed", "failed") == -5000
+    assert server.status_change_balance_delta(deposit, "completed", "cancelled") == -5000
+    assert server.status_change_balance_delta(deposit, "pending", "failed") == 0
+
+
+def test_status_change_balance_delta_for_withdrawals():
+    withdrawal = transaction("withdrawal", 5000)
+    assert server.status_change_balance_delta(withdrawal, "processing", "failed") == 5000
+    assert server.status_change_balance_delta(withdrawal, "pending", "cancelled") == 5000
+    assert server.status_change_balance_delta(withdrawal, "processing", "completed") == 0
+
+
+def test_status_change_balance_delta_ignores_other_types():
+    assert server.status_change_balance_delta(transaction("interest"), "completed", "failed") == 0
+
+
+# ============== TRANSACTION SUPPORT ==============
+@pytest.mark.parametrize("hello, supported", [
+    ({"isWritablePrimary": True, "setName": "rs0"}, True),
+    ({"isWritablePrimary": True, "msg": "isdbgrid"}, True),
+    ({"isWritablePrimary": True}, False),
+])
+def test_supports_transactions(hello, supported):
+    assert server.supports_transactions(hello) is supported
+
+
+def test_test_database_supports_transactions(run):
+    run(server.check_transaction_support())
+
+
+# ============== RUN IN TRANSACTION ==============
+def flaky_work(database, failures: int, label: str = "TransientTransactionError"):
+    """Work that writes a document, then fails with a labelled error on its first attempts"""
+    attempts = []
+
+    async def work(session):
+        attempts.append(1)
+        await database.scratch.insert_one({"attempt": len(attempts)}, session=session)
+        if len(attempts) <= failures:
+            raise PyMongoError("write conflict", error_labels=[label])
+        return "done"
+    return work, attempts
+
+
+def test_transient_errors_retry_the_whole_unit(run, database):
+    work, attempts = flaky_work(database, failures=2)
+
+    assert run(server.run_in_transaction(work)) == "done"
+
+    assert len(attempts) == 3
+    # Only the attempt that committed left a document behind
+    assert run(database.scratch.find({}, {"_id": 0}).to_list(None)) == [{"attempt": 3}]
+
+
+def test_retries_stop_after_max_attempts(run, database):
+    work, attempts = flaky_work(database, failures=5)
+
+    with pytest.raises(PyMongoError):
+        run(server.run_in_transaction(work, max_attempts=3))
+
+    assert len(attempts) == 3
+    assert run(database.scratch.count_documents({})) == 0
+
+
+def test_other_errors_are_not_retried(run, database):
+    work, attempts = flaky_work(database, failures=1, label="SomethingElse")
+
+    with pytest.raises(PyMongoError):
+        run(server.run_in_transaction(work))
+
+    assert len(attempts) == 1
+    assert run(database.scratch.count_documents({})) == 0
+
+
+def test_http_errors_abort_the_unit(run, database, customer, fund):
+    fund(customer["id"], 10000)
+
+    async def overdraw(session):
+        await server.apply_balance_change(customer["id"], -20000, "admin_debit", None, session)
+        raise HTTPException(status_code=400, detail="Insufficient balance")
+
+    with pytest.raises(HTTPException):
+        run(server.run_in_transaction(overdraw))
+
+    account = run(database.accounts.find_one({"user_id": customer["id"]}))
+    assert (account["balance"], account["ledger_seq"]) == (10000, 1)
+    assert run(database.ledger_entries.count_documents({"user_id": customer["id"]})) == 1